@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    Date                 : October 2026
+    Copyright            : Felix von Studsinske
+    Email                : /
+    Developer            : Felix von Studsinske
+    Description          : -- optional --
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+
+Benchmark for overview page tiling in PlotOverviewRectangles:
+sweep with segment tree (current) against the former quadratic implementation.
+Both have to create the same rectangles, exit code is 1 otherwise.
+
+Inputs are random pipe networks from fixed seeds or recorded positions from a json file
+(list of [xmin, ymin, xmax, ymax]).
+
+With --check, only the positions of the fixtures in `data/` (or --input) are compared with the former
+implementation, without timings. Exit code is 0, if all rectangles are equal. Run it after every change
+of `PlotOverviewRectangles.calculate_rectangles`, see readme.md. Fixtures:
+    overview_positions.json: pipe network with 3000 segments from `create_positions(3000, 7)`, rounded to cm
+    overview_edge_cases.json: identical boxes and boxes with same xmin, xmax or ymin, zero-size positions,
+                              boxes larger than a page, boxes exactly as large as a page without overlap
+                              and coordinates with zero values
+
+With --lines, the ingestion of line features is compared instead:
+json per feature (`add_feature`) against wkb and numpy for all features (`add_features`).
+
+With --memory, the memory of positions is compared:
+one python object per position (former `Position`) against columns in `Positions`.
+
+Usage (plugins folder in PYTHONPATH, QGIS python environment):
+    python -m easy_print_menu.benchmarks.overview_tiling [--segments 1000 10000 50000] [--input positions.json]
+    python -m easy_print_menu.benchmarks.overview_tiling --lines 100 1000 10000 [--vertices 50]
+    python -m easy_print_menu.benchmarks.overview_tiling --memory 1000000
+    python -m easy_print_menu.benchmarks.overview_tiling --check
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+from array import array
+
+from qgis.core import QgsCoordinateReferenceSystem, QgsFeature, QgsGeometry, QgsPointXY, QgsRectangle
+
+from typing import List, Optional, Tuple
+
+from ..modules.plot.plot_overview import PlotOverviewRectangles, Position, Positions, numpy
+
+# quadratic implementation is skipped above this count of positions
+REFERENCE_LIMIT = 20000
+
+# positions for --check
+FIXTURES = [os.path.join(os.path.dirname(__file__), "data", name)
+            for name in ("overview_positions.json", "overview_edge_cases.json")]
+
+
+def create_positions(count: int, seed: int) -> List[Tuple[float, float, float, float]]:
+    """ Random pipe network with `count` segments, every segment shorter than a page.
+
+        :param count: count of segments
+        :param seed: random seed
+        :return: [(xmin, ymin, xmax, ymax), ...]
+    """
+    generator = random.Random(seed)
+    x, y = 500000.0, 5700000.0
+    boxes = []
+    for _ in range(count):
+        if generator.random() < 0.01:
+            # new pipe
+            x += generator.uniform(-2000, 2000)
+            y += generator.uniform(-2000, 2000)
+        dx, dy = generator.uniform(-15, 15), generator.uniform(-15, 15)
+        boxes.append((min(x, x + dx), min(y, y + dy), max(x, x + dx), max(y, y + dy)))
+        x += dx
+        y += dy
+
+    return boxes
+
+
+def create_line_features(count: int, vertices: int, seed: int) -> List[QgsFeature]:
+    """ random pipes with `vertices` each """
+    generator = random.Random(seed)
+    features = []
+    for _ in range(count):
+        x, y = generator.uniform(400000, 600000), generator.uniform(5600000, 5800000)
+        points = []
+        for _ in range(vertices):
+            points.append(QgsPointXY(x, y))
+            x += generator.uniform(-30, 30)
+            y += generator.uniform(-30, 30)
+        feature = QgsFeature()
+        feature.setGeometry(QgsGeometry.fromPolylineXY(points))
+        features.append(feature)
+
+    return features
+
+
+def load_positions(path: str) -> List[Tuple[float, float, float, float]]:
+    with open(path, encoding="utf-8") as file:
+        return [tuple(box) for box in json.load(file)]
+
+
+def create_overview(boxes: List[Tuple[float, float, float, float]]) -> PlotOverviewRectangles:
+    """ overview without layers, positions from boxes """
+    # map of an A4 landscape page at 1:500
+    overview = PlotOverviewRectangles([], QgsCoordinateReferenceSystem("EPSG:25832"),
+                                      QgsRectangle(0, 0, 138.5, 95.0))
+    overview.positions.extend(Position(x1=xmin, x2=xmax, y1=ymin, y2=ymax,
+                                       width=xmax - xmin, height=ymax - ymin,
+                                       xmin=xmin, ymin=ymin, xmax=xmax, ymax=ymax)
+                              for xmin, ymin, xmax, ymax in boxes)
+
+    return overview
+
+
+class FormerPosition:
+    """ former `Position`, one object with instance dictionary per position """
+
+    def __init__(self, x1: float, x2: float, y1: float, y2: float, width: float,
+                 height: float, xmin: float, ymin: float, xmax: float, ymax: float):
+        self.x1 = x1
+        self.x2 = x2
+        self.y1 = y1
+        self.y2 = y2
+        self.width = width
+        self.height = height
+        self.xmin = xmin
+        self.ymin = ymin
+        self.xmax = xmax
+        self.ymax = ymax
+
+
+def calculate_rectangles_reference(overview: PlotOverviewRectangles):
+    """ former implementation of `PlotOverviewRectangles.calculate_rectangles` """
+    overview.rectangles.clear()
+    positions = list(overview.positions)
+    while positions:
+        ppos = positions[:]
+
+        xmin = None
+        yxmin = None
+        for pos in positions:
+            if xmin is None or pos.xmin < xmin:
+                xmin = pos.xmin
+                yxmin = pos.ymin
+
+        ymin = None
+        for pos in positions:
+            if abs(pos.xmin - xmin) <= overview.width_overlap and abs(pos.xmax - xmin) <= overview.width_overlap:
+                if abs(pos.ymin - yxmin) <= overview.height_overlap and \
+                        abs(pos.ymax - yxmin) <= overview.height_overlap:
+                    if ymin is None or pos.ymin < ymin:
+                        ymin = pos.ymin
+
+        xmax = None
+        ymax = None
+        p_list = []
+        for p, pos in enumerate(positions):
+            if ymin is not None and xmin is not None:
+                if xmin <= pos.xmin and (xmin + overview.width_overlap) >= pos.xmax:
+                    if ymin <= pos.ymin <= (ymin + overview.height_overlap):
+                        p_list.append(p)
+                        if xmax is None or xmax < pos.xmax:
+                            xmax = pos.xmax
+                        if ymax is None or ymax < pos.ymax:
+                            ymax = pos.ymax
+
+        if xmin and ymin and xmax and ymax:
+            xpos = xmin - (overview.width - (xmax - xmin)) / 2
+            ypos = ymin - (overview.height - (ymax - ymin)) / 2
+            _rect = QgsRectangle(xpos, ypos, xpos + overview.width, ypos + overview.height)
+            overview.rectangles.append(overview.rectangle.scaled(1, _rect.center()))
+
+        for p in reversed(p_list):
+            del positions[p]
+
+        if ppos == positions:
+            break
+
+
+def measure(boxes: List[Tuple[float, float, float, float]], reference: bool) -> Tuple[float, list]:
+    """ returns seconds and rectangles as tuples """
+    overview = create_overview(boxes)
+    start = time.perf_counter()
+    if reference:
+        calculate_rectangles_reference(overview)
+    else:
+        overview.calculate_rectangles()
+    seconds = time.perf_counter() - start
+
+    return seconds, [(rectangle.xMinimum(), rectangle.yMinimum(), rectangle.xMaximum(), rectangle.yMaximum())
+                     for rectangle in overview.rectangles]
+
+
+def measure_ingestion(features: List[QgsFeature], bulk: bool) -> Tuple[float, int, list]:
+    """ returns seconds, peak memory in bytes and position values """
+    overview = create_overview([])
+    crs = overview.crs
+    tracemalloc.start()
+    start = time.perf_counter()
+    if bulk:
+        overview.add_features(features, crs)
+    else:
+        for feature in features:
+            overview.add_feature(feature, crs)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return seconds, peak, [tuple(position) for position in overview.positions]
+
+
+def check(paths: List[str]) -> int:
+    """ compares rectangles of positions in json files with the former implementation """
+    result = 0
+    for path in paths:
+        boxes = load_positions(path)
+        rectangles = measure(boxes, False)[1]
+        rectangles_reference = measure(boxes, True)[1]
+        if rectangles != rectangles_reference:
+            print(f"{os.path.basename(path)}: {len(rectangles)} pages, former implementation "
+                  f"{len(rectangles_reference)} pages, rectangles differ")
+            result = 1
+        else:
+            print(f"{os.path.basename(path)}: {len(boxes)} positions, {len(rectangles)} pages, equal")
+
+    return result
+
+
+def main_lines(counts: List[int], vertices: int, seed: int) -> int:
+    if numpy is None:
+        print("numpy is not installed, add_features uses add_feature")
+
+    result = 0
+    print(f"{'features':>9} {'positions':>10} {'json [s]':>9} {'numpy [s]':>10} "
+          f"{'json [MB]':>10} {'numpy [MB]':>11} {'equal':>6}")
+    for count in counts:
+        features = create_line_features(count, vertices, seed)
+        seconds_json, peak_json, positions_json = measure_ingestion(features, False)
+        seconds, peak, positions = measure_ingestion(features, True)
+        equal = positions == positions_json
+        result = result if equal else 1
+        print(f"{count:>9} {len(positions):>10} {seconds_json:>9.3f} {seconds:>10.3f} "
+              f"{peak_json / 2 ** 20:>10.1f} {peak / 2 ** 20:>11.1f} {str(equal):>6}")
+
+    return result
+
+
+def main_memory(count: int, seed: int) -> int:
+    """ memory of `count` random positions, float objects of former positions are included """
+    generator = random.Random(seed)
+    columns = [array('d', (generator.uniform(0, 1000000) for _ in range(count))) for _ in Position._fields]
+
+    tracemalloc.start()
+    objects = [FormerPosition(*position) for position in zip(*columns)]
+    size_objects = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+
+    tracemalloc.start()
+    positions = Positions()
+    positions.extend_columns(columns)
+    size_columns = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(f"{'positions':>10} {'objects [MB]':>13} {'columns [MB]':>13} {'values [MB]':>12}")
+    print(f"{count:>10} {size_objects / 2 ** 20:>13.1f} {size_columns / 2 ** 20:>13.1f} "
+          f"{positions.nbytes / 2 ** 20:>12.1f}")
+
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compares overview tiling with the former implementation.")
+    parser.add_argument("--segments", type=int, nargs="+", default=[1000, 10000, 50000], help="segment counts")
+    parser.add_argument("--seed", type=int, default=1, help="random seed of pipe networks")
+    parser.add_argument("--input", default="", help="json file with recorded positions, replaces --segments")
+    parser.add_argument("--lines", type=int, nargs="+", default=[], help="compare ingestion of line features")
+    parser.add_argument("--vertices", type=int, default=50, help="vertices per line feature")
+    parser.add_argument("--memory", type=int, default=0, help="compare memory of this count of positions")
+    parser.add_argument("--check", action="store_true", help="compare recorded positions only, no timings")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        return check([args.input] if args.input else FIXTURES)
+
+    if args.memory:
+        return main_memory(args.memory, args.seed)
+
+    if args.lines:
+        return main_lines(args.lines, args.vertices, args.seed)
+
+    inputs = [load_positions(args.input)] if args.input else [create_positions(count, args.seed)
+                                                               for count in args.segments]
+
+    result = 0
+    print(f"{'positions':>10} {'pages':>7} {'sweep [s]':>10} {'former [s]':>11} {'speedup':>8} {'equal':>6}")
+    for boxes in inputs:
+        seconds, rectangles = measure(boxes, False)
+        if len(boxes) <= REFERENCE_LIMIT:
+            seconds_reference, rectangles_reference = measure(boxes, True)
+            equal = rectangles == rectangles_reference
+            result = result if equal else 1
+            print(f"{len(boxes):>10} {len(rectangles):>7} {seconds:>10.3f} {seconds_reference:>11.3f} "
+                  f"{seconds_reference / seconds if seconds else 0:>8.1f} {str(equal):>6}")
+        else:
+            print(f"{len(boxes):>10} {len(rectangles):>7} {seconds:>10.3f} {'-':>11} {'-':>8} {'-':>6}")
+
+    return result
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    Date                 : October 2026
+    Copyright            : Felix von Studsinske
+    Email                : /
+    Developer            : Felix von Studsinske
+    Description          : -- optional --
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+
+Benchmark for page building in PrintLayout:
+serialized template cloning (default) against copying each item with `copy_layout_item`.
+
+Usage (plugins folder in PYTHONPATH, QGIS python environment):
+    python -m easy_print_menu.benchmarks.page_build [--pages 10 100 1000] [--template A4_Landscape_Test.qpt]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+from qgis.core import QgsCoordinateReferenceSystem, QgsGeometry, QgsPointXY, QgsProject
+
+from typing import List, Optional
+
+from ..modules.plot.plot import PrintLayout
+from ..modules.plot.plot_batch import BatchPlugin, init_qgis
+from ..modules.plot.plot_layer import PlotLayer
+from ..modules.plot.plot_layout_templates import PlotLayoutTemplates
+
+
+def create_plot_layer(path: str, layouts: PlotLayoutTemplates, file: str, count: int) -> PlotLayer:
+    """ Creates a plot file with `count` pages in a grid.
+
+        :param path: new GeoPackage
+        :param layouts: loaded templates
+        :param file: template for all pages
+        :param count: count of pages
+    """
+    plot_layer = PlotLayer.create_new(path, QgsCoordinateReferenceSystem("EPSG:25832"), name="benchmark")
+    plot_layer.file = file
+    layouts.initialize_defaults(plot_layer)
+
+    columns = max(1, int(count ** 0.5))
+    extent = layouts.get_layout_extent(file, QgsPointXY(500000, 5700000), 1000, 0)
+    pages = []
+    for i in range(count):
+        row, column = divmod(i, columns)
+        center = QgsPointXY(500000 + column * extent.width(), 5700000 - row * extent.height())
+        rectangle = layouts.get_layout_extent(file, center, 1000, 0)
+        pages.append((file, QgsGeometry.fromRect(rectangle), 1000, 0))
+    plot_layer.add_pages(pages)
+
+    return plot_layer
+
+
+def build(plugin: BatchPlugin, plot_layer: PlotLayer, layouts: PlotLayoutTemplates, clone_items: bool) -> float:
+    """ Builds the layout and returns the sum of all page build times in seconds. """
+    layout: PrintLayout = plugin.add_module("PrintLayout", PrintLayout,
+                                            plot_layer=plot_layer, progress=plugin.progress,
+                                            layouts=layouts, auto_finish=False, clone_items=clone_items)
+    seconds = layout.report.get_build_time()
+    layout.cleanup_layout()
+    layout.remove_legend_group()
+    layout.unload(True)
+
+    return seconds
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compares page build times of PrintLayout.")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 1000], help="page counts")
+    parser.add_argument("--template", default="", help="template file name, default: first template")
+    args = parser.parse_args(argv)
+
+    app = init_qgis()
+    plugin = BatchPlugin(verbose=False)
+    try:
+        layouts: PlotLayoutTemplates = plugin.add_module("PlotLayoutTemplates", PlotLayoutTemplates)
+        layouts.load_layouts()
+        file = args.template or next(iter(layouts)).path
+
+        print(f"template: {file}")
+        print(f"{'pages':>8} {'copy [s]':>10} {'clone [s]':>10} {'copy/page [ms]':>15} "
+              f"{'clone/page [ms]':>16} {'speedup':>8}")
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for count in args.pages:
+                path = os.path.join(temp_dir, f"plot_{count}.gpkg")
+                plot_layer = create_plot_layer(path, layouts, file, count)
+
+                seconds_copy = build(plugin, plot_layer, layouts, clone_items=False)
+                seconds_clone = build(plugin, plot_layer, layouts, clone_items=True)
+                print(f"{count:>8} {seconds_copy:>10.3f} {seconds_clone:>10.3f} "
+                      f"{seconds_copy / count * 1000:>15.2f} {seconds_clone / count * 1000:>16.2f} "
+                      f"{seconds_copy / seconds_clone if seconds_clone else 0:>8.2f}")
+                del plot_layer
+    finally:
+        plugin.unload()
+        QgsProject.instance().clear()
+        if app is not None:
+            app.exitQgis()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
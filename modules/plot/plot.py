@@ -18,11 +18,14 @@
 """
 
 import math
+import time
 from pathlib import Path
 
 from datetime import datetime
 
+from qgis.PyQt.QtCore import QUuid
 from qgis.PyQt.QtGui import QColor, QFont
+from qgis.PyQt.QtXml import QDomDocument
 
 from qgis.core import (QgsProject, QgsPrintLayout, QgsUnitTypes,
                        QgsLayoutItemPage, QgsLayoutItem, QgsLayoutItemScaleBar,
@@ -33,12 +36,17 @@ from qgis.core import (QgsProject, QgsPrintLayout, QgsUnitTypes,
                        QgsLegendRenderer, QgsRectangle, QgsGeometry,
                        QgsLayoutItemPolyline, QgsLayoutItemShape,
                        QgsLayoutSize, QgsFillSymbol, QgsLayoutExporter, QgsRenderContext,
-                       QgsLayoutRenderContext, QgsApplication, QgsTextFormat)
+                       QgsLayoutRenderContext, QgsApplication, QgsTextFormat,
+                       QgsReadWriteContext, QgsLayout)
 
-from typing import Dict, Tuple, Union, List
+from typing import Dict, Tuple, Union, List, Optional, Collection, Set
 
+from .plot_config import ExportProfile
 from .plot_layer import PlotLayer, PlotPage
+from .plot_layout import PlotLayout
 from .plot_layout_templates import PlotLayoutTemplates
+from .plot_report import RenderReport
+from .plot_store import PlotStore
 from ..template.gui.progressbar_extended import DoubleProgressGroup
 from ..template.base_class import ModuleBase
 from ...submodules.tools.geometrytools import polygon_to_rectangle
@@ -48,19 +56,38 @@ class PrintLayout(ModuleBase):
     """
         Class holds QGIS PrintLayout to print it later to pdf or add it to QGIS Project instance.
         Per default live rendering is disabled and must be called separately.
+
+        :param page_keys: build only these pages ('overview', 'extra_legend', page numbers), None builds all pages
+        :param clone_items: create page items from serialized template items,
+                            False copies each item with `copy_layout_item` (old behaviour, for benchmarks)
+        :param profile: export profile, None for selected profile in plot layer
+        :raises InterruptedError: progress has been canceled
     """
 
     def __init__(self, plot_layer: PlotLayer, progress: DoubleProgressGroup,
-                 layouts: PlotLayoutTemplates, auto_finish: bool = True, *args, **kwargs):
+                 layouts: PlotLayoutTemplates, auto_finish: bool = True,
+                 page_keys: Optional[Collection[Union[str, int]]] = None,
+                 clone_items: bool = True, profile: Optional[ExportProfile] = None, *args, **kwargs):
 
         ModuleBase.__init__(self, *args, **kwargs)
 
         self.__plot_layer = plot_layer
         self.__layouts = layouts
         self.__progress = progress
+        self.profile: ExportProfile = profile if profile is not None else plot_layer.get_export_profile()
         self.__page_picture_item_with_new_map: Dict[QgsLayoutItemPicture, QgsLayoutItemMap] = {}
         self.__load_items_later_to_top: List[QgsLayoutItem] = []
+        self.__clone_items = clone_items
+        # serialized template items per template file, created once per export
+        self.__template_xml: Dict[str, Tuple[str, List[QgsLayoutItem]]] = {}
+        self.__read_write_context = QgsReadWriteContext()
+        self.__read_write_context.setPathResolver(QgsProject.instance().pathResolver())
         self.legend_layers: List[QgsMapLayer] = []
+        # build and render times per phase and page, keys like in `pages` (overview, extra_legend, page number)
+        self.report = RenderReport()
+        self.export_result: Optional[int] = None
+        # page index in layout, keys like in `pages`
+        self.page_indices: Dict[Union[str, int], int] = {}
 
         assert self.plot_layer.get_next_page_number() > 1, self.tr_("No pages in Print Layer.")
 
@@ -76,11 +103,13 @@ class PrintLayout(ModuleBase):
         # page iterations
         max_normal_page_count = self.plot_layer.get_next_page_number() - 1
         main_count = max_normal_page_count
+        create_overview_page = self.profile.get_create_overview_page(self.plot_layer)
+        legend_on_extra_page = self.profile.get_legend_on_extra_page(self.plot_layer)
         # extra page "Übersicht"
-        if self.plot_layer.create_overview_page:
+        if create_overview_page:
             main_count += 1
         # extra page "Legend"
-        if self.plot_layer.legend_on_extra_page:
+        if legend_on_extra_page:
             main_count += 1
 
         # placeholder value, to keep progressbar visible
@@ -90,11 +119,16 @@ class PrintLayout(ModuleBase):
 
         pages = {}
 
+        def is_page_key_used(key: Union[str, int]) -> bool:
+            return page_keys is None or key in page_keys
+
         # 1. overview page
-        if self.plot_layer.create_overview_page:
+        if create_overview_page and is_page_key_used('overview'):
             self.progress.set_text_main("Erstelle Übersichtsseite")
             self.progress.add_main(1)
+            start = time.perf_counter()
             index, page, page_items = self.create_page(self.plot_layer.file)
+            self.report.add('overview', 'create_page', time.perf_counter() - start)
 
             # delete legend
             item_id = self.layouts[self.plot_layer.file].id_item_legend
@@ -114,8 +148,9 @@ class PrintLayout(ModuleBase):
                 page_items[item_id].setText(self.tr_("Overview"))
 
             feature = QgsFeature(self.plot_layer.layer_pages.fields())
-            rectangle = self.plot_layer.layer_pages.dataProvider().extent().scaled(1.1)
+            rectangle = self.plot_layer.pages_session.extent.scaled(1.1)
             feature.setGeometry(QgsGeometry.fromRect(rectangle))
+            start_setup = time.perf_counter()
             self.setup_page(self.tr_("Overview"),
                             page_items,
                             self.plot_layer.file,
@@ -126,16 +161,18 @@ class PrintLayout(ModuleBase):
                             False,
                             None,
                             1)
+            self.report.add('overview', 'setup_page', time.perf_counter() - start_setup)
             pages['overview'] = (index, None, page_items)
 
         # 2. legend page, Landscape!
-        if self.plot_layer.legend_on_extra_page:
+        if legend_on_extra_page and is_page_key_used('extra_legend'):
             self.progress.set_text_main(self.tr_("Creating extra legend page"))
             self.progress.add_main(1)
-            # create legend layers
-            self.legend_layers = self.plot_layer.visibility.get_layers()
-            self.legend_layers = [layer for layer in self.legend_layers
-                                  if self.plot_layer.visibility.is_layer_visible_on_legend(layer)]
+            start = time.perf_counter()
+            # create legend layers, without layers hidden in legend
+            hidden = set(self.plot_layer.store.get_layer_ids(PlotStore.GLOBAL, 'legend', False))
+            self.legend_layers = [layer for layer in self.plot_layer.visibility.get_layers()
+                                  if layer.id() not in hidden]
 
             item_page = QgsLayoutItemPage(self.layout)
             item_page.setPageSize(self.layouts[self.plot_layer.file].get_page_size().name,
@@ -156,18 +193,30 @@ class PrintLayout(ModuleBase):
 
             position = QgsLayoutPoint(10, 10, QgsUnitTypes.LayoutMillimeters)  # top left corner
             item_legend.attemptMove(position, page=index)
+            self.report.add('extra_legend', 'create_page', time.perf_counter() - start)
+            start_legend = time.perf_counter()
             self.configure_item_legend(item_legend, self.legend_layers)
+            self.report.add('extra_legend', 'legend', time.perf_counter() - start_legend)
             pages['extra_legend'] = (index, None, {})
         else:
             item_legend = None
 
         # 3. pages
         all_other_map_items = []
-        for plot_page in self.plot_layer:
+        # page numbers are fixed before, e.g. `PlotLayer.fix_page_numbers` in menu
+        for plot_page in self.plot_layer.get_pages():
+            if not is_page_key_used(plot_page.page):
+                if item_legend is not None:
+                    # extra legend filters by all page maps
+                    all_other_map_items.append(self.create_legend_filter_map(plot_page))
+                continue
+
             self.progress.add_main(1)
             self.progress.set_text_main(f"{self.tr_('Creating')} {self.tr_('page')} "
                                         f"{plot_page.page} / {max_normal_page_count}")
+            start = time.perf_counter()
             index, page, page_items = self.create_page(plot_page.file)
+            self.report.add(plot_page.page, 'create_page', time.perf_counter() - start)
             pages[plot_page.page] = (index, plot_page, page_items)
             rotation = plot_page.rotation
 
@@ -178,6 +227,7 @@ class PrintLayout(ModuleBase):
                     self.layout.removeLayoutItem(page_items[item_id])
                     del page_items[item_id]
 
+            start_setup = time.perf_counter()
             self.setup_page(str(plot_page.page),
                             page_items,
                             plot_page.file,
@@ -189,6 +239,7 @@ class PrintLayout(ModuleBase):
                             plot_page=plot_page,
                             page_type=0,
                             map_rotation=rotation)
+            self.report.add(plot_page.page, 'setup_page', time.perf_counter() - start_setup)
 
             # collect main map item per page
             id_item_map = self.layouts[plot_page.file].id_item_map
@@ -198,8 +249,12 @@ class PrintLayout(ModuleBase):
             if item_id in page_items:
                 self.layout.removeLayoutItem(page_items[item_id])
 
+            if self.progress.canceled():
+                raise InterruptedError(self.tr_("Canceled"))
+
         # extra legend page item is present
         if item_legend is not None:
+            start = time.perf_counter()
             # New in version 3.32
             item_legend.setFilterByMapItems(all_other_map_items)
 
@@ -208,6 +263,12 @@ class PrintLayout(ModuleBase):
             item_legend.setLegendFilterOutAtlas(True)
             item_legend.setLegendFilterByMapEnabled(True)
             item_legend.setLocked(True)
+            self.report.add('extra_legend', 'legend', time.perf_counter() - start)
+
+        self.page_indices = {key: value[0] for key, value in pages.items()}
+        # fixed page numbers and default values have to be in file, batch export has no event loop
+        if not self.plot_layer.edit_buffer.flush():
+            raise AssertionError(self.tr_("Print Layer could not be saved: %s") % self.plot_layer.edit_buffer.error)
 
         # raise items to top
         for item in self.__load_items_later_to_top:
@@ -225,9 +286,85 @@ class PrintLayout(ModuleBase):
         result = QgsApplication.translate("QgsApplication", text)
         return result
 
+    @staticmethod
+    def get_layout_page_count(plot_layer: PlotLayer, profile: Optional[ExportProfile] = None) -> int:
+        """ Returns the count of pdf pages, a layout from given plot layer will have.
+            Overview page and extra legend page are included.
+
+            :param profile: export profile, None for selected profile in plot layer
+        """
+        profile = profile if profile is not None else plot_layer.get_export_profile()
+        count = plot_layer.get_next_page_number() - 1
+        if profile.get_create_overview_page(plot_layer):
+            count += 1
+        if profile.get_legend_on_extra_page(plot_layer):
+            count += 1
+
+        return count
+
+    @staticmethod
+    def get_page_keys(plot_layer: PlotLayer, profile: Optional[ExportProfile] = None) -> List[Union[str, int]]:
+        """ Returns keys of all pages in layout order, keys like in `pages`.
+            Gaps in page numbers are fixed in keys like in the built layout, but not in file.
+
+            :param profile: export profile, None for selected profile in plot layer
+        """
+        profile = profile if profile is not None else plot_layer.get_export_profile()
+        keys = []
+        if profile.get_create_overview_page(plot_layer):
+            keys.append('overview')
+        if profile.get_legend_on_extra_page(plot_layer):
+            keys.append('extra_legend')
+        keys.extend(record.page for record in plot_layer.snapshot())
+
+        return keys
+
+    def set_exported_pages(self, indices: Optional[Collection[int]] = None):
+        """ Excludes all layout pages from export, which are not in `indices`.
+            All other items on this pages will be ignored by the exporter too.
+
+            :param indices: page indices in layout to export, None to export all pages
+        """
+        collection = self.layout.pageCollection()
+        for index in range(collection.pageCount()):
+            collection.page(index).setExcludeFromExports(indices is not None and index not in indices)
+
+    def create_legend_filter_map(self, plot_page: PlotPage) -> QgsLayoutItemMap:
+        """ Creates a map item for a page, which is not built in this layout.
+            The map item is not exported, but the extra legend page can filter with it like with the page map.
+        """
+        template_map = self.layouts[plot_page.file].item_map
+
+        item_map = QgsLayoutItemMap(self.layout)
+        self.layout.addLayoutItem(item_map)
+        item_map.attemptResize(template_map.sizeWithUnits())
+        item_map.setExtent(QgsRectangle(0.1, 0.1, 0.2, 0.2))  # MUST HAVE, see `copy_layout_item`
+        item_map.setCrs(self.plot_layer.get_crs())
+        item_map.setExcludeFromExports(True)
+
+        feature = self.plot_layer.layer_pages.getFeature(plot_page.feature_id)
+        self.configure_map(item_map,
+                           polygon_to_rectangle(feature.geometry()),
+                           plot_page.scale,
+                           self.get_map_layers(plot_page.visibility, 'page'),
+                           plot_page.show_map_tips,
+                           plot_page.rotation)
+
+        return item_map
+
+    def get_map_layers(self, visibility, field: str, with_pages_layer: bool = False) -> List[QgsMapLayer]:
+        """ Returns visible layers for a map item sorted by layer tree order.
+
+            :param visibility: VisibilityCollection from page or plot layer
+            :param field: page, mini_map, legend, overview
+            :param with_pages_layer: add the pages layer from plot layer too
+        """
+        return visibility.get_ordered_layer_visibilities(field,
+                                                         [self.plot_layer.layer_pages] if with_pages_layer else None)
+
     def create_page(self, file: str) -> Tuple[int, QgsLayoutItemPage, Dict[str, QgsLayoutItem]]:
         """ Creates a page.
-            Most individual options per layout item will be copied to new layout item.
+            All template items will be created on the new page, see `clone_layout_items`.
 
             :returns 0: page index
             :returns 1: page
@@ -239,15 +376,79 @@ class PrintLayout(ModuleBase):
         self.layout.pageCollection().addPage(item_page)
         index = self.layout.pageCollection().pageCount() - 1
 
+        self.progress.get_subbar().setValue(0)
+        self.progress.get_subbar().setMinimum(0)
+        self.progress.get_subbar().setMaximum(len(layout.item_list))
+
+        if self.__clone_items or layout.layout.multiFrames():
+            # frames of multi frames can not be copied item by item
+            page_items = self.clone_layout_items(layout, index)
+        else:
+            page_items = self.copy_layout_items(layout, index)
+
+        return index, item_page, page_items
+
+    def clone_layout_items(self, layout: PlotLayout, index: int) -> Dict[str, QgsLayoutItem]:
+        """ Creates all template items on page from serialized template items.
+            All item properties are restored by QGIS, linked maps are linked to the new maps on this page.
+
+            :param layout: template
+            :param index: page index
+            :return: item dictionary of items with element id
+        """
+        if layout.path not in self.__template_xml:
+            self.__template_xml[layout.path] = layout.to_items_xml(self.__read_write_context)
+        xml, items, multi_frames = self.__template_xml[layout.path]
+
+        # every page needs own uuids, references (e.g. linked maps, frames of tables) are replaced too
+        uuids = {}
+        for uuid in [item.uuid() for item in items] + multi_frames:
+            uuids[uuid] = QUuid.createUuid().toString()
+            xml = xml.replace(uuid, uuids[uuid])
+
+        document = QDomDocument()
+        document.setContent(xml)
+        new_items = {new_item.uuid(): new_item for new_item in
+                     self.layout.addItemsFromXml(document.documentElement(), document, self.__read_write_context)}
+        missing = [item for item in items if uuids[item.uuid()] not in new_items]
+        if missing:
+            raise AssertionError(f"template '{layout.path}' has items, which can not be restored: "
+                                 + ", ".join(f"{type(item).__name__}(id: '{item.id()}')" for item in missing))
+
+        page_items = {}
+        for item in items:
+            new_item = new_items[uuids[item.uuid()]]
+            self.progress.set_text_single(f"{type(item).__name__}(id: '{item.id()}', uuid: '{item.uuid()}')")
+            self.progress.add_sub(1)
+
+            new_item.attemptMove(item.positionWithUnits(), page=index)
+
+            if isinstance(new_item, QgsLayoutItemMap):
+                # mapRotation: every time north, will be set later
+                new_item.setMapRotation(0)
+                new_item.setCrs(self.plot_layer.get_crs())
+
+            if isinstance(new_item, QgsLayoutItemPicture) and new_item.linkedMap() is not None:
+                self.__page_picture_item_with_new_map[new_item] = new_item.linkedMap()
+
+            if item.id():
+                page_items[item.id()] = new_item
+                new_item.setId(f"{item.id()}_p{index}")
+
+        return page_items
+
+    def copy_layout_items(self, layout: PlotLayout, index: int) -> Dict[str, QgsLayoutItem]:
+        """ Creates all template items on page by copying each item with `copy_layout_item`.
+
+            :param layout: template
+            :param index: page index
+            :return: item dictionary of items with element id
+        """
         page_items = {}
         map_old_new = {}
         map_new_old = {}
 
         linked_maps = {}  # new item, old map
-        self.progress.get_subbar().setValue(0)
-        self.progress.get_subbar().setMinimum(0)
-        self.progress.get_subbar().setMaximum(len(layout.item_list))
-
         for item in layout.item_list:
 
             if isinstance(item, QgsLayoutItemPage):
@@ -281,7 +482,7 @@ class PrintLayout(ModuleBase):
             if isinstance(new_item, QgsLayoutItemPicture):
                 self.__page_picture_item_with_new_map[new_item] = new_linked_map
 
-        return index, item_page, page_items
+        return page_items
 
     def copy_layout_item(self, item: QgsLayoutItem, layout: QgsPrintLayout, linked_maps):
 
@@ -536,21 +737,16 @@ class PrintLayout(ModuleBase):
         item_id = layout.id_item_map
         if item_id in page_items and visibility is not None:
             item_map: QgsLayoutItemMap = page_items[item_id]
-            layer_pages = self.plot_layer.layer_pages
 
             # sort layers
-            layers_to_use = []
             if page_type == 0:
                 # single page
-                layers = visibility.get_layer_visibilities('page')
+                layers_to_use = self.get_map_layers(visibility, 'page')
             elif page_type == 1:
                 # overview page
-                layers = [layer_pages] + visibility.get_layer_visibilities('overview')
+                layers_to_use = self.get_map_layers(visibility, 'overview', with_pages_layer=True)
             else:
                 raise AssertionError(f"page_type {page_type} unknown")
-            for layer in QgsProject.instance().layerTreeRoot().layerOrder():
-                if layer in layers:
-                    layers_to_use.append(layer)
 
             self.configure_map(item_map,
                                polygon_to_rectangle(feature.geometry()),
@@ -565,14 +761,9 @@ class PrintLayout(ModuleBase):
         item_id = layout.id_item_minimap
         if item_id in page_items and visibility is not None and page_type == 0:
             item_minimap: QgsLayoutItemMap = page_items[item_id]
-            layer_pages = self.plot_layer.layer_pages
 
             # sort layer visibilities
-            layers_to_use = []
-            layers = [layer_pages] + visibility.get_layer_visibilities('mini_map')
-            for layer in QgsProject.instance().layerTreeRoot().layerOrder():
-                if layer in layers:
-                    layers_to_use.append(layer)
+            layers_to_use = self.get_map_layers(visibility, 'mini_map', with_pages_layer=True)
 
             rect: QgsRectangle = polygon_to_rectangle(feature.geometry())
             rect_scaled = rect.scaled(1.25)
@@ -623,6 +814,7 @@ class PrintLayout(ModuleBase):
         # item_legend
         item_id = layout.id_item_legend
         if item_id in page_items and visibility is not None:
+            start = time.perf_counter()
             layers = visibility.get_layer_visibilities('legend')
             item_legend: QgsLayoutItemLegend = page_items[item_id]
 
@@ -631,11 +823,15 @@ class PrintLayout(ModuleBase):
             self.configure_item_legend(item_legend, layers)
             item_legend.setLegendFilterOutAtlas(True)
             item_legend.setLegendFilterByMapEnabled(True)
-            self.remove_legend_entries(item_legend.model().rootGroup(), plot_page)
+            self.remove_legend_entries(item_legend.model().rootGroup(),
+                                       set(self.plot_layer.store.get_layer_ids(plot_page.fid, 'legend', False))
+                                       if plot_page is not None else None)
 
             if not layers or not show_legend_on_page:
                 self.layout.removeLayoutItem(item_legend)
 
+            self.report.add(plot_page.page if page_type == 0 else 'overview', 'legend', time.perf_counter() - start)
+
         # item_map_scale_text
         item_id = layout.id_item_map_scale_text
         if item_id in page_items:
@@ -706,9 +902,11 @@ class PrintLayout(ModuleBase):
         for layer in layers:
             lt.addLayer(layer)
 
-    def remove_legend_entries(self, root, plot_page: PlotPage = None):
+    def remove_legend_entries(self, root, hidden_layer_ids: Optional[Set[str]] = None):
         """ Removes unchecked/invisible tree entries from legend.
             Search and remove it recursively.
+
+            :param hidden_layer_ids: layers hidden in legend of page, see `PlotStore.get_layer_ids`
         """
         children = root.children()
         for child in range(len(children) - 1, -1, -1):
@@ -726,9 +924,8 @@ class PrintLayout(ModuleBase):
                 # it is a layer,
                 # if layer shot not be visible, remove it
                 QgsLegendRenderer.setNodeLegendStyle(children[child], QgsLegendStyle.Hidden)
-                if plot_page is not None:
-                    if not plot_page.visibility.is_layer_visible_on_legend(children[child].layer()):
-                        root.removeChildren(child, 1)
+                if hidden_layer_ids is not None and children[child].layerId() in hidden_layer_ids:
+                    root.removeChildren(child, 1)
 
     def add_to_instance(self):
 
@@ -751,16 +948,24 @@ class PrintLayout(ModuleBase):
         """ returns pdf exporter """
         # I wish to use QgsLayoutPdfExportOptionsDialog, but it is not public :(
         exporter = QgsLayoutExporter(self.layout)
+        settings = self.get_pdf_settings(self.plot_layer, self.profile)
+        self.prepare_render_context(settings.dpi)
+
+        return exporter, settings
+
+    @staticmethod
+    def get_pdf_settings(plot_layer: PlotLayer, profile: ExportProfile) -> QgsLayoutExporter.PdfExportSettings:
+        """ returns pdf export settings from export profile """
         settings = QgsLayoutExporter.PdfExportSettings()
-        settings.dpi = self.plot_layer.dpi
-        settings.simplifyGeometries = True
+        settings.dpi = profile.get_dpi(plot_layer)
+        settings.simplifyGeometries = profile.simplify_geometries
         settings.exportMetadata = False
-        settings.forceVectorOutput = False
+        settings.forceVectorOutput = profile.force_vector_output
         if hasattr(settings, 'appendGeoreference'):
             settings.appendGeoreference = True
         if hasattr(settings, 'rasterizeWholeImage'):
             # Gekachelte Rasterlayerexporte abschalten, negierte GUI von QGIS, haken gesetzt, dann hier False
-            settings.rasterizeWholeImage = False
+            settings.rasterizeWholeImage = profile.rasterize_whole_image
 
         # if hasattr(settings, 'writeGeoPdf'):
         #    settings.writeGeoPdf = self.checkbox_as_geopdf.isChecked()
@@ -769,10 +974,23 @@ class PrintLayout(ModuleBase):
         #        settings.useIso32000ExtensionFormatGeoreferencing = True
         #        settings.useOgcBestPracticeFormatGeoreferencing  = False
 
-        render_context = self.layout.renderContext()
-        render_context.setDpi(settings.dpi)
+        try:
+            # Render context Einstellungen ändern
+            settings.textRenderFormat = QgsRenderContext.TextFormatAlwaysText
+        except AttributeError as e:
+            print("settings TextRenderFormat gibt es in dieser QGIS Version nicht ;( -> ", str(e))
+
+        return settings
+
+    def prepare_render_context(self, dpi: int, layout: Optional[QgsLayout] = None):
+        """ Sets render flags for pdf export on layout.
 
-        render_context.setFlag(QgsLayoutRenderContext.FlagAntialiasing, True)
+            :param layout: layout to change, e.g. a clone for export, None for own layout
+        """
+        render_context = (layout if layout is not None else self.layout).renderContext()
+        render_context.setDpi(dpi)
+
+        render_context.setFlag(QgsLayoutRenderContext.FlagAntialiasing, self.profile.antialiasing)
         render_context.setFlag(QgsLayoutRenderContext.FlagDebug, False)
         render_context.setFlag(QgsLayoutRenderContext.FlagDisableTiledRasterLayerRenders, False)
         render_context.setFlag(QgsLayoutRenderContext.FlagDrawSelection, False)
@@ -780,20 +998,28 @@ class PrintLayout(ModuleBase):
         render_context.setFlag(QgsLayoutRenderContext.FlagHideCoverageLayer, False)
         render_context.setFlag(QgsLayoutRenderContext.FlagOutlineOnly, False)
         render_context.setFlag(QgsLayoutRenderContext.FlagRenderLabelsByMapLayer, False)
-        render_context.setFlag(QgsLayoutRenderContext.FlagUseAdvancedEffects, True)
+        render_context.setFlag(QgsLayoutRenderContext.FlagUseAdvancedEffects, self.profile.advanced_effects)
 
         try:
             render_context.setTextRenderFormat(QgsRenderContext.TextFormatAlwaysText)
         except AttributeError as e:
             print("render_context TextRenderFormat gibt es in dieser QGIS Version nicht ;( -> ", str(e))
-            pass
-        try:
-            # Render context Einstellungen ändern
-            settings.textRenderFormat = QgsRenderContext.TextFormatAlwaysText
-        except AttributeError as e:
-            print("settings TextRenderFormat gibt es in dieser QGIS Version nicht ;( -> ", str(e))
 
-        return exporter, settings
+    @staticmethod
+    def get_export_error(result: int) -> str:
+        """ returns error message for QgsLayoutExporter result, empty string on success """
+        if result == QgsLayoutExporter.Success:
+            return ""
+
+        code = {
+            QgsLayoutExporter.Canceled: "Canceled",
+            QgsLayoutExporter.FileError: "FileError",
+            QgsLayoutExporter.IteratorError: "IteratorError",
+            QgsLayoutExporter.MemoryError: "MemoryError",
+            QgsLayoutExporter.PrintError: "PrintError",
+            QgsLayoutExporter.SvgLayerError: "SvgLayerError",
+        }
+        return f"PDF konnte nicht erzeugt werden, QGIS Fehler-Code: {result} ({code[result]})"
 
     def create_pdf(self, save_path: str):
         """ Exports generated layout to pdf
@@ -803,17 +1029,8 @@ class PrintLayout(ModuleBase):
         self.add_to_instance()
         exporter, settings = self.get_pdf_exporter()
         result = exporter.exportToPdf(save_path, settings)
-        error = ""
-        if result != exporter.Success:
-            code = {
-                exporter.Canceled: "Canceled",
-                exporter.FileError: "FileError",
-                exporter.IteratorError: "IteratorError",
-                exporter.MemoryError: "MemoryError",
-                exporter.PrintError: "PrintError",
-                exporter.SvgLayerError: "SvgLayerError",
-            }
-            error = f"PDF konnte nicht erzeugt werden, QGIS Fehler-Code: {result} ({code[result]})"
+        self.export_result = result
+        error = self.get_export_error(result)
 
         self.cleanup_layout()
         self.remove_from_instance()
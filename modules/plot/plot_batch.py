@@ -0,0 +1,567 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    Date                 : October 2026
+    Copyright            : Felix von Studsinske
+    Email                : /
+    Developer            : Felix von Studsinske
+    Description          : -- optional --
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+
+Headless PDF export of a plot GeoPackage, without any widgets.
+
+Usage (plugins folder in PYTHONPATH, QGIS python environment):
+    python -m easy_print_menu.modules.plot.plot_batch plot.gpkg project.qgz output.pdf [--workers 8] [--cache [DIR]] [--chunk-size 50]
+
+Exit codes:
+    0: PDF created
+    1-6: QgsLayoutExporter error code (Canceled, MemoryError, FileError, ...)
+    10: invalid input (missing file, no plot file, no pages, ...)
+    11: partial pdf files could not be merged or split (parallel export, page cache)
+"""
+
+import argparse
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from dataclasses import replace
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from qgis.core import QgsApplication, QgsProject, Qgis, QgsLayoutExporter
+
+from typing import List, Optional, Tuple
+
+from ..template.base_class import ModuleBase, Plugin
+from ...submodules.tools.geopackage import GeoPackage
+from ...submodules.tools.pdf import merge_pdf_files
+from .plot import PrintLayout
+from .plot_cache import PageRenderCache
+from .plot_export import PageChunkIterator, PdfExportTask
+from .plot_layer import PlotLayer
+from .plot_layout_templates import PlotLayoutTemplates
+from .plot_report import RenderReport
+
+EXIT_SUCCESS = 0
+EXIT_INVALID_INPUT = 10
+EXIT_MERGE_ERROR = 11
+
+
+class BatchProgressBar:
+    """ Stand-in for QProgressBar, only keeps values. """
+
+    def __init__(self):
+        self._value = 0
+        self._minimum = 0
+        self._maximum = 100
+        self._format = ""
+
+    def value(self) -> int:
+        return self._value
+
+    def setValue(self, value: int):
+        self._value = value
+
+    def minimum(self) -> int:
+        return self._minimum
+
+    def setMinimum(self, value: int):
+        self._minimum = value
+
+    def maximum(self) -> int:
+        return self._maximum
+
+    def setMaximum(self, value: int):
+        self._maximum = value
+
+    def setFormat(self, bar_format: str):
+        self._format = bar_format
+
+    def hide(self):
+        ...
+
+    def show(self):
+        ...
+
+
+class BatchProgress:
+    """ Headless replacement for DoubleProgressGroup.
+        Provides the same methods used by PrintLayout and PlotLayoutTemplates, but without widgets.
+
+        :param log: callable to log main texts
+    """
+
+    def __init__(self, log=None):
+        self._log = log
+        self._main = BatchProgressBar()
+        self._sub = BatchProgressBar()
+        self._canceled = False
+        self.progress_active = False
+
+    def set_text_main(self, text: str, style: str = "") -> None:
+        if callable(self._log) and text:
+            self._log(text)
+
+    def set_text_single(self, text: str, style: str = "") -> None:
+        ...
+
+    def get_mainbar(self) -> BatchProgressBar:
+        return self._main
+
+    def get_subbar(self) -> BatchProgressBar:
+        return self._sub
+
+    def add_main(self, value: int = 1) -> None:
+        self._main.setValue(self._main.value() + value)
+
+    def add_sub(self, value: int = 1) -> None:
+        self._sub.setValue(self._sub.value() + value)
+
+    def cancel(self) -> None:
+        self._canceled = True
+
+    def canceled(self) -> bool:
+        return self._canceled
+
+    def restore(self) -> None:
+        self._main.setValue(0)
+        self._main.setMaximum(100)
+        self._sub.setValue(0)
+        self._sub.setMaximum(100)
+        self._canceled = False
+        self.progress_active = False
+
+    def start_progressbars(self, minimum: int, maximum: int, hide_widgets: list,
+                           can_cancel: bool = False, use_subbar: bool = True,
+                           bar_format: str = "%p % (%v / %m)") -> tuple:
+        self.progress_active = True
+        self._main.setValue(0)
+        self._main.setMinimum(minimum)
+        self._main.setMaximum(maximum)
+        self._main.setFormat(bar_format)
+
+        return self._main, None
+
+
+class BatchPlugin(ModuleBase, Plugin):
+    """ Minimal plugin object for headless exports.
+        Provides the plugin paths needed by PlotLayoutTemplates and PrintLayout.
+
+        :param verbose: print log messages to stdout too
+    """
+
+    def __init__(self, verbose: bool = False, **kwargs):
+        self.plugin_dir = str(Path(__file__).parent.parent.parent)
+        self.icons_dir = os.path.join(self.plugin_dir, 'templates', 'icons')
+        self.plots_dir = str(Path(self.plugin_dir) / "templates" / "plots")
+        self.plugin_menu = "Easy Print Menu"
+        self.verbose = verbose
+
+        ModuleBase.__init__(self, None, self.plugin_menu, None, **kwargs)
+
+        self.progress = BatchProgress(log=self.log)
+
+    def log(self, text: str, tag: str = 'Easy Print Menu') -> Optional[str]:
+        """ Writes log to QGIS message log and to stdout, if verbose """
+        QgsApplication.messageLog().logMessage(text, tag, Qgis.Info)
+        if self.verbose:
+            print(text)
+
+        return text
+
+    def get_icon_path(self, icon: str, folder: Optional[str] = None) -> str:
+        from ...plugin import PluginPlot
+        return PluginPlot.get_icon_path(self, icon, folder)
+
+
+def init_qgis() -> Optional[QgsApplication]:
+    """ Starts a QGIS application without gui, if not already running.
+
+        :return: new application, None if an application was already running
+    """
+    if QgsApplication.instance() is not None:
+        return None
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    prefix_path = os.environ.get("QGIS_PREFIX_PATH", "")
+    if prefix_path:
+        QgsApplication.setPrefixPath(prefix_path, True)
+
+    app = QgsApplication([], False)
+    app.initQgis()
+
+    return app
+
+
+def split_pages(count: int, parts: int) -> List[Tuple[int, int]]:
+    """ Splits page indices into contiguous ranges with nearly equal size.
+
+        :param count: count of pages
+        :param parts: count of ranges, limited to count of pages
+        :return: list of (start, stop) tuples, stop is excluded
+    """
+    parts = max(1, min(parts, count))
+    size, rest = divmod(count, parts)
+
+    ranges = []
+    start = 0
+    for part in range(parts):
+        stop = start + size + (1 if part < rest else 0)
+        ranges.append((start, stop))
+        start = stop
+
+    return ranges
+
+
+def is_input_valid(plugin: BatchPlugin, gpkg: str, project: str) -> bool:
+    """ checks, if plot file and project file exists """
+    for path in (gpkg, project):
+        if not Path(path).is_file():
+            plugin.log(f"file '{path}' not found")
+            return False
+
+    if not PlotLayer.is_plot_file(gpkg):
+        plugin.log(f"file '{gpkg}' is not a plot file")
+        return False
+
+    return True
+
+
+def initialize_layouts(plugin: BatchPlugin, layouts: PlotLayoutTemplates, plot_layer: PlotLayer) -> bool:
+    """ Writes default options of all layouts into the plot file and loads icons of the layouts.
+        Read-only plot layers get only the icons, their defaults have been written before.
+
+        :return: False, if no layout with template file of plot layer exists
+    """
+    try:
+        own_layout = layouts[plot_layer.file]
+    except KeyError:
+        plugin.log(f"no layout found with path '{plot_layer.file}'")
+        return False
+
+    for layout in [own_layout] + [layout for layout in layouts if layout.path != plot_layer.file]:
+        if plot_layer.read_only:
+            layouts.load_icons(layout)
+        else:
+            layouts.initialize_defaults(plot_layer, layout)
+
+    return True
+
+
+def export_pdf(plugin: BatchPlugin, gpkg: str, project: str, output: str,
+               page_range: Optional[Tuple[int, int]] = None, cache_dir: Optional[str] = None,
+               cache_size: int = PageRenderCache.MAX_SIZE, chunk_size: int = 0, profile_layers: bool = False, profile: Optional[str] = None,
+               read_only: bool = False) -> int:
+    """ Loads project and plot layer and exports all pages into one pdf file.
+
+        :param plugin: headless plugin object
+        :param gpkg: path to plot GeoPackage
+        :param project: path to QGIS project file
+        :param output: pdf file path
+        :param page_range: build and export only layout pages from start to stop (excluded),
+                           page numbers and page count stay the same like in the whole layout
+        :param cache_dir: render only changed pages and take all other pages from this cache folder
+        :param cache_size: maximum size of cache folder in bytes, least recently used pages are removed
+        :param chunk_size: build and export only this count of pages at once to limit memory, 0 for all pages
+        :param profile_layers: measure render time per layer and page for the timing report,
+                               like `ExportProfile.profile_layers`
+        :param profile: name of export profile, None for selected profile in plot file
+        :param read_only: open plot file read-only, defaults have been written before, e.g. by `export_pdf_parallel`
+        :return: exit code
+    """
+    if not is_input_valid(plugin, gpkg, project):
+        return EXIT_INVALID_INPUT
+
+    if not QgsProject.instance().read(project):
+        plugin.log(f"project '{project}' could not be read: {QgsProject.instance().error()}")
+        return EXIT_INVALID_INPUT
+
+    layouts: PlotLayoutTemplates = plugin.add_module("PlotLayoutTemplates", PlotLayoutTemplates)
+    layouts.load_layouts()
+
+    try:
+        plot_layer = PlotLayer(gpkg, read_only=read_only)
+    except sqlite3.Error as e:
+        plugin.log(f"plot file could not be opened: {e}")
+        return EXIT_INVALID_INPUT
+    plot_layer.layer_pages.loadNamedStyle(os.path.join(plugin.plugin_dir,
+                                                       'templates',
+                                                       'plots',
+                                                       'plot_layer_stil.qml'),
+                                          True)
+    if not initialize_layouts(plugin, layouts, plot_layer):
+        return EXIT_INVALID_INPUT
+    if not read_only:
+        # read-only workers get fixed page numbers from `export_pdf_parallel`
+        plot_layer.fix_page_numbers()
+
+    try:
+        export_profile = plot_layer.get_export_profile(profile)
+    except KeyError:
+        plugin.log(f"no export profile found with name '{profile}'")
+        return EXIT_INVALID_INPUT
+    plugin.log(f"export profile '{export_profile.name}'")
+    if profile_layers:
+        export_profile = replace(export_profile, profile_layers=True)
+
+    if cache_dir is not None:
+        cache: PageRenderCache = plugin.add_module("PageRenderCache", PageRenderCache, directory=cache_dir,
+                                                   max_size=cache_size)
+        start = time.perf_counter()
+        try:
+            error = cache.export(plot_layer, plugin.progress, layouts, output, export_profile)
+        except AssertionError as e:
+            plugin.log(str(e))
+            return EXIT_INVALID_INPUT
+        plugin.log(f"pdf exported in {time.perf_counter() - start:.3f} s")
+
+        if error:
+            plugin.log(error)
+            return int(cache.export_result or EXIT_MERGE_ERROR)
+
+        plugin.log(f"pdf saved '{output}'")
+        return EXIT_SUCCESS
+
+    if chunk_size > 0:
+        iterator = PageChunkIterator(plugin, plot_layer, plugin.progress, layouts, chunk_size, export_profile)
+        plugin.log(f"exporting {len(iterator.chunks)} chunks with up to {chunk_size} pages")
+        start = time.perf_counter()
+        try:
+            result = iterator.create_pdf(output)
+        except AssertionError as e:
+            plugin.log(str(e))
+            return EXIT_INVALID_INPUT
+        plugin.log(f"pdf exported in {time.perf_counter() - start:.3f} s")
+
+        error = PrintLayout.get_export_error(result)
+        if error:
+            plugin.log(error)
+            return int(result)
+
+        iterator.report.log(plugin.log)
+        try:
+            plugin.log(f"timing report saved '{iterator.report.write(output)}'")
+        except OSError as e:
+            plugin.log(f"report could not be saved: {e}")
+
+        plugin.log(f"pdf saved '{output}'")
+        return EXIT_SUCCESS
+
+    # keys of layout pages in range, None for all pages
+    page_keys = PrintLayout.get_page_keys(plot_layer, export_profile)[slice(*page_range)] \
+        if page_range is not None else None
+
+    start = time.perf_counter()
+    try:
+        layout: PrintLayout = plugin.add_module("PrintLayout", PrintLayout,
+                                                plot_layer=plot_layer, progress=plugin.progress,
+                                                layouts=layouts, auto_finish=False, page_keys=page_keys,
+                                                profile=export_profile)
+    except AssertionError as e:
+        plugin.log(str(e))
+        return EXIT_INVALID_INPUT
+    build_time = time.perf_counter() - start
+
+    plugin.log(f"layout built in {build_time:.3f} s")
+    plugin.log(f"plot file validation cache: {PlotLayer.validation_cache.hits} hits, "
+               f"{PlotLayer.validation_cache.misses} misses")
+
+    start = time.perf_counter()
+    task = PdfExportTask(layout, output)
+    task.run()
+    plugin.log(f"pdf exported in {time.perf_counter() - start:.3f} s")
+
+    if not task.error:
+        plugin.log(f"timing report saved '{task.write_report()}'")
+    layout.cleanup_layout()
+    layout.remove_legend_group()
+    layout.unload(True)
+
+    if task.error:
+        plugin.log(task.error)
+        return int(task.export_result or QgsLayoutExporter.PrintError)
+
+    plugin.log(f"pdf saved '{output}'")
+    return EXIT_SUCCESS
+
+
+def export_pdf_parallel(plugin: BatchPlugin, gpkg: str, project: str, output: str, workers: int,
+                        profile: Optional[str] = None, profile_layers: bool = False) -> int:
+    """ Splits the layout pages into ranges and exports each range in an own process.
+        Each process builds and exports only the pages of its range, see `PrintLayout` with `page_keys`.
+        All partial pdf files will be merged in page order.
+
+        Default options and page numbers are written once before, the processes open the plot file read-only.
+        The timing reports of all processes are merged.
+
+        :param plugin: headless plugin object
+        :param gpkg: path to plot GeoPackage
+        :param project: path to QGIS project file
+        :param output: pdf file path
+        :param workers: count of processes
+        :param profile: name of export profile, None for selected profile in plot file
+        :param profile_layers: measure render time per layer and page for the timing report
+        :return: exit code
+    """
+    if not is_input_valid(plugin, gpkg, project):
+        return EXIT_INVALID_INPUT
+
+    if not QgsProject.instance().read(project):
+        plugin.log(f"project '{project}' could not be read: {QgsProject.instance().error()}")
+        return EXIT_INVALID_INPUT
+
+    layouts: PlotLayoutTemplates = plugin.add_module("PlotLayoutTemplates", PlotLayoutTemplates)
+    layouts.load_layouts()
+
+    try:
+        plot_layer = PlotLayer(gpkg)
+    except sqlite3.Error as e:
+        plugin.log(f"plot file could not be opened: {e}")
+        return EXIT_INVALID_INPUT
+    # workers have only to read: same values from function defaults and no gaps in page numbers
+    if not initialize_layouts(plugin, layouts, plot_layer):
+        return EXIT_INVALID_INPUT
+    plot_layer.fix_page_numbers()
+    try:
+        page_count = PrintLayout.get_layout_page_count(plot_layer, plot_layer.get_export_profile(profile))
+    except KeyError:
+        plugin.log(f"no export profile found with name '{profile}'")
+        return EXIT_INVALID_INPUT
+    if not plot_layer.edit_buffer.flush():
+        plugin.log(f"plot file could not be saved: {plot_layer.edit_buffer.error}")
+        return EXIT_INVALID_INPUT
+    plot_layer.gpkg_data.release()
+    del plot_layer
+    if page_count < 1:
+        plugin.log("no pages in plot file")
+        return EXIT_INVALID_INPUT
+
+    ranges = split_pages(page_count, workers)
+    with tempfile.TemporaryDirectory(dir=str(Path(output).parent)) as temp_dir:
+        parts = [os.path.join(temp_dir, f"part_{i}.pdf") for i in range(len(ranges))]
+
+        def run_worker(i: int) -> int:
+            start, stop = ranges[i]
+            args = [sys.executable, "-m", __spec__.name, gpkg, project, parts[i],
+                    "--page-range", f"{start}:{stop}", "--read-only"]
+            if profile is not None:
+                args.extend(["--profile", profile])
+            if profile_layers:
+                args.append("--profile-layers")
+            if not plugin.verbose:
+                args.append("--quiet")
+            plugin.log(f"worker {i} exports pages {start + 1} - {stop}")
+
+            return subprocess.run(args).returncode
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+            codes = list(pool.map(run_worker, range(len(ranges))))
+
+        for code in codes:
+            if code != EXIT_SUCCESS:
+                return code
+        plugin.log(f"{len(ranges)} workers finished in {time.perf_counter() - start:.3f} s")
+
+        start = time.perf_counter()
+        try:
+            merge_pdf_files(parts, output)
+        except (ModuleNotFoundError, OSError, ValueError) as e:
+            plugin.log(str(e))
+            return EXIT_MERGE_ERROR
+        plugin.log(f"pdf files merged in {time.perf_counter() - start:.3f} s")
+
+        report = RenderReport()
+        for i, part in enumerate(parts):
+            try:
+                report.merge(RenderReport.read(RenderReport.get_report_path(part)))
+            except (OSError, ValueError) as e:
+                plugin.log(f"report of worker {i} could not be read: {e}")
+        report.log(plugin.log)
+        try:
+            plugin.log(f"timing report saved '{report.write(output)}'")
+        except OSError as e:
+            plugin.log(f"report could not be saved: {e}")
+
+    plugin.log(f"pdf saved '{output}'")
+    return EXIT_SUCCESS
+
+
+def get_default_cache_dir() -> str:
+    """ returns page cache folder in QGIS settings folder """
+    return os.path.join(QgsApplication.qgisSettingsDirPath(), "cache", "easy_print_menu")
+
+
+def parse_page_range(value: str) -> Tuple[int, int]:
+    """ parses page range argument "start:stop" """
+    start, stop = value.split(":")
+    return int(start), int(stop)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Creates a pdf file from a plot GeoPackage without gui.")
+    parser.add_argument("gpkg", help="plot GeoPackage")
+    parser.add_argument("project", help="QGIS project file (.qgs/.qgz)")
+    parser.add_argument("output", help="pdf file path")
+    parser.add_argument("--quiet", action="store_true", help="do not print progress and timings")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="count of processes to render pages in parallel (needs python package pypdf)")
+    parser.add_argument("--page-range", type=parse_page_range, default=None,
+                        help="build and export only layout pages start:stop (zero based, stop excluded)")
+    parser.add_argument("--cache", nargs="?", const="", default=None, metavar="DIR",
+                        help="render only changed pages, take unchanged pages from cache folder "
+                             "(default folder in QGIS settings, needs python package pypdf)")
+    parser.add_argument("--cache-size", type=int, default=PageRenderCache.MAX_SIZE // 2 ** 20, metavar="MB",
+                        help="maximum size of cache folder, least recently used pages are removed")
+    parser.add_argument("--chunk-size", type=int, default=0,
+                        help="build and export only this count of pages at once to limit memory usage")
+    parser.add_argument("--profile-layers", action="store_true",
+                        help="render each layer again after export to write its render time into the timing report")
+    parser.add_argument("--profile", default=None, metavar="NAME",
+                        help="export profile like 'draft' or 'final' (default selected profile in plot file)")
+    parser.add_argument("--read-only", action="store_true",
+                        help="open plot file read-only, default options have to be written before "
+                             "(used by --workers)")
+    args = parser.parse_args(argv)
+
+    app = init_qgis()
+    plugin = BatchPlugin(verbose=not args.quiet)
+    cache_dir = args.cache
+    if cache_dir == "":
+        cache_dir = get_default_cache_dir()
+    try:
+        if cache_dir is not None:
+            code = export_pdf(plugin, args.gpkg, args.project, args.output, cache_dir=cache_dir,
+                              cache_size=args.cache_size * 2 ** 20,
+                              profile_layers=args.profile_layers, profile=args.profile)
+        elif args.workers > 1 and args.page_range is None:
+            code = export_pdf_parallel(plugin, args.gpkg, args.project, args.output, args.workers, args.profile,
+                                       args.profile_layers)
+        else:
+            code = export_pdf(plugin, args.gpkg, args.project, args.output, args.page_range,
+                              chunk_size=0 if args.page_range is not None else args.chunk_size,
+                              profile_layers=args.profile_layers, profile=args.profile, read_only=args.read_only)
+    finally:
+        plugin.unload()
+        QgsProject.instance().clear()
+        GeoPackage.pool.release_all()
+        if app is not None:
+            app.exitQgis()
+
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
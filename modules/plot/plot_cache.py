@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    Date                 : October 2026
+    Copyright            : Felix von Studsinske
+    Email                : /
+    Developer            : Felix von Studsinske
+    Description          : -- optional --
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+
+from datetime import datetime
+from pathlib import Path
+
+from qgis.core import QgsProject, QgsMapLayer, QgsMapLayerStyle, QgsFeatureRequest, QgsProviderRegistry
+
+from typing import Dict, List, Optional, Union
+
+from .plot import PrintLayout
+from .plot_config import ExportProfile
+from .plot_export import PdfExportTask
+from .plot_layer import PlotLayer
+from .plot_layout_templates import PlotLayoutTemplates
+from .plot_report import RenderReport
+from .plot_store import PlotStore
+from ..template.base_class import ModuleBase
+from ..template.gui.progressbar_extended import DoubleProgressGroup
+from ...submodules.tools.pdf import merge_pdf_files, split_pdf_file
+
+
+class PageRenderCache(ModuleBase):
+    """
+        Content-addressed cache for rendered pdf pages.
+        Every layout page gets a key from all inputs, which can change its content
+        (page feature, template file, layer data and styles).
+        Only pages without cached pdf file will be built and rendered, all other pages are taken from cache.
+
+        Layers without a local data file (e.g. PostGIS, WFS, WMS, memory layers) can change without notice,
+        pages showing them are rendered on every export and are not cached.
+        The least recently used files are removed, when the cache folder is bigger than `max_size`.
+        The timing report of the last export contains the rendered pages, cached pages are marked.
+
+        :param directory: cache folder, will be created if missing
+        :param max_size: maximum size of cache folder in bytes
+    """
+
+    # increase, when the rendering of pages changes, to invalidate old cache files
+    CACHE_VERSION = 3
+
+    MAX_SIZE = 512 * 2 ** 20
+
+    def __init__(self, directory: str, *args, max_size: int = MAX_SIZE, **kwargs):
+
+        ModuleBase.__init__(self, *args, **kwargs)
+
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # QgsLayoutExporter result of last export, None if all pages are taken from cache
+        self.export_result = None
+        self.report = RenderReport()
+        Path(directory).mkdir(parents=True, exist_ok=True)
+
+    def get_path(self, key: str) -> str:
+        """ returns pdf file path for given cache key """
+        return os.path.join(self.directory, key[:2], f"{key}.pdf")
+
+    def contains(self, key: str) -> bool:
+        return Path(self.get_path(key)).is_file()
+
+    def get_page_keys(self, plot_layer: PlotLayer, layouts: PlotLayoutTemplates,
+                      profile: ExportProfile) -> Dict[Union[str, int], Optional[str]]:
+        """ Returns cache keys per layout page, keys like in `PrintLayout.page_indices`.
+            Order of the dictionary is the page order in pdf file.
+            Key is None for pages, which can not be cached.
+        """
+        fingerprints: Dict[str, Optional[str]] = {}
+        templates: Dict[str, str] = {}
+
+        def layers_digest(layers: List[QgsMapLayer]) -> Optional[str]:
+            """ None, if a layer can not be cached """
+            digest = hashlib.sha256()
+            for layer in layers:
+                if layer.id() not in fingerprints:
+                    fingerprints[layer.id()] = self.get_layer_fingerprint(layer)
+                if fingerprints[layer.id()] is None:
+                    return None
+                digest.update(fingerprints[layer.id()].encode())
+            return digest.hexdigest()
+
+        def page_key(*values, digests: List[Optional[str]]) -> Optional[str]:
+            return None if None in digests else self.hash(*values, *digests)
+
+        def template_digest(file: str) -> str:
+            if file not in templates:
+                templates[file] = self.get_template_fingerprint(layouts[file])
+            return templates[file]
+
+        layer_order = [layer.id() for layer in QgsProject.instance().layerTreeRoot().layerOrder()]
+        common = [self.CACHE_VERSION,
+                  plot_layer.options,
+                  plot_layer.visibility.visibility,
+                  plot_layer.show_map_tips,
+                  plot_layer.show_legend_on_page,
+                  plot_layer.legend_on_extra_page,
+                  plot_layer.create_overview_page,
+                  plot_layer.dpi,
+                  # measuring render times does not change pages
+                  {key: value for key, value in profile.to_dict().items() if key != 'profile_layers'},
+                  plot_layer.get_crs().toWkt(),
+                  plot_layer.get_next_page_number() - 1,
+                  layer_order]
+        pages_layer = self.get_pages_fingerprint(plot_layer)
+
+        keys: Dict[Union[str, int], str] = {}
+
+        if profile.get_create_overview_page(plot_layer):
+            file = plot_layer.file
+            keys['overview'] = page_key(common,
+                                        'overview',
+                                        template_digest(file),
+                                        pages_layer,
+                                        digests=[layers_digest(plot_layer.visibility.get_layer_visibilities('overview'))])
+
+        geometries = {feature.id(): feature.geometry().asWkb().data()
+                      for feature in plot_layer.layer_pages.getFeatures(
+                          QgsFeatureRequest().setNoAttributes())}
+
+        page_keys = {}
+        for plot_page in plot_layer.get_pages():
+            visibility = plot_page.visibility
+            page_keys[plot_page.page] = page_key(common,
+                                                 plot_page.page,
+                                                 template_digest(plot_page.file),
+                                                 plot_page.scale,
+                                                 plot_page.rotation,
+                                                 plot_page.options,
+                                                 visibility.visibility,
+                                                 plot_page.show_map_tips,
+                                                 plot_page.show_legend_on_page,
+                                                 plot_page.show_mini_map,
+                                                 geometries[plot_page.fid],
+                                                 # mini map shows all pages
+                                                 pages_layer if plot_page.show_mini_map else "",
+                                                 digests=[layers_digest(visibility.get_layer_visibilities('page')),
+                                                          layers_digest(visibility.get_layer_visibilities('mini_map')),
+                                                          layers_digest(visibility.get_layer_visibilities('legend'))])
+
+        if profile.get_legend_on_extra_page(plot_layer):
+            # extra legend is filtered by all page maps
+            hidden = set(plot_layer.store.get_layer_ids(PlotStore.GLOBAL, 'legend', False))
+            legend_layers = [layer for layer in plot_layer.visibility.get_layers() if layer.id() not in hidden]
+            keys['extra_legend'] = page_key(common,
+                                            'extra_legend',
+                                            template_digest(plot_layer.file),
+                                            digests=[layers_digest(legend_layers), *page_keys.values()])
+
+        keys.update(page_keys)
+        return keys
+
+    @staticmethod
+    def hash(*values) -> str:
+        digest = hashlib.sha256()
+        for value in values:
+            if isinstance(value, bytes):
+                digest.update(value)
+            else:
+                digest.update(repr(value).encode())
+            digest.update(b"\x00")
+
+        return digest.hexdigest()
+
+    @classmethod
+    def get_template_fingerprint(cls, layout) -> str:
+        """ Hash from template file, its icons and the current date text (date label is on every page). """
+        values = []
+        for path in [layout.filepath] + sorted(layout.icons.values()):
+            if path and Path(path).is_file():
+                values.append(Path(path).read_bytes())
+            else:
+                values.append(path)
+
+        if layout.item_date is not None:
+            values.append(datetime.now().strftime(layout.item_date.text()))
+
+        return cls.hash(*values)
+
+    @staticmethod
+    def get_data_files(layer: QgsMapLayer) -> Optional[List[Path]]:
+        """ Returns data file of layer and all files next to it with the same name,
+            e.g. .dbf/.shx/.prj of shapefiles or -wal of GeoPackages.
+
+            :return: None, if layer has no local data file
+        """
+        path = QgsProviderRegistry.instance().decodeUri(layer.providerType(), layer.source()).get('path', "")
+        try:
+            if not path or not Path(path).is_file():
+                return None
+        except OSError:
+            return None
+
+        path = Path(path)
+        return sorted(file for file in path.parent.glob(f"{glob.escape(path.stem)}.*") if file.is_file())
+
+    @classmethod
+    def get_layer_fingerprint(cls, layer: QgsMapLayer) -> Optional[str]:
+        """ Hash from layer source, style and state (size, modification time) of all data files.
+
+            :return: None, if layer has no local data file and can not be cached
+        """
+        files = cls.get_data_files(layer)
+        if files is None:
+            return None
+
+        style = QgsMapLayerStyle()
+        style.readFromLayer(layer)
+        values = [layer.id(),
+                  layer.source(),
+                  layer.crs().authid(),
+                  style.xmlData(),
+                  layer.opacity(),
+                  getattr(layer, 'subsetString', lambda: "")()]
+
+        for file in files:
+            stat = file.stat()
+            values.extend([file.name, stat.st_size, stat.st_mtime_ns])
+
+        return cls.hash(*values)
+
+    @classmethod
+    def get_pages_fingerprint(cls, plot_layer: PlotLayer) -> str:
+        """ Hash from pages layer style and page geometries.
+            The plot file itself changes with every option, so it is not used like other layer files.
+        """
+        layer = plot_layer.layer_pages
+        style = QgsMapLayerStyle()
+        style.readFromLayer(layer)
+        values = [style.xmlData(), layer.opacity()]
+        request = QgsFeatureRequest().setSubsetOfAttributes(['page'], layer.fields())
+        for feature in layer.getFeatures(request):
+            values.extend([feature.id(), feature['page'], feature.geometry().asWkb().data()])
+
+        return cls.hash(*values)
+
+    def export(self, plot_layer: PlotLayer, progress: DoubleProgressGroup,
+               layouts: PlotLayoutTemplates, save_path: str, profile: Optional[ExportProfile] = None) -> str:
+        """ Exports plot layer to pdf, only changed pages will be rendered.
+
+            :param plot_layer: plot layer to export
+            :param progress: progress for PrintLayout
+            :param layouts: loaded templates
+            :param save_path: pdf file path
+            :param profile: export profile, None for selected profile in plot layer
+            :return: error message, empty if successful
+        """
+        profile = profile if profile is not None else plot_layer.get_export_profile()
+        keys = self.get_page_keys(plot_layer, layouts, profile)
+        dirty = [page for page, key in keys.items() if key is None or not self.contains(key)]
+        self.hits = len(keys) - len(dirty)
+        self.misses = len(dirty)
+        self.export_result = None
+        self.report = RenderReport()
+        for page in keys:
+            if page not in dirty:
+                self.report.set_cached(page)
+
+        with tempfile.TemporaryDirectory(dir=self.directory) as temp_dir:
+            # pdf file per page
+            paths = {page: self.get_path(key) for page, key in keys.items() if key is not None}
+            if dirty:
+                layout: PrintLayout = self.add_module("PrintLayout", PrintLayout,
+                                                      plot_layer=plot_layer, progress=progress,
+                                                      layouts=layouts, auto_finish=False,
+                                                      page_keys=dirty, profile=profile)
+                page_indices = dict(layout.page_indices)
+                temp_path = os.path.join(temp_dir, "pages.pdf")
+                layout.add_to_instance()
+                task = PdfExportTask(layout, temp_path)
+                task.run()
+                self.export_result = task.export_result
+                self.report.merge(layout.report)
+                layout.cleanup_layout()
+                layout.remove_from_instance()
+                layout.remove_legend_group()
+                layout.unload(True)
+                if task.error:
+                    return task.error
+
+                pages = sorted(page_indices, key=lambda page: page_indices[page])
+                destinations = [os.path.join(temp_dir, f"{index}.pdf") for index in range(len(pages))]
+                try:
+                    split_pdf_file(temp_path, destinations)
+                except (ModuleNotFoundError, ValueError, OSError) as e:
+                    return str(e)
+                for page, destination in zip(pages, destinations):
+                    if keys[page] is None:
+                        # not cached, e.g. database layer on page
+                        paths[page] = destination
+                        continue
+                    Path(paths[page]).parent.mkdir(exist_ok=True)
+                    shutil.move(destination, paths[page])
+
+            try:
+                merge_pdf_files([paths[page] for page in keys], save_path)
+            except (ModuleNotFoundError, ValueError, OSError) as e:
+                return str(e)
+
+        # mark used files, they are removed last
+        for page, key in keys.items():
+            if key is not None and page not in dirty:
+                os.utime(paths[page])
+        self.prune()
+        self.log(f"pdf page cache: {self.hits} hits, {self.misses} misses")
+        self.report.log(self.log)
+        try:
+            self.log(f"timing report saved '{self.report.write(save_path)}'")
+        except OSError as e:
+            self.log(f"report could not be saved: {e}")
+
+        return ""
+
+    def prune(self, max_size: Optional[int] = None) -> int:
+        """ Removes least recently used pdf files, until the cache folder is not bigger than `max_size`.
+
+            :param max_size: maximum size in bytes, None for `self.max_size`
+            :return: count of removed files
+        """
+        max_size = self.max_size if max_size is None else max_size
+        files = []
+        for path in Path(self.directory).glob("*/*.pdf"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime_ns, stat.st_size, path))
+
+        size = sum(file[1] for file in files)
+        removed = 0
+        for _, file_size, path in sorted(files):
+            if size <= max_size:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            size -= file_size
+            removed += 1
+
+        return removed
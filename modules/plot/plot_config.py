@@ -1,14 +1,73 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict, fields
 
 from qgis.core import QgsWkbTypes, NULL
 from qgis.PyQt.QtCore import QVariant
 
+from typing import Optional
+
 
 @dataclass
 class Rotation:
     value: float
 
 
+@dataclass
+class ExportProfile:
+    """ Named pdf export settings.
+        Values with None are taken from plot layer options.
+    """
+    name: str
+    dpi: Optional[int] = None
+    simplify_geometries: bool = True
+    force_vector_output: bool = False
+    rasterize_whole_image: bool = False
+    antialiasing: bool = True
+    advanced_effects: bool = True
+    # render each layer of each map again after export, to write its render time into the timing report
+    profile_layers: bool = False
+    create_overview_page: Optional[bool] = None
+    legend_on_extra_page: Optional[bool] = None
+
+    @classmethod
+    def from_dict(cls, name: str, values: dict) -> 'ExportProfile':
+        """ creates profile from json values, unknown keys are ignored """
+        names = [field.name for field in fields(cls) if field.name != 'name']
+        return cls(name, **{key: value for key, value in values.items() if key in names})
+
+    def to_dict(self) -> dict:
+        values = asdict(self)
+        del values['name']
+        return values
+
+    def get_dpi(self, plot_layer) -> int:
+        return self.dpi if self.dpi is not None else plot_layer.dpi
+
+    def get_create_overview_page(self, plot_layer) -> bool:
+        if self.create_overview_page is not None:
+            return self.create_overview_page
+        return plot_layer.create_overview_page
+
+    def get_legend_on_extra_page(self, plot_layer) -> bool:
+        if self.legend_on_extra_page is not None:
+            return self.legend_on_extra_page
+        return plot_layer.legend_on_extra_page
+
+
+# built-in profiles, can be overwritten by profiles in plot layer option 'export_profiles'
+EXPORT_PROFILES = {
+    # settings from plot layer
+    'final': ExportProfile('final'),
+    # fast proofing: low resolution, one raster image per page, no extra pages
+    'draft': ExportProfile('draft',
+                           dpi=72,
+                           rasterize_whole_image=True,
+                           antialiasing=False,
+                           advanced_effects=False,
+                           create_overview_page=False,
+                           legend_on_extra_page=False),
+}
+
+
 PLOT_PAGES = {
     'NAME': 'pages',
     'WKBTYPE': QgsWkbTypes.Polygon,
@@ -128,5 +187,18 @@ PLOT_OPTIONS = {
             'type': QVariant.String,
             'default': "{}"
         },
+        # name of selected export profile
+        # optional: column will be added to older plot files
+        'export_profile': {
+            'type': QVariant.String,
+            'default': "final",
+            'optional': True
+        },
+        # own export profiles, {name: {ExportProfile attribute: value}}
+        'export_profiles': {
+            'type': QVariant.String,
+            'default': "{}",
+            'optional': True
+        },
     },
 }
@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    Date                 : October 2026
+    Copyright            : Felix von Studsinske
+    Email                : /
+    Developer            : Felix von Studsinske
+    Description          : -- optional --
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+import time
+
+from pathlib import Path
+
+from qgis.PyQt.QtCore import pyqtSignal, QSizeF, QThread
+from qgis.core import (QgsAbstractLayoutIterator, QgsLayout, QgsLayoutExporter, QgsFeedback, QgsTask,
+                       QgsLayoutItemMap, QgsMapRendererSequentialJob)
+
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from .plot import PrintLayout
+from .plot_config import ExportProfile
+from .plot_layer import PlotLayer
+from .plot_layout_templates import PlotLayoutTemplates
+from .plot_report import RenderReport
+from ..template.base_class import ModuleBase
+from ..template.gui.progressbar_extended import DoubleProgressGroup
+
+
+def measure_layers(layout: QgsLayout, page_keys: Dict[int, Union[str, int]], dpi: int, report: RenderReport,
+                   feedback: Optional[QgsFeedback] = None):
+    """ Renders each layer of each exported map item alone and adds its render time to report.
+
+        :param layout: exported layout
+        :param page_keys: report page key per layout page index, only maps on these pages are rendered
+        :param dpi: resolution of export
+        :param report: report to add the times to
+        :param feedback: feedback for cancellation
+    """
+    pixels = dpi / 25.4
+    for item in layout.items():
+        if not isinstance(item, QgsLayoutItemMap) or item.excludeFromExports() or item.page() not in page_keys:
+            continue
+
+        size = QSizeF(item.rect().width() * pixels, item.rect().height() * pixels)
+        for layer in item.layers():
+            if feedback is not None and feedback.isCanceled():
+                return
+
+            settings = item.mapSettings(item.extent(), size, dpi, True)
+            settings.setLayers([layer])
+            job = QgsMapRendererSequentialJob(settings)
+            start = time.perf_counter()
+            job.start()
+            job.waitForFinished()
+            report.add_layer(page_keys[item.page()], f"{layer.name()} ({layer.id()})", time.perf_counter() - start)
+
+
+class PageChunkIterator(QgsAbstractLayoutIterator):
+    """
+        Layout iterator for `QgsLayoutExporter.exportToPdf`, which builds one PrintLayout per chunk of pages.
+        The exporter writes all chunks into the same pdf file, only the layout of the current chunk is in memory.
+        Build times of all chunks and the render time per chunk are collected in `report`,
+        with `ExportProfile.profile_layers` the layers of each chunk are measured after its export.
+
+        :param owner: module to add the PrintLayout modules to
+        :param plot_layer: plot layer to export
+        :param progress: progress for PrintLayout
+        :param layouts: loaded templates
+        :param chunk_size: count of pages per layout
+        :param profile: export profile, None for selected profile in plot layer
+    """
+
+    def __init__(self, owner: ModuleBase, plot_layer: PlotLayer, progress: DoubleProgressGroup,
+                 layouts: PlotLayoutTemplates, chunk_size: int, profile: Optional[ExportProfile] = None):
+        QgsAbstractLayoutIterator.__init__(self)
+
+        self.__owner = owner
+        self.__plot_layer = plot_layer
+        self.__progress = progress
+        self.__layouts = layouts
+        self.__profile = profile if profile is not None else plot_layer.get_export_profile()
+        self.__current: Optional[PrintLayout] = None
+        self.__index = -1
+        # start of rendering of current chunk
+        self.__render_start: Optional[float] = None
+        self.report = RenderReport()
+
+        chunk_size = max(1, chunk_size)
+        keys = PrintLayout.get_page_keys(plot_layer, self.__profile)
+        self.chunks: List[List[Union[str, int]]] = [keys[i:i + chunk_size] for i in range(0, len(keys), chunk_size)]
+
+    def count(self) -> int:
+        return len(self.chunks)
+
+    def beginRender(self) -> bool:
+        self.__index = -1
+        return bool(self.chunks)
+
+    def endRender(self) -> bool:
+        self.release()
+        return True
+
+    def filePath(self, baseFilePath: str, extension: str) -> str:
+        return baseFilePath
+
+    def layout(self) -> Optional[QgsLayout]:
+        if self.__current is None:
+            return None
+        return self.__current.layout
+
+    def next(self) -> bool:
+        """ frees the layout of the last chunk and builds the layout of the next chunk """
+        if self.__render_start is not None:
+            self.report.add_chunk(self.chunks[self.__index], time.perf_counter() - self.__render_start)
+            self.__render_start = None
+            if self.__profile.profile_layers:
+                measure_layers(self.__current.layout,
+                               {index: key for key, index in self.__current.page_indices.items()},
+                               self.__profile.get_dpi(self.__plot_layer), self.report)
+        self.release()
+        self.__index += 1
+        if self.__index >= len(self.chunks):
+            return False
+
+        self.__current = self.__owner.add_module("PrintLayoutChunk", PrintLayout,
+                                                 plot_layer=self.__plot_layer, progress=self.__progress,
+                                                 layouts=self.__layouts, auto_finish=False,
+                                                 page_keys=self.chunks[self.__index], profile=self.__profile)
+        self.__current.add_to_instance()
+        self.__current.prepare_render_context(self.__profile.get_dpi(self.__plot_layer))
+        self.report.merge(self.__current.report)
+        self.__render_start = time.perf_counter()
+
+        return True
+
+    def release(self):
+        """ removes the layout of the current chunk """
+        if self.__current is None:
+            return
+
+        self.__current.cleanup_layout()
+        self.__current.remove_from_instance()
+        self.__current.remove_legend_group()
+        self.__current.unload(True)
+        self.__current = None
+        self.__render_start = None
+
+    def create_pdf(self, save_path: str, feedback: Optional[QgsFeedback] = None) -> int:
+        """ Exports all chunks into one pdf file.
+
+            :param save_path: pdf file path
+            :param feedback: feedback for cancellation
+            :return: QgsLayoutExporter result
+        """
+        settings = PrintLayout.get_pdf_settings(self.__plot_layer, self.__profile)
+        try:
+            result, _ = QgsLayoutExporter.exportToPdf(self, save_path, settings, feedback)
+        finally:
+            self.release()
+
+        return result
+
+
+class LayoutPageIterator(QgsAbstractLayoutIterator):
+    """
+        Layout iterator for `QgsLayoutExporter.exportToPdf`, which exports one page of a layout per iteration.
+        So the exporter reports progress and checks cancellation per page.
+        Pages excluded from export stay excluded.
+
+        :param layout: layout to export
+        :param page_started: called with iteration index, before a page is exported
+    """
+
+    def __init__(self, layout: QgsLayout, page_started: Optional[Callable[[int], None]] = None):
+        QgsAbstractLayoutIterator.__init__(self)
+
+        self.__layout = layout
+        self.__index = -1
+        self.__page_started = page_started
+        collection = layout.pageCollection()
+        self.pages = [index for index in range(collection.pageCount()) if collection.shouldExportPage(index)]
+
+        # render costs per page: the page itself and each layer of its map items
+        costs = {index: 1 for index in self.pages}
+        for item in layout.items():
+            if isinstance(item, QgsLayoutItemMap) and not item.excludeFromExports() and item.page() in costs:
+                costs[item.page()] += len(item.layers())
+        self.layer_counts = [costs[index] - 1 for index in self.pages]
+
+        # finished costs in percent before each page
+        total = sum(costs.values()) or 1
+        self.progress: List[float] = []
+        done = 0
+        for index in self.pages:
+            self.progress.append(100 * done / total)
+            done += costs[index]
+
+    def count(self) -> int:
+        return len(self.pages)
+
+    def beginRender(self) -> bool:
+        self.__index = -1
+        collection = self.__layout.pageCollection()
+        for index in self.pages:
+            collection.page(index).setExcludeFromExports(True)
+
+        return bool(self.pages)
+
+    def endRender(self) -> bool:
+        collection = self.__layout.pageCollection()
+        for index in self.pages:
+            collection.page(index).setExcludeFromExports(False)
+
+        return True
+
+    def filePath(self, baseFilePath: str, extension: str) -> str:
+        return baseFilePath
+
+    def layout(self) -> QgsLayout:
+        return self.__layout
+
+    def next(self) -> bool:
+        collection = self.__layout.pageCollection()
+        if 0 <= self.__index < len(self.pages):
+            collection.page(self.pages[self.__index]).setExcludeFromExports(True)
+
+        self.__index += 1
+        if self.__index >= len(self.pages):
+            return False
+
+        collection.page(self.pages[self.__index]).setExcludeFromExports(False)
+        if callable(self.__page_started):
+            self.__page_started(self.__index)
+
+        return True
+
+
+class PdfExportTask(QgsTask):
+    """
+        Exports a built PrintLayout to pdf, progress is reported per exported page,
+        weighted by the count of rendered layers. Can be canceled between two pages.
+        Render times per page are added to the report of the layout, per layer with
+        `ExportProfile.profile_layers` (each layer of each map is rendered again after export).
+
+        With `clone` the task exports a clone of the layout in background, like the layout algorithms
+        of QGIS processing: the clone is moved to the thread of the task and the PrintLayout can be
+        released after the task has been created. Without it the layout is exported by `run`
+        in the calling thread, e.g. batch export, and must not be changed or deleted before.
+
+        :param layout: built layout
+        :param save_path: pdf file path
+        :param clone: export a clone of the layout, see above
+    """
+
+    # error message, empty string on success
+    exported = pyqtSignal(str)
+    # current page (starting with 1), page count, layer count of current page
+    pageStarted = pyqtSignal(int, int, int)
+
+    # report progress at most 10 times per second
+    PROGRESS_INTERVAL = 1 / 10
+
+    def __init__(self, layout: PrintLayout, save_path: str, clone: bool = False):
+        QgsTask.__init__(self, f"PDF '{Path(save_path).name}'", QgsTask.CanCancel)
+
+        self.print_layout = layout
+        self.save_path = save_path
+        self.export_result: Optional[int] = None
+        self.error = ""
+        self.report = layout.report
+        self.report_path = ""
+        self.profile = layout.profile
+        # page keys of the report per layout page index
+        self.__page_keys = {index: key for key, index in layout.page_indices.items()}
+        # layout page index and start time of the page in export
+        self.__page_start: Optional[Tuple[int, float]] = None
+
+        self.feedback = QgsFeedback()
+        self.__last_progress = 0.0
+
+        self.settings = PrintLayout.get_pdf_settings(layout.plot_layer, layout.profile)
+        self.layout: Optional[QgsLayout] = layout.layout
+        self.is_clone = clone
+        if clone:
+            self.layout = layout.layout.clone()
+            # the task is canceled, when a layer of its maps is removed from project
+            self.setDependentLayers(list({layer.id(): layer for item in self.layout.items()
+                                          if isinstance(item, QgsLayoutItemMap)
+                                          for layer in item.layers()}.values()))
+            # without thread, so the thread of the task can take it
+            self.layout.moveToThread(None)
+        layout.prepare_render_context(self.settings.dpi, self.layout)
+        self.__iterator = LayoutPageIterator(self.layout, self.page_started)
+
+    def cancel(self):
+        self.feedback.cancel()
+        super().cancel()
+
+    def run(self) -> bool:
+        """ exports the layout, called in the thread of the task or directly, e.g. without event loop """
+        if self.is_clone:
+            self.layout.moveToThread(QThread.currentThread())
+
+        try:
+            self.export_result, _ = QgsLayoutExporter.exportToPdf(self.__iterator, self.save_path,
+                                                                  self.settings, self.feedback)
+            self.add_render_time(None)
+            self.error = PrintLayout.get_export_error(self.export_result)
+
+            if not self.error and self.profile.profile_layers:
+                pages = set(self.__iterator.pages)
+                measure_layers(self.layout, {index: key for index, key in self.__page_keys.items() if index in pages},
+                               self.settings.dpi, self.report, self.feedback)
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            if self.is_clone:
+                # back to main thread in `finished`
+                self.layout.moveToThread(None)
+
+        return not self.error
+
+    def finished(self, result: bool):
+        """ called in main thread, also if the task has been canceled before it was started """
+        if self.is_clone:
+            self.layout.moveToThread(QThread.currentThread())
+            self.layout = None
+
+        if not result and not self.error:
+            self.export_result = QgsLayoutExporter.Canceled
+            self.error = PrintLayout.get_export_error(self.export_result)
+        if result:
+            self.write_report()
+        self.exported.emit(self.error)
+
+    def add_render_time(self, index: Optional[int]):
+        """ Adds render time of the last page to report and starts time for next page.
+
+            :param index: layout page index of next page, None after last page
+        """
+        now = time.perf_counter()
+        if self.__page_start is not None:
+            last_index, start = self.__page_start
+            self.report.add(self.__page_keys.get(last_index, last_index), 'render', now - start)
+
+        self.__page_start = (index, now) if index is not None else None
+
+    def write_report(self) -> str:
+        """ Writes timing report next to pdf file and to log.
+
+            :return: report path, empty if report could not be written
+        """
+        self.report.log(self.print_layout.log)
+        try:
+            self.report_path = self.report.write(self.save_path)
+        except OSError as e:
+            self.print_layout.log(f"report could not be saved: {e}")
+            self.report_path = ""
+
+        return self.report_path
+
+    def page_started(self, index: int):
+        """ reports weighted progress, called by the exporter in the thread of the task """
+        self.add_render_time(self.__iterator.pages[index])
+
+        now = time.monotonic()
+        if index > 0 and now - self.__last_progress < self.PROGRESS_INTERVAL:
+            return
+
+        self.__last_progress = now
+        self.setProgress(self.__iterator.progress[index])
+        self.pageStarted.emit(index + 1, self.__iterator.count(), self.__iterator.layer_counts[index])
@@ -19,29 +19,407 @@
 
 import json
 import os
+import sqlite3
 
+from contextlib import contextmanager
 from pathlib import Path
 
-from qgis.PyQt.QtCore import pyqtSignal, QObject
+from qgis.PyQt.QtCore import pyqtSignal, QObject, QFileSystemWatcher, QTimer, QVariant
 from qgis.core import (QgsVectorLayer, QgsFeature, QgsVectorFileWriter,
                        QgsCoordinateReferenceSystem, QgsProject,
-                       QgsFeatureRequest, QgsVectorDataProvider,
+                       QgsFeatureRequest,
                        QgsGeometry, QgsMapLayer, QgsCoordinateTransform,
-                       NULL)
+                       QgsRectangle, NULL)
 
-from typing import List, Union, Dict, Optional
+from typing import Callable, Iterator, List, NamedTuple, Union, Dict, Optional, Tuple
 
-from .plot_config import PLOT_PAGES, PLOT_OPTIONS
-from ...submodules.tools.geopackage import GeoPackage
+from .plot_config import PLOT_PAGES, PLOT_OPTIONS, EXPORT_PROFILES, ExportProfile
+from .plot_schema import PlotSchema
+from .plot_store import PlotStore
+from ...submodules.tools.geopackage import GeoPackage, parse_geometry_header
 from ...submodules.tools.layervalidation import get_layer_by_template, get_layer_from_source, get_layer_source
 
 
+class PlotFileCache:
+    """ Results of plot file validation, see `PlotLayer.is_plot_layer`.
+        Key is the normalized file path. A file will be validated again,
+        when size or modification time of the file or its wal file have changed.
+    """
+
+    def __init__(self):
+        # normalized path: (file state, result)
+        self.__entries: Dict[str, Tuple[tuple, bool]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    @staticmethod
+    def get_file_state(path: str) -> tuple:
+        """ returns size and modification time of file and wal file """
+        state = []
+        for file in (path, f"{path}-wal"):
+            try:
+                stat = os.stat(file)
+                state.extend([stat.st_size, stat.st_mtime_ns])
+            except OSError:
+                state.extend([None, None])
+
+        return tuple(state)
+
+    def get(self, path: str, validate: Callable[[str], bool]) -> bool:
+        """ Returns cached result for given file, validates file on changes.
+
+            :param path: file path
+            :param validate: function to validate the file, gets the path
+        """
+        key = self.normalize(path)
+        state = self.get_file_state(key)
+        entry = self.__entries.get(key, None)
+        if entry is not None and entry[0] == state:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        result = validate(path)
+        self.__entries[key] = (state, result)
+
+        return result
+
+    def invalidate(self, path: Optional[str] = None):
+        """ removes result for given file, None for all files """
+        if path is None:
+            self.__entries.clear()
+        else:
+            self.__entries.pop(self.normalize(path), None)
+
+
+class PagesLayerSession(QObject):
+    """ Holds the pages layer of a plot file and caches CRS, field indexes and extent.
+        The layer will be reloaded only, when it has changed since the last access:
+        after own writes (`writing`), on `dataChanged` of the layer or when the file has been changed.
+        File events of own writes are ignored: the watcher reports them later,
+        when the file (and its -wal file) has still the size and modification time after the own write.
+
+        Use `get()`, there is one session per layer.
+
+        :param layer: pages layer from project
+    """
+
+    __sessions: Dict[str, 'PagesLayerSession'] = {}
+
+    def __init__(self, layer: QgsVectorLayer):
+        super(PagesLayerSession, self).__init__()
+
+        self.layer = layer
+        self.refresh_count = 0
+        # changes from outside of PlotLayer, e.g. editing in QGIS
+        self.external_revision = 0
+        self.__dirty = True
+        self.__refreshing = False
+        # depth of `writing` blocks
+        self.__writing = 0
+        # file state after the last own write, see `get_file_state`
+        self.__own_state: Optional[tuple] = None
+        self.__crs: Optional[QgsCoordinateReferenceSystem] = None
+        self.__field_indexes: Dict[str, int] = {}
+        self.__extent: Optional[QgsRectangle] = None
+
+        self.__watcher = QFileSystemWatcher(self)
+        self.__source = get_layer_source(layer)
+        self.watch_files()
+        self.__watcher.fileChanged.connect(self.file_changed)
+        layer.dataChanged.connect(self.mark_dirty)
+        layer.willBeDeleted.connect(self.remove)
+
+    @classmethod
+    def get(cls, layer: QgsVectorLayer) -> 'PagesLayerSession':
+        """ returns session of given pages layer, creates it if missing """
+        session = cls.__sessions.get(layer.id(), None)
+        if session is None:
+            session = cls(layer)
+            cls.__sessions[layer.id()] = session
+
+        return session
+
+    def remove(self):
+        """ removes session, layer will be deleted """
+        self.__watcher.removePaths(self.__watcher.files())
+        type(self).__sessions.pop(self.layer.id(), None)
+
+    def watch_files(self):
+        """ watches plot file and its -wal file, if they exist """
+        for path in (self.__source, f"{self.__source}-wal"):
+            if path not in self.__watcher.files() and Path(path).is_file():
+                self.__watcher.addPath(path)
+
+    def get_file_state(self) -> tuple:
+        """ (size, modification time) of plot file and -wal file, None for missing files """
+        state = []
+        for path in (self.__source, f"{self.__source}-wal"):
+            try:
+                stat = os.stat(path)
+                state.append((stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                state.append(None)
+
+        return tuple(state)
+
+    @contextmanager
+    def writing(self) -> Iterator[None]:
+        """ Block for own writes of PlotLayer into the plot file.
+            Layer will be reloaded on next access, signals and file events of these writes
+            do not increase `external_revision`.
+        """
+        self.__writing += 1
+        try:
+            yield
+        finally:
+            self.__writing -= 1
+            self.__dirty = True
+            if not self.__writing:
+                self.__own_state = self.get_file_state()
+                self.watch_files()
+
+    def mark_dirty(self):
+        """ Layer will be reloaded on next access, changes from outside increase `external_revision`. """
+        if not self.__refreshing:
+            self.__dirty = True
+            if not self.__writing:
+                self.external_revision += 1
+
+    def file_changed(self, path: str):
+        if self.__writing or self.get_file_state() != self.__own_state:
+            self.mark_dirty()
+        # some programs replace the file, then the watcher has lost it
+        self.watch_files()
+
+    def refresh(self):
+        """ reloads layer and cached values """
+        self.__refreshing = True
+        try:
+            self.layer.updateExtents()
+            self.layer.dataProvider().updateExtents()
+            self.layer.reload()
+        finally:
+            self.__refreshing = False
+
+        provider = self.layer.dataProvider()
+        self.__crs = provider.crs()
+        self.__field_indexes = provider.fieldNameMap()
+        self.__extent = provider.extent()
+        self.__dirty = False
+        self.refresh_count += 1
+
+    def get_layer(self) -> QgsVectorLayer:
+        """ returns pages layer, reloaded when changed """
+        if self.__dirty:
+            self.refresh()
+        return self.layer
+
+    @property
+    def crs(self) -> QgsCoordinateReferenceSystem:
+        self.get_layer()
+        return QgsCoordinateReferenceSystem(self.__crs)
+
+    @property
+    def field_indexes(self) -> Dict[str, int]:
+        """ field name: field index of data provider """
+        self.get_layer()
+        return self.__field_indexes
+
+    @property
+    def extent(self) -> QgsRectangle:
+        """ extent of data provider """
+        self.get_layer()
+        return QgsRectangle(self.__extent)
+
+
+class EditBuffer(QObject):
+    """ Write-behind buffer for attribute values of pages layer and options layer.
+        Values will be written `DEBOUNCE_MS` after the last change, on `flush()`
+        or at the end of a `with plot_layer.edit_buffer:` block.
+        All buffered values are written in one transaction with one `saved` signal.
+        If they can not be written, they stay in the buffer and `PlotLayer.saveFailed` is emitted.
+
+        Reading the pages layer (`PlotLayer.layer_pages`) flushes the buffer, but not inside a `with` block.
+
+        :param plot_layer: owner of the buffer
+    """
+
+    DEBOUNCE_MS = 300
+
+    def __init__(self, plot_layer: 'PlotLayer'):
+        super(EditBuffer, self).__init__()
+
+        self.__plot_layer = plot_layer
+        # feature id: {field index: value}
+        self.__pages: Dict[int, Dict[int, object]] = {}
+        self.__options: Dict[int, Dict[int, object]] = {}
+        self.__depth = 0
+        self.flush_count = 0
+        # error message of last failed flush
+        self.error = ""
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(self.DEBOUNCE_MS)
+        self.timer.timeout.connect(self.flush)
+
+    @property
+    def is_batch(self) -> bool:
+        """ inside a `with` block? """
+        return self.__depth > 0
+
+    def has_changes(self) -> bool:
+        return bool(self.__pages or self.__options)
+
+    def add_page_value(self, fid: int, index: int, value):
+        self.__pages.setdefault(fid, {})[index] = value
+        self.schedule()
+
+    def add_option_value(self, fid: int, index: int, value):
+        self.__options.setdefault(fid, {})[index] = value
+        self.schedule()
+
+    def discard_pages(self, fids: List[int]):
+        """ removes values of deleted pages """
+        for fid in fids:
+            self.__pages.pop(fid, None)
+
+    def schedule(self):
+        """ restarts debounce timer """
+        if not self.is_batch:
+            self.timer.start()
+
+    def flush(self) -> bool:
+        """ Writes all buffered values, read-only plot layers keep them only in memory.
+            On failure the page index will be loaded again, it may contain unsaved page numbers.
+
+            :return: False, if values could not be written
+        """
+        self.timer.stop()
+        if not self.has_changes():
+            return True
+
+        if self.__plot_layer.read_only:
+            self.__pages.clear()
+            self.__options.clear()
+            return True
+
+        try:
+            self.write()
+        except sqlite3.Error as e:
+            self.error = str(e)
+            self.__plot_layer.invalidate_page_index()
+            self.__plot_layer.saveFailed.emit(self.error)
+            return False
+
+        self.error = ""
+        self.__pages.clear()
+        self.__options.clear()
+        self.flush_count += 1
+        self.__plot_layer.saved.emit()
+        return True
+
+    def write(self):
+        """ writes values of pages and options layer in one transaction, buffers are not changed """
+        plot_layer = self.__plot_layer
+        session = plot_layer.pages_session
+        tables = []
+        if self.__pages:
+            tables.append((PLOT_PAGES['NAME'], session.field_indexes, self.__pages))
+        if self.__options:
+            layer_options = plot_layer.layer_options
+            tables.append(("options", layer_options.dataProvider().fieldNameMap(), self.__options))
+            del layer_options
+
+        with session.writing(), plot_layer.gpkg_data.connection() as con:
+            with con:
+                for table, field_indexes, features in tables:
+                    names = {index: name for name, index in field_indexes.items()}
+                    primary_key = plot_layer.get_primary_key(con, table)
+                    for fid, values in features.items():
+                        columns = ", ".join(f'"{names[index]}" = ?' for index in values)
+                        con.execute(f'UPDATE "{table}" SET {columns} WHERE "{primary_key}" = ?',
+                                    [self.to_sql_value(value) for value in values.values()] + [fid])
+
+        if self.__pages:
+            session.layer.triggerRepaint()
+
+    @staticmethod
+    def to_sql_value(value):
+        """ NULL of QGIS to None """
+        if isinstance(value, QVariant):
+            return None if value.isNull() else value.value()
+        return value
+
+    def __enter__(self) -> 'EditBuffer':
+        self.__depth += 1
+        self.timer.stop()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.__depth -= 1
+        if not self.is_batch:
+            self.flush()
+
+
+class PageIndex:
+    """ In-memory lookup between page numbers and feature ids of the pages layer.
+
+        :param pairs: (feature id, page number)
+    """
+
+    def __init__(self, pairs: List[Tuple[int, Optional[int]]]):
+        # page: fid
+        self.fids: Dict[int, int] = {}
+        # fid: page
+        self.pages: Dict[int, Optional[int]] = {}
+        # None: has to be calculated again
+        self.__max_page: Optional[int] = 0
+        for fid, page in pairs:
+            self.set(fid, page)
+
+    @property
+    def max_page(self) -> int:
+        """ highest page number, 0 without pages """
+        if self.__max_page is None:
+            self.__max_page = max(self.fids, default=0)
+        return self.__max_page
+
+    def set(self, fid: int, page: Optional[int]):
+        self.remove(fid)
+        self.pages[fid] = page
+        if page is not None:
+            self.fids[page] = fid
+            if self.__max_page is not None:
+                self.__max_page = max(self.__max_page, page)
+
+    def remove(self, fid: int):
+        page = self.pages.pop(fid, None)
+        if page is not None and self.fids.get(page, None) == fid:
+            del self.fids[page]
+            if page == self.__max_page:
+                self.__max_page = None
+
+    def get_fid(self, page: int) -> Optional[int]:
+        return self.fids.get(page, None)
+
+
 class PlotLayer(QObject):
     """ This PlotLayer holds information about page-layer and options-layer and global plot layout too.
 
         :param gpkg: path to geo package or vector layer
+        :param read_only: nothing will be written into the plot file, e.g. parallel export workers,
+                          schema and defaults have to be up to date
+        :raises sqlite3.Error: tables of `PlotStore` could not be created, e.g. file is locked
     """
     saved = pyqtSignal(name="saved")
+    # error message, values could not be written into the plot file
+    saveFailed = pyqtSignal(str, name="saveFailed")
 
     defaults = {
         'legend_on_extra_page': True,
@@ -54,17 +432,30 @@ class PlotLayer(QObject):
         'rotation': 0.0,
         'options': "{}",
         'visibility': "{}",
+        'export_profile': "final",
+        'export_profiles': "{}",
     }
 
-    def __init__(self, gpkg: Union[str, QgsVectorLayer], name: str = ""):
+    # results of `is_plot_layer` per file
+    validation_cache = PlotFileCache()
+
+    def __init__(self, gpkg: Union[str, QgsVectorLayer], name: str = "", read_only: bool = False):
         super(QObject, self).__init__()
 
+        self.read_only = read_only
+        self.edit_buffer = EditBuffer(self)
+        self.__page_index: Optional[PageIndex] = None
+        self.__page_index_revision = -1
+        # external revision of pages session, when store revisions have been created
+        self.__store_revision = -1
+
         if isinstance(gpkg, str):
             self.source = gpkg
         else:
             self.source = get_layer_source(gpkg)
 
-        self.gpkg_data: GeoPackage = GeoPackage(self.source)
+        # rollback journal (no WAL): plot files are copied and sent as one file and read by read-only workers
+        self.gpkg_data: GeoPackage = GeoPackage(self.source, read_only=read_only)
         self.name = os.path.basename(self.source)
         self.uri_pages = self.gpkg_data.get_uri("pages")
         self.uri_options = self.gpkg_data.get_uri("options")
@@ -84,42 +475,147 @@ class PlotLayer(QObject):
             root.insertLayer(0, layer_pages)
             self.layer_pages_id = layer_pages.id()
 
+        schema = PlotSchema(self.gpkg_data)
+        if not read_only and schema.get_version() < schema.latest_version:
+            with self.pages_session.writing():
+                schema.migrate()
+            self.validation_cache.invalidate(self.source)
+
         layer_options = self.layer_options
         if layer_options.featureCount() != 1:
             self.load_defaults()
         self.feature: QgsFeature = next(layer_options.getFeatures())
         del layer_options
 
+        # visibility and options of plot layer and pages
+        self.store = PlotStore(self.gpkg_data, lambda: self.pages_session.writing())
+        self.store.migrate(import_json=schema.get_version() >= PlotSchema.JSON_SYNC_VERSION)
+
+    @property
+    def page_index(self) -> PageIndex:
+        """ Lookup between page numbers and feature ids.
+            Will be loaded with one query and again after changes from outside, own changes update it.
+            Own writes (pages, options, store and schema) are done in `PagesLayerSession.writing`,
+            so they do not count as changes from outside.
+        """
+        revision = self.pages_session.external_revision
+        if self.__page_index is None or self.__page_index_revision != revision:
+            self.edit_buffer.flush()
+            table = PLOT_PAGES['NAME']
+            with self.gpkg_data.connection() as con:
+                primary_key = self.get_primary_key(con, table)
+                rows = con.execute(f'SELECT "{primary_key}", "page" FROM "{table}"').fetchall()
+            self.__page_index = PageIndex(rows)
+            self.__page_index_revision = revision
+
+        return self.__page_index
+
+    def get_visibility_revision(self, page_fid: int) -> int:
+        """ revision of stored visibility of page, changes from outside invalidate all revisions """
+        revision = self.pages_session.external_revision
+        if self.__store_revision != revision:
+            self.store.invalidate()
+            self.__store_revision = revision
+
+        return self.store.get_visibility_revision(page_fid)
+
+    def emit_store_result(self, result: bool):
+        """ emits `saved` after a successful write of `store`, `saveFailed` otherwise """
+        if result:
+            self.saved.emit()
+        else:
+            self.saveFailed.emit(self.store.error)
+
+    def invalidate_page_index(self):
+        """ page index will be loaded again on next access """
+        self.__page_index = None
+
+    def update_page_index(self, fid: int, page: Optional[int] = None, deleted: bool = False):
+        """ updates page index after own changes, if it is loaded """
+        if self.__page_index is None:
+            return
+
+        if deleted:
+            self.__page_index.remove(fid)
+        else:
+            self.__page_index.set(fid, page)
+
+    @staticmethod
+    def get_primary_key(con: sqlite3.Connection, table: str) -> str:
+        """ returns primary key column of table (feature id) """
+        return next(column[1] for column in con.execute(f'PRAGMA table_info("{table}")') if column[5])
+
     def get_next_page_number(self) -> int:
-        layer_pages = self.layer_pages
-        provider: QgsVectorDataProvider = layer_pages.dataProvider()
-        value = provider.maximumValue(provider.fieldNameMap()['page'])
-        if not value:
-            value = 0
-        return value + 1
+        return self.page_index.max_page + 1
 
     def add_page(self, layout: Union['PlotLayout', str], geometry: QgsGeometry, scale, rotation) -> 'PlotPage':
+        records = self.add_pages([(layout, geometry, scale, rotation)])
+        if not records:
+            raise TypeError(f"page can not be added to '{self.source}'")
+
+        return self.get_page_from_fid(records[0].fid)
+
+    def add_pages(self, pages: List[Tuple[Union['PlotLayout', str], QgsGeometry, int, float]]) -> List['PageRecord']:
+        """ Adds pages with one `addFeatures` call, page numbers follow the last page.
+
+            :param pages: (layout or template file, geometry, scale, rotation) per page
+            :return: records of added pages in page order, empty if nothing has been added
+        """
+        if not pages:
+            return []
+
         layer_pages = self.layer_pages
         fields = layer_pages.dataProvider().fields()
-
-        feature = QgsFeature(fields)
-        feature.setGeometry(geometry)
-        feature['scale'] = scale
-        feature['page'] = self.get_next_page_number()
-        feature['show_mini_map'] = self.show_mini_map
-        feature['show_legend_on_page'] = self.show_legend_on_page
-        feature['show_map_tips'] = self.show_map_tips
-        feature['rotation'] = rotation
-        feature['file'] = layout.path if not isinstance(layout, str) else layout
-        feature['options'] = "{}"
-        feature['visibility'] = "{}"
-
-        layer_pages.dataProvider().addFeatures([feature])
+        first_page = self.get_next_page_number()
+        show_mini_map = self.show_mini_map
+        show_legend_on_page = self.show_legend_on_page
+        show_map_tips = self.show_map_tips
+
+        features = []
+        for page, (layout, geometry, scale, rotation) in enumerate(pages, first_page):
+            feature = QgsFeature(fields)
+            feature.setGeometry(geometry)
+            feature['scale'] = scale
+            feature['page'] = page
+            feature['show_mini_map'] = show_mini_map
+            feature['show_legend_on_page'] = show_legend_on_page
+            feature['show_map_tips'] = show_map_tips
+            feature['rotation'] = rotation
+            feature['file'] = layout.path if not isinstance(layout, str) else layout
+            feature['options'] = "{}"
+            feature['visibility'] = "{}"
+            features.append(feature)
+
+        with self.pages_session.writing():
+            result, features = layer_pages.dataProvider().addFeatures(features)
         layer_pages.triggerRepaint()
 
         del layer_pages
 
-        return self.get_page(feature['page'])
+        if not result:
+            return []
+
+        # fids of pages deleted outside of the plugin can be reused
+        if not self.store.delete_pages([feature.id() for feature in features]):
+            self.saveFailed.emit(self.store.error)
+
+        records = []
+        for feature in features:
+            self.update_page_index(feature.id(), feature['page'])
+            bbox = feature.geometry().boundingBox()
+            records.append(PageRecord(fid=feature.id(),
+                                      page=feature['page'],
+                                      scale=feature['scale'],
+                                      rotation=feature['rotation'],
+                                      file=(feature['file'] or "").replace(" ", ""),
+                                      show_mini_map=show_mini_map,
+                                      show_legend_on_page=show_legend_on_page,
+                                      show_map_tips=show_map_tips,
+                                      bbox=(bbox.xMinimum(), bbox.yMinimum(), bbox.xMaximum(), bbox.yMaximum())
+                                      if not feature.geometry().isEmpty() else None,
+                                      store=self.store))
+
+        return records
 
     def select_feature(self, fid: Optional[int] = None):
         """ selects feature with given fid """
@@ -140,8 +636,9 @@ class PlotLayer(QObject):
         self.layer_pages.selectByIds(fids)
 
     def select_feature_page_num(self, page: int):
-        """ selects feature with given fid """
-        self.layer_pages.selectByExpression(f""" "page" = '{page}' """)
+        """ selects feature with given page number """
+        fid = self.page_index.get_fid(page)
+        self.select_features([fid] if fid is not None else [])
 
     def select_page(self, page: Union[int, 'PlotPage']):
         if isinstance(page, PlotPage):
@@ -153,16 +650,27 @@ class PlotLayer(QObject):
         if not fids:
             return
 
-        self.layer_pages.dataProvider().deleteFeatures(fids)
-        self.saved.emit()
+        self.edit_buffer.discard_pages(fids)
+        layer_pages = self.layer_pages
+        with self.pages_session.writing():
+            layer_pages.dataProvider().deleteFeatures(fids)
+        result = self.store.delete_pages(fids)
+        for fid in fids:
+            self.update_page_index(fid, deleted=True)
+        self.emit_store_result(result)
+
+    @property
+    def pages_session(self) -> PagesLayerSession:
+        return PagesLayerSession.get(QgsProject.instance().mapLayer(self.layer_pages_id))
 
     @property
-    def layer_pages(self):
-        layer_pages = QgsProject.instance().mapLayer(self.layer_pages_id)
-        layer_pages.updateExtents()
-        layer_pages.dataProvider().updateExtents()
-        layer_pages.reload()
-        return layer_pages
+    def layer_pages(self) -> QgsVectorLayer:
+        """ pages layer, reloaded only when changed, see `PagesLayerSession`
+            Buffered values will be written before, see `EditBuffer`.
+        """
+        if not self.edit_buffer.is_batch:
+            self.edit_buffer.flush()
+        return self.pages_session.get_layer()
 
     @property
     def layer_options(self):
@@ -173,11 +681,13 @@ class PlotLayer(QObject):
         """ restores default into options layer """
         layer_options = self.layer_options
         features = [f.id() for f in layer_options.getFeatures()]
-        layer_options.dataProvider().deleteFeatures(features)
         feature = QgsFeature(layer_options.dataProvider().fields())
         for field_name, field_value in self.defaults.items():
-            feature[field_name] = field_value
-        layer_options.dataProvider().addFeatures([feature])
+            if feature.fieldNameIndex(field_name) >= 0:
+                feature[field_name] = field_value
+        with self.pages_session.writing():
+            layer_options.dataProvider().deleteFeatures(features)
+            layer_options.dataProvider().addFeatures([feature])
 
         del layer_options
 
@@ -207,16 +717,24 @@ class PlotLayer(QObject):
         if not source.casefold().endswith(".gpkg"):
             return False
 
+        return cls.validation_cache.get(source, cls.validate_plot_file)
+
+    @classmethod
+    def validate_plot_file(cls, source: str) -> bool:
+        """ returns True, if GeoPackage has all plot layers and columns, use cached `is_plot_layer` """
         geo = GeoPackage(source)
         if has_pages_layer := geo.has_layer("pages"):
             pages_layer_columns = geo.get_columns("pages")
-            pages_columns_valid = all(map(lambda x: x in pages_layer_columns, PLOT_PAGES['Attributes']))
+            pages_columns_valid = all(name in pages_layer_columns for name, value in PLOT_PAGES['Attributes'].items()
+                                      if not value.get('optional', False))
         else:
             pages_columns_valid = False
 
         if has_options_layer := geo.has_layer("options"):
             options_layer_columns = geo.get_columns("options")
-            options_columns_valid = all(map(lambda x: x in options_layer_columns, PLOT_OPTIONS['Attributes']))
+            options_columns_valid = all(name in options_layer_columns
+                                        for name, value in PLOT_OPTIONS['Attributes'].items()
+                                        if not value.get('optional', False))
         else:
             options_columns_valid = False
 
@@ -252,7 +770,9 @@ class PlotLayer(QObject):
         """
 
         if Path(path).is_file():
+            GeoPackage(path).release()
             os.remove(path)
+        cls.validation_cache.invalidate(path)
 
         layer_plot_pages = get_layer_by_template("pages", crs.authid(), PLOT_PAGES)
         layer_plot_options = get_layer_by_template("options", crs.authid(), PLOT_OPTIONS)
@@ -287,14 +807,9 @@ class PlotLayer(QObject):
         return obj
 
     def save_value(self, field_name: str, value):
-        layer_options = self.layer_options
+        """ value will be written by `edit_buffer` """
         self.feature[field_name] = value
-        index = layer_options.dataProvider().fieldNameMap()[field_name]
-        layer_options.dataProvider().changeAttributeValues({self.feature.id(): {index: value}})
-        self.saved.emit()
-        layer_options.reload()
-
-        del layer_options
+        self.edit_buffer.add_option_value(self.feature.id(), self.feature.fieldNameIndex(field_name), value)
 
     def get_value(self, attribute: str):
         """ returns value from self.feature, if NULL, then use default value and save it """
@@ -311,10 +826,7 @@ class PlotLayer(QObject):
         return value
 
     def get_crs(self) -> QgsCoordinateReferenceSystem:
-        layer_pages = self.layer_pages
-        crs = layer_pages.dataProvider().crs()
-        del layer_pages
-        return crs
+        return self.pages_session.crs
 
     @property
     def fid(self) -> int:
@@ -382,14 +894,13 @@ class PlotLayer(QObject):
 
     @property
     def options(self) -> dict:
-        value = json.loads(self.get_value('options'))
-        return value
+        return self.store.get_options(PlotStore.GLOBAL)
 
     @options.setter
     def options(self, value):
-        if isinstance(value, dict):
-            value = json.dumps(value)
-        self.save_value("options", value)
+        if isinstance(value, str):
+            value = json.loads(value)
+        self.emit_store_result(self.store.set_options(PlotStore.GLOBAL, value))
 
     @property
     def visibility(self) -> 'VisibilityCollection':
@@ -404,14 +915,14 @@ class PlotLayer(QObject):
         :page: visible on page?
 
         """
-        value = json.loads(self.get_value('visibility'))
-        return VisibilityCollection(self, value)
+        return VisibilityCollection(self, self.store.get_visibility(PlotStore.GLOBAL),
+                                    self.get_visibility_revision(PlotStore.GLOBAL))
 
     @visibility.setter
     def visibility(self, value):
-        if isinstance(value, dict):
-            value = json.dumps(value)
-        self.save_value("visibility", value)
+        if isinstance(value, str):
+            value = json.loads(value)
+        self.emit_store_result(self.store.set_visibility(PlotStore.GLOBAL, value))
 
     @property
     def scale(self) -> str:
@@ -437,26 +948,206 @@ class PlotLayer(QObject):
     def show_mini_map(self, value: bool):
         self.save_value('show_mini_map', value)
 
+    @property
+    def export_profile(self) -> str:
+        """ name of selected export profile """
+        if self.feature.fieldNameIndex('export_profile') < 0:
+            # older read-only plot file
+            return self.defaults['export_profile']
+        return self.get_value('export_profile')
+
+    @export_profile.setter
+    def export_profile(self, value: str):
+        self.save_value("export_profile", value)
+
+    @property
+    def export_profiles(self) -> Dict[str, ExportProfile]:
+        """ built-in export profiles and own profiles from plot file """
+        profiles = dict(EXPORT_PROFILES)
+        if self.feature.fieldNameIndex('export_profiles') < 0:
+            return profiles
+
+        for name, values in json.loads(self.get_value('export_profiles')).items():
+            profiles[name] = ExportProfile.from_dict(name, values)
+
+        return profiles
+
+    @export_profiles.setter
+    def export_profiles(self, value: Dict[str, ExportProfile]):
+        """ saves own profiles, built-in profiles are not saved, if not changed """
+        value = {name: profile.to_dict() for name, profile in value.items()
+                 if EXPORT_PROFILES.get(name, None) != profile}
+        self.save_value("export_profiles", json.dumps(value))
+
+    def get_export_profile(self, name: Optional[str] = None) -> ExportProfile:
+        """ Returns export profile by name.
+
+            :param name: profile name, None for selected profile
+            :raises KeyError: unknown profile name
+        """
+        profiles = self.export_profiles
+        if name is None:
+            # unknown selected profile, e.g. removed from file
+            return profiles.get(self.export_profile, EXPORT_PROFILES['final'])
+
+        return profiles[name]
+
     def get_page_from_fid(self, fid: int) -> 'PlotPage':
         return PlotPage(self.layer_pages.getFeature(fid), self)
 
     def get_page(self, page: int) -> 'PlotPage':
-        req = QgsFeatureRequest().setFilterExpression(f""" "page"='{page}' """)
-        return PlotPage(next(self.layer_pages.getFeatures(req)), self)
+        """ returns page by page number
+
+            :raises KeyError: no page with this number
+        """
+        fid = self.page_index.get_fid(page)
+        if fid is None:
+            raise KeyError(f"page {page} not found")
+        return self.get_page_from_fid(fid)
+
+    def release(self):
+        """ Writes buffered values and closes connections of all threads to the plot file,
+            e.g. when the plot layer is not used anymore.
+        """
+        self.edit_buffer.flush()
+        self.gpkg_data.release()
 
     def __repr__(self):
         return f"{self.__class__.__name__}('{self.source}')"
 
+    def renumber_pages(self, fids: List[int]) -> int:
+        """ Sets page numbers in given order, first feature id gets page 1.
+            Only changed numbers are written, all with one provider call (one transaction).
+
+            :param fids: feature ids of all pages in new order
+            :return: count of changed pages
+        """
+        layer_pages = self.layer_pages
+        index = self.pages_session.field_indexes['page']
+        page_index = self.page_index
+        current = dict(page_index.pages)
+
+        changes = 0
+        for page, fid in enumerate(fids, 1):
+            if fid in current and current[fid] != page:
+                self.edit_buffer.add_page_value(fid, index, page)
+                page_index.set(fid, page)
+                changes += 1
+
+        if changes and not self.edit_buffer.is_batch:
+            self.edit_buffer.flush()
+            layer_pages.triggerRepaint()
+
+        return changes
+
+    def snapshot(self) -> List['PageRecord']:
+        """ Returns read-only records of all pages in page order with one query.
+            Nothing will be written, gaps in page numbers are fixed only in records.
+            Buffered values will be written before, see `EditBuffer`.
+        """
+        self.edit_buffer.flush()
+        table = PLOT_PAGES['NAME']
+        columns = ['page', 'scale', 'rotation', 'file', 'show_mini_map',
+                   'show_legend_on_page', 'show_map_tips']
+
+        with self.gpkg_data.connection() as con:
+            geometry_column = con.execute("SELECT column_name FROM gpkg_geometry_columns WHERE table_name=?",
+                                          (table,)).fetchone()[0]
+            primary_key = self.get_primary_key(con, table)
+            rows = con.execute(f'SELECT "{primary_key}", "{geometry_column}", '
+                               + ", ".join(f'"{column}"' for column in columns)
+                               + f' FROM "{table}" ORDER BY "page" IS NULL, "page", "{primary_key}"').fetchall()
+
+        def default(name: str, value):
+            return PlotLayer.defaults.get(name, None) if value is None else value
+
+        records = []
+        for page_nr, (fid, geometry, page, scale, rotation, file, show_mini_map,
+                      show_legend_on_page, show_map_tips) in enumerate(rows, 1):
+            try:
+                header_size, bbox = parse_geometry_header(geometry)
+                if bbox is None:
+                    wkb_geometry = QgsGeometry()
+                    wkb_geometry.fromWkb(geometry[header_size:])
+                    if not wkb_geometry.isEmpty():
+                        rectangle = wkb_geometry.boundingBox()
+                        bbox = (rectangle.xMinimum(), rectangle.yMinimum(),
+                                rectangle.xMaximum(), rectangle.yMaximum())
+            except ValueError:
+                bbox = None
+
+            records.append(PageRecord(fid=fid,
+                                      page=page_nr,
+                                      scale=default('scale', scale),
+                                      rotation=default('rotation', rotation),
+                                      file=(file or "").replace(" ", ""),
+                                      show_mini_map=bool(default('show_mini_map', show_mini_map)),
+                                      show_legend_on_page=bool(default('show_legend_on_page', show_legend_on_page)),
+                                      show_map_tips=bool(default('show_map_tips', show_map_tips)),
+                                      bbox=bbox,
+                                      store=self.store))
+
+        return records
+
+    def fix_page_numbers(self) -> int:
+        """ Writes page numbers without gaps in page order, e.g. after pages have been deleted in QGIS.
+
+            :return: count of changed pages
+        """
+        return self.renumber_pages([record.fid for record in self.snapshot()])
+
+    def get_pages(self, records: Optional[List['PageRecord']] = None) -> List['PlotPage']:
+        """ Returns pages in order of records with one request, nothing will be written.
+            Page numbers are taken from records, gaps are fixed only in memory, see `snapshot`.
+
+            :param records: records of pages, None for all pages
+        """
+        records = records if records is not None else self.snapshot()
+        request = QgsFeatureRequest().setFilterFids([record.fid for record in records])
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        features = {feature.id(): feature for feature in self.layer_pages.getFeatures(request)}
+
+        pages = []
+        for record in records:
+            if record.fid in features:
+                page = PlotPage(features[record.fid], self)
+                page.feature['page'] = record.page
+                pages.append(page)
+
+        return pages
+
     def __iter__(self):
-        for i, feature in enumerate(self.layer_pages.getFeatures(QgsFeatureRequest().addOrderBy("page", True))):
-            page_nr = i + 1
-            page = PlotPage(feature, self)
+        """ pages in page order, gaps in page numbers are fixed and written before """
+        self.fix_page_numbers()
+        yield from self.get_pages()
 
-            # test if page number is correct
-            if page_nr != page.page:
-                page.page = page_nr
 
-            yield page
+class PageRecord(NamedTuple):
+    """ Read-only values of a page, see `PlotLayer.snapshot`.
+        `options` and `visibility` will be loaded from store on access.
+    """
+    fid: int
+    page: int
+    scale: int
+    rotation: float
+    file: str
+    show_mini_map: bool
+    show_legend_on_page: bool
+    show_map_tips: bool
+    # xmin, ymin, xmax, ymax, None for empty geometry
+    bbox: Optional[Tuple[float, float, float, float]]
+    store: PlotStore
+
+    @property
+    def options(self) -> dict:
+        return self.store.get_options(self.fid)
+
+    @property
+    def visibility(self) -> Dict[str, Dict[str, bool]]:
+        return self.store.get_visibility(self.fid)
+
+    def get_rectangle(self) -> Optional[QgsRectangle]:
+        return QgsRectangle(*self.bbox) if self.bbox is not None else None
 
 
 class PlotPage:
@@ -467,12 +1158,12 @@ class PlotPage:
         self.plot_layer = plot_layer
 
     def save_value(self, field_name: str, value):
-        layer_pages = self.plot_layer.layer_pages
-
+        """ value will be written by `edit_buffer` of plot layer """
         self.feature[field_name] = value
-        index = layer_pages.dataProvider().fieldNameMap()[field_name]
-        layer_pages.dataProvider().changeAttributeValues({self.feature_id: {index: value}})
-        self.plot_layer.saved.emit()
+        index = self.plot_layer.pages_session.field_indexes[field_name]
+        self.plot_layer.edit_buffer.add_page_value(self.feature_id, index, value)
+        if field_name == 'page':
+            self.plot_layer.update_page_index(self.feature_id, value)
 
     def get_value(self, attribute: str):
         """ returns value from self.feature, if NULL, then use default value and save it """
@@ -490,9 +1181,13 @@ class PlotPage:
 
     def delete(self):
         """ deletes this page from plot layer """
+        self.plot_layer.edit_buffer.discard_pages([self.fid])
         layer_pages = self.plot_layer.layer_pages
-        layer_pages.dataProvider().deleteFeatures([self.fid])
-        self.plot_layer.saved.emit()
+        with self.plot_layer.pages_session.writing():
+            layer_pages.dataProvider().deleteFeatures([self.fid])
+        result = self.plot_layer.store.delete_pages([self.fid])
+        self.plot_layer.update_page_index(self.fid, deleted=True)
+        self.plot_layer.emit_store_result(result)
         layer_pages.triggerRepaint()
 
         del layer_pages
@@ -571,34 +1266,42 @@ class PlotPage:
 
     @property
     def options(self) -> dict:
-        value = json.loads(self.get_value('options'))
-        return value
+        return self.plot_layer.store.get_options(self.fid)
 
     @options.setter
     def options(self, value):
-        if isinstance(value, dict):
-            value = json.dumps(value)
-        self.save_value("options", value)
+        if isinstance(value, str):
+            value = json.loads(value)
+        self.plot_layer.emit_store_result(self.plot_layer.store.set_options(self.fid, value))
 
     @property
     def visibility(self) -> 'VisibilityCollection':
         """ format: see PlotLayer.visibility """
-        value = json.loads(self.get_value('visibility'))
-        return VisibilityCollection(self, value)
+        return VisibilityCollection(self, self.plot_layer.store.get_visibility(self.fid),
+                                    self.plot_layer.get_visibility_revision(self.fid))
 
     @visibility.setter
     def visibility(self, value):
-        if isinstance(value, dict):
-            value = json.dumps(value)
-        self.save_value("visibility", value)
+        if isinstance(value, str):
+            value = json.loads(value)
+        self.plot_layer.emit_store_result(self.plot_layer.store.set_visibility(self.fid, value))
 
 
 class VisibilityCollection:
+    """ Layer visibilities of plot layer or page.
+
+        :param parent: plot layer or page, changes are saved there with `sync`
+        :param visibility: visibility dictionary, see `PlotLayer.visibility`
+        :param revision: unique revision of the visibility, see `PlotStore.get_visibility_revision`,
+                         None for a new one
+    """
 
     def __init__(self, parent: Union[PlotPage, PlotLayer],
-                 visibility: Dict[str, Dict[str, bool]]):
+                 visibility: Dict[str, Dict[str, bool]], revision: Optional[int] = None):
         self.__parent = parent
         self.visibility = visibility
+        # key for `LayerSetCache`, changes with every change of `visibility`
+        self.revision = revision if revision is not None else PlotStore.next_revision()
 
     @staticmethod
     def default():
@@ -615,6 +1318,7 @@ class VisibilityCollection:
     def clear(self):
         """ clears all options """
         self.visibility.clear()
+        self.changed()
         self.sync()
 
     def remove_layer(self, layer: Union[QgsMapLayer, str]):
@@ -624,9 +1328,10 @@ class VisibilityCollection:
         layer_id = layer if isinstance(layer, str) else layer.id()
         try:
             del self.visibility[layer_id]
-            self.sync()
         except KeyError:
-            pass
+            return
+        self.changed()
+        self.sync()
 
     def get_layer_visibility(self, layer: Union[QgsMapLayer, str]):
         layer_id = layer if isinstance(layer, str) else layer.id()
@@ -634,27 +1339,32 @@ class VisibilityCollection:
             self.visibility[layer_id]
         except KeyError:
             self.visibility[layer_id] = self.default()
+            self.changed()
 
         return self.visibility[layer_id]
 
     def set_layer_visible_on_page(self, layer: Union[QgsMapLayer, str], visible: bool):
         visibility = self.get_layer_visibility(layer)
         visibility['page'] = visible
+        self.changed()
         self.sync()
 
     def set_layer_visible_mini_map(self, layer: Union[QgsMapLayer, str], visible: bool):
         visibility = self.get_layer_visibility(layer)
         visibility['mini_map'] = visible
+        self.changed()
         self.sync()
 
     def set_layer_visible_legend(self, layer: Union[QgsMapLayer, str], visible: bool):
         visibility = self.get_layer_visibility(layer)
         visibility['legend'] = visible
+        self.changed()
         self.sync()
 
     def set_layer_visible_overview(self, layer: Union[QgsMapLayer, str], visible: bool):
         visibility = self.get_layer_visibility(layer)
         visibility['overview'] = visible
+        self.changed()
         self.sync()
 
     def is_layer_visible_on_page(self, layer: Union[QgsMapLayer, str]) -> bool:
@@ -669,6 +1379,10 @@ class VisibilityCollection:
     def is_layer_visible_overview(self, layer: Union[QgsMapLayer, str]) -> bool:
         return self.get_layer_visibility(layer)['overview']
 
+    def changed(self):
+        """ visibility dictionary has been changed, cached layer lists are not used anymore """
+        self.revision = PlotStore.next_revision()
+
     def sync(self):
         self.parent.visibility = self.visibility
 
@@ -690,27 +1404,133 @@ class VisibilityCollection:
 
             :param field: page, mini_map, legend, overview
         """
-        layers = []
-
-        if self.visibility:
-            for key in self.visibility:
-                layer = QgsProject.instance().mapLayer(key)
-                if layer is not None:
-                    if self.get_layer_visibility(layer)[field] and not PlotLayer.is_plot_layer(layer):
-                        layers.append(layer)
-        else:
+        if not self.visibility and isinstance(self.parent, PlotPage):
             # nothing here on page, use layer visibility settings from plot layer
-            if isinstance(self.parent, PlotLayer):
-                ...
-            else:
-                layers.extend(self.parent.plot_layer.visibility.get_layer_visibilities(field))
+            return self.parent.plot_layer.visibility.get_layer_visibilities(field)
 
-        return layers
+        return LayerSetCache.instance().get_layers(self, field)
+
+    def get_ordered_layer_visibilities(self, field: str,
+                                       extra_layers: Optional[List[QgsMapLayer]] = None) -> List[QgsMapLayer]:
+        """ Like `get_layer_visibilities`, but sorted by layer tree order.
+            Layers, which are not in layer tree, are not in list.
+
+            :param field: page, mini_map, legend, overview
+            :param extra_layers: sort these layers into the list too, e.g. pages layer
+        """
+        if not self.visibility and isinstance(self.parent, PlotPage):
+            return self.parent.plot_layer.visibility.get_ordered_layer_visibilities(field, extra_layers)
+
+        return LayerSetCache.instance().get_layers(self, field, True, extra_layers or [])
 
     def __getitem__(self, layer: Union[str, QgsMapLayer]) -> 'Visibility':
         return Visibility(self, self.get_layer_visibility(layer))
 
 
+class LayerSetCache:
+    """ Resolved layer lists per visibility configuration.
+        Key is the revision of the `VisibilityCollection` and the field.
+        The own revision increases, when layers or the layer tree order of the project change,
+        then all entries are invalid.
+
+        Use `instance()`, it is connected to the current project. Call `release()` on unload.
+    """
+
+    # oldest entries will be removed
+    MAX_ENTRIES = 512
+
+    __instance: Optional['LayerSetCache'] = None
+
+    def __init__(self, project: QgsProject):
+        self.__project = project
+        self.__entries: Dict[Tuple[int, str, bool, Tuple[str, ...]], List[QgsMapLayer]] = {}
+        # layer id: index in layer tree order
+        self.__order: Optional[Dict[str, int]] = None
+        self.revision = 0
+        self.hits = 0
+        self.misses = 0
+
+        root = project.layerTreeRoot()
+        self.__signals = [root.layerOrderChanged, root.customLayerOrderChanged,
+                          root.addedChildren, root.removedChildren,
+                          project.layersAdded, project.layersRemoved, project.cleared]
+        for signal in self.__signals:
+            signal.connect(self.invalidate)
+
+    @classmethod
+    def instance(cls) -> 'LayerSetCache':
+        if cls.__instance is None:
+            cls.__instance = cls(QgsProject.instance())
+        return cls.__instance
+
+    @classmethod
+    def release(cls):
+        """ disconnects the instance from project signals, e.g. on unload """
+        if cls.__instance is not None:
+            cls.__instance.disconnect()
+            cls.__instance = None
+
+    def disconnect(self):
+        for signal in self.__signals:
+            try:
+                signal.disconnect(self.invalidate)
+            except (TypeError, RuntimeError):
+                # already disconnected or project deleted
+                pass
+        self.__signals.clear()
+        self.invalidate()
+
+    def invalidate(self, *args):
+        """ clears all entries, arguments from layer tree signals are ignored """
+        self.revision += 1
+        self.__entries.clear()
+        self.__order = None
+
+    def get_layer_order(self) -> Dict[str, int]:
+        """ returns index in layer tree order per layer id """
+        if self.__order is None:
+            self.__order = {layer.id(): index
+                            for index, layer in enumerate(self.__project.layerTreeRoot().layerOrder())}
+        return self.__order
+
+    def get_layers(self, visibility: VisibilityCollection, field: str, ordered: bool = False,
+                   extra_layers: List[QgsMapLayer] = ()) -> List[QgsMapLayer]:
+        """ Returns visible layers from visibility collection, plot layers are skipped.
+
+            :param visibility: visibility of plot layer or page
+            :param field: page, mini_map, legend, overview
+            :param ordered: sort layers by layer tree order, layers not in layer tree are skipped
+            :param extra_layers: add these layers too, only with `ordered`
+        """
+        key = (visibility.revision, field, ordered,
+               tuple(layer.id() for layer in extra_layers) if ordered else ())
+        try:
+            layers = self.__entries[key]
+            self.hits += 1
+        except KeyError:
+            self.misses += 1
+            layers = self.resolve(visibility.visibility, field)
+            if ordered:
+                order = self.get_layer_order()
+                layers = {layer.id(): layer for layer in list(extra_layers) + layers if layer.id() in order}
+                layers = sorted(layers.values(), key=lambda layer: order[layer.id()])
+            if len(self.__entries) >= self.MAX_ENTRIES:
+                del self.__entries[next(iter(self.__entries))]
+            self.__entries[key] = layers
+
+        return list(layers)
+
+    def resolve(self, visibility: Dict[str, Dict[str, bool]], field: str) -> List[QgsMapLayer]:
+        """ returns visible project layers in order of visibility dictionary """
+        layers = []
+        for key, values in visibility.items():
+            layer = self.__project.mapLayer(key)
+            if layer is not None and values[field] and not PlotLayer.is_plot_layer(layer):
+                layers.append(layer)
+
+        return layers
+
+
 class Visibility:
 
     def __init__(self, collection: VisibilityCollection, values: Dict[str, bool]):
@@ -732,6 +1552,7 @@ class Visibility:
     def page(self, state: bool):
         assert isinstance(state, bool)
         self.values['page'] = state
+        self.collection.changed()
 
     @property
     def mini_map(self) -> bool:
@@ -741,6 +1562,7 @@ class Visibility:
     def mini_map(self, state: bool):
         assert isinstance(state, bool)
         self.values['mini_map'] = state
+        self.collection.changed()
 
     @property
     def legend(self) -> bool:
@@ -750,6 +1572,7 @@ class Visibility:
     def legend(self, state: bool):
         assert isinstance(state, bool)
         self.values['legend'] = state
+        self.collection.changed()
 
     @property
     def overview(self) -> bool:
@@ -759,3 +1582,4 @@ class Visibility:
     def overview(self, state: bool):
         assert isinstance(state, bool)
         self.values['overview'] = state
+        self.collection.changed()
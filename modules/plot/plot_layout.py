@@ -17,11 +17,12 @@
 ***************************************************************************
 """
 
+from qgis.PyQt.QtXml import QDomDocument
 from qgis.core import (QgsPrintLayout, QgsLayoutItem, QgsLayoutItemMap,
                        QgsLayoutItemPicture, QgsLayoutItemLegend,
                        QgsLayoutItemLabel, QgsLayoutItemScaleBar,
                        QgsLayoutItemPage, QgsLayoutSize,
-                       QgsApplication, QgsPageSize)
+                       QgsApplication, QgsPageSize, QgsReadWriteContext)
 from typing import Dict, List, Optional, Tuple
 from xml.etree import ElementTree
 
@@ -242,6 +243,34 @@ class PlotLayout:
 
         return float("inf")
 
+    def to_items_xml(self, context: QgsReadWriteContext) -> Tuple[str, List[QgsLayoutItem], List[str]]:
+        """ Serializes all items (without page) and multi frames (e.g. attribute tables, html)
+            with all their properties into one xml string.
+            Items can be restored with `QgsLayout.addItemsFromXml`, frames are linked to their multi frame by uuid.
+
+            :param context: read write context with path resolver for pictures
+            :returns 0: xml string
+            :returns 1: serialized items in order of `item_list`
+            :returns 2: uuids of serialized multi frames
+        """
+        document = QDomDocument()
+        element = document.createElement("Items")
+        document.appendChild(element)
+
+        items = []
+        for item in self.item_list:
+            if isinstance(item, QgsLayoutItemPage):
+                continue
+            item.writeXml(element, document, context)
+            items.append(item)
+
+        multi_frames = []
+        for multi_frame in self.layout.multiFrames():
+            multi_frame.writeXml(element, document, context)
+            multi_frames.append(multi_frame.uuid())
+
+        return document.toString(), items, multi_frames
+
     def clone(self) -> 'PlotLayout':
         """ Return a cloned object with no information about options and layer visibility.
             LayoutItems are not cloned, only referenced to original.
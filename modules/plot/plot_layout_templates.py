@@ -16,14 +16,18 @@
 *                                                                         *
 ***************************************************************************
 """
+import importlib
+import traceback
+
 from pathlib import Path
 
 import xml.etree.ElementTree as ET
 
 from qgis.PyQt.QtXml import QDomDocument
 from qgis.core import (QgsPrintLayout, QgsProject, QgsReadWriteContext,
-                       QgsApplication, QgsPointXY, QgsRectangle)
-from typing import Dict
+                       QgsApplication, QgsPointXY, QgsRectangle,
+                       QgsLayoutItemLabel, QgsLayoutItemPicture)
+from typing import Dict, Optional
 
 
 from .plot_layout import PlotLayout
@@ -129,8 +133,9 @@ class PlotLayoutTemplates(ModuleBase):
         count = len(packets)
 
         progress: DoubleProgressGroup = getattr(self.get_parent(), "progress", None)
-        progress.start_progressbars(0, count, use_subbar=False,
-                                    can_cancel=False, hide_widgets=[self.get_parent().ScrollArea])
+        scroll_area = getattr(self.get_parent(), "ScrollArea", None)
+        progress.start_progressbars(0, count, use_subbar=False, can_cancel=False,
+                                    hide_widgets=[scroll_area] if scroll_area is not None else [])
 
         progress.get_mainbar().setValue(0)
         progress.get_mainbar().setMaximum(count)
@@ -157,6 +162,76 @@ class PlotLayoutTemplates(ModuleBase):
             plot_layout.set_parent(self)
             self.__layouts[filename] = plot_layout
 
+    def initialize_defaults(self, plot_layer: 'PlotLayer', layout: Optional[PlotLayout] = None):
+        """ loads defaults from plots.xml into PlotLayer options and layout icons
+
+            :param plot_layer: PlotLayer to store default options
+            :param layout: layout to use, defaults to layout from plot layer
+            :raises KeyError: no layout found with plot layers file
+        """
+        options = plot_layer.options
+        if layout is None:
+            layout = self[plot_layer.file]
+
+        for item_id, value_pair in layout.defaults.items():
+            type_, value = value_pair
+
+            current_value = options.get(item_id, ("", False))[0]
+            if current_value:
+                continue
+
+            value_to_set = ""
+            item = layout.layout.itemById(item_id)
+            if type_ == "function":
+                # call something from defined function with importlib
+                try:
+                    path = Path(self.get_parent_plugin().plugin_dir)
+                    if path.name == "":
+                        path = path.parent
+                    parents = []
+                    while path.name != "plugins" and path != path.parent:
+                        parents.append(path.name)
+                        path = path.parent
+                    parents = ".".join(reversed(parents))
+                    import_path = f"{parents}.templates.plots.{value}"
+
+                    *import_path, attribute = import_path.split(".")
+                    module = importlib.import_module(".".join(import_path))
+                    value_to_set = getattr(module, attribute)(self.get_parent_plugin(), layout, item)
+                except:
+                    self.log(str(traceback.format_exc()), "plot-function-call")
+                    value_to_set = ""
+                assert isinstance(value_to_set, str), f"returned value from plot_functions.{value} is not a string, " \
+                                                      f"got '{value_to_set}' with type {type(value_to_set)}"
+
+            if type_ == "value":
+                value_to_set = value
+
+            if item is not None and value_to_set is not None:
+                if isinstance(item, QgsLayoutItemLabel):
+                    # item.setText(value_to_set)
+                    options[item_id] = (value_to_set, False)
+        plot_layer.options = options
+        self.load_icons(layout)
+
+    def load_icons(self, layout: PlotLayout):
+        """ sets icons from plots.xml into picture items of layout, e.g. company icon """
+        icon_dir = Path(layout.filepath).parent
+        for item_id, icon_str in layout.icons.items():
+            item = layout.layout.itemById(item_id)
+
+            if isinstance(item, QgsLayoutItemPicture):
+                if not icon_str:
+                    icon = ""
+                else:
+                    try:
+                        icon = self.get_parent_plugin().get_icon_path(icon_str, str(icon_dir))
+                    except:
+                        # try to find in templates/icons
+                        icon = self.get_parent_plugin().get_icon_path(icon_str)
+
+                item.setPicturePath(icon)
+
     @property
     def layouts(self):
         return self.__layouts.values()
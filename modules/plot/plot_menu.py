@@ -18,15 +18,12 @@
 """
 
 import os
-import traceback
-
-import importlib
+import sqlite3
 
 from pathlib import Path
 
 from qgis.core import (QgsProject, QgsMapLayer, QgsVectorLayer,
                        QgsLayoutSize, QgsLayoutItemPage,
-                       QgsLayoutItemLabel, QgsLayoutItemPicture,
                        QgsCoordinateReferenceSystem, QgsGeometry,
                        QgsApplication)
 
@@ -41,10 +38,12 @@ from ..template.base_class import UiModuleBase, ModuleBase
 from ..template.gui.progressbar_extended import DoubleProgressGroup
 from ...submodules.tools.qt_functions import set_label_status
 from ...submodules.tools._qt_constants import STYLE_SHEET_ERROR, STYLE_SHEET_WARNING
-from ...submodules.tools.geometrytools import transform_geometry
+from ...submodules.tools.geometrytools import transform_cache, transform_geometry
+from ...submodules.tools.geopackage import GeoPackage
 from .plot import PrintLayout
+from .plot_export import PdfExportTask
 from .plot_new_layout import PlotNewLayout
-from .plot_layer import PlotLayer, PlotPage
+from .plot_layer import LayerSetCache, PlotLayer, PlotPage, PageRecord
 from .plot_layout import PlotLayout
 from .plot_layout_templates import PlotLayoutTemplates
 from .plot_layout_menu import PlotLayoutMenu
@@ -104,9 +103,14 @@ class PlotMenu(UiModuleBase, FORM_CLASS, QMainWindow):
 
         self.layouts: PlotLayoutTemplates = self.add_module("PlotLayoutTemplates", PlotLayoutTemplates)
 
+        # running pdf exports (background tasks), progress shows the last started one
+        self.__exports: List[PdfExportTask] = []
+        self.__current_export: Optional[PdfExportTask] = None
+
         # add some Qt connections
         self.connect(self.But_NewLayout.clicked, self.add_new_layout)
         self.connect(self.But_Create_PDF.clicked, self.create_pdf)
+        self.connect(self.progress.But_Cancel.clicked, self.cancel_pdf_export)
         self.connect(self.But_AddFile.clicked, self.add_file)
         self.connect(self.But_Create_PrintLayout.clicked, self.create_qgs_print_layout)
         self.connect(self.But_AddPage.clicked, self.add_new_page)
@@ -119,6 +123,7 @@ class PlotMenu(UiModuleBase, FORM_CLASS, QMainWindow):
         self.connect(QgsProject.instance().legendLayersAdded, self.layers_added)
         self.connect(QgsProject.instance().layersRemoved, self.layers_removed)
         self.connect(self.SpinBox_Dpi.valueChanged, self.dpi_changed)
+        self.connect(self.DrD_ExportProfile.currentIndexChanged, self.export_profile_changed)
         self.connect(self.SpinBox_Scale.valueChanged, self.scale_changed)
         self.SpinBox_Page_Scale.setValue(self.SpinBox_Scale.value())
         self.connect(self.List_Pages.model().rowsMoved, self.page_moved)
@@ -174,8 +179,9 @@ class PlotMenu(UiModuleBase, FORM_CLASS, QMainWindow):
             set_label_status(self.Label_Status, str(e), STYLE_SHEET_ERROR)
 
     def create_pdf(self, checked: bool):
-        """ creates new QgsPrintLayout in QgsProject """
-
+        """ Builds the layout and exports a clone of it to pdf in a background task.
+            The menu is hidden only while the layout is built, more exports can be started meanwhile.
+        """
         save_path, _ = QFileDialog.getSaveFileName(
             self,
             self.tr_("Save file"),
@@ -186,54 +192,103 @@ class PlotMenu(UiModuleBase, FORM_CLASS, QMainWindow):
         if not save_path:
             return
 
-        self.progress.start_progressbars(0, 100, hide_widgets=[self.ScrollArea])
+        if self.progress.progress_active:
+            # progress shows a running export, its task keeps running
+            self.progress.restore()
+        self.__current_export = None
+
+        # pages deleted in QGIS leave gaps in page numbers
+        if self.plot_layer.fix_page_numbers():
+            self.reload_pages()
+
+        self.progress.start_progressbars(0, 100, hide_widgets=[self.ScrollArea], can_cancel=True)
         try:
-            layout: PrintLayout = self.add_module("PrintLayout", PrintLayout,
+            layout: PrintLayout = self.add_module("PdfPrintLayout", PrintLayout,
                                                   plot_layer=self.plot_layer, progress=self.progress,
                                                   layouts=self.layouts,
                                                   auto_finish=False)
-            bar = self.progress.get_mainbar()
-            bar.setMaximum(bar.maximum() + 1)
-            self.progress.set_text_main(self.tr_("PDF will be saved. Please wait."))
-            self.progress.add_main(1)
-
-            self.progress.get_subbar().setValue(0)
-            self.progress.get_subbar().setMaximum(101)
         except AssertionError as e:
             self.progress.restore()
             set_label_status(self.Label_Status, str(e), STYLE_SHEET_ERROR)
             self.iface.messageBar().pushWarning(self.tr_("Print Menu"), str(e))
-
-            if "FileError" in str(e) and Path(save_path).is_file():
-                QMessageBox.warning(self.iface.mainWindow(),
-                                    self._tr("Error"),
-                                    self.tr_("File %s could not be saved. "
-                                             "Please close needed applications.") % save_path)
+            return
+        except InterruptedError as e:
+            self.progress.restore()
+            set_label_status(self.Label_Status, str(e), STYLE_SHEET_WARNING)
             return
 
-        # Zeit schinden für den Ladebalken!!
-        for _ in range(100):
-            self.progress.set_text_single(self.tr_("Preparing writing PDF %s.\n"
-                                                   " Depending on your layers, network connection, layout size "
-                                                   "and more this process can take a moment.") % save_path)
-            self.progress.add_sub(1)
-
-        error = layout.create_pdf(save_path)
-        layout.unload(True)
+        try:
+            task = PdfExportTask(layout, save_path, clone=True)
+        finally:
+            # the task exports its own clone
+            self.release_export_layout(layout)
+        self.__exports.append(task)
+        task.exported.connect(lambda error: self.pdf_exported(task, error))
+
+        # page construction finished, menu can be used while the pdf is saved
         self.progress.restore()
+        self.progress.start_progressbars(0, 100, hide_widgets=[], can_cancel=True, use_subbar=False)
+        self.progress.set_text_main(self.tr_("PDF will be saved. Please wait."))
+        task.progressChanged.connect(lambda value: self.pdf_export_progress(task, value))
+        task.pageStarted.connect(lambda page, count, layers: self.pdf_export_page(task, page, count, layers))
+        self.__current_export = task
+
+        QgsApplication.taskManager().addTask(task)
+
+    def pdf_export_progress(self, task: PdfExportTask, value: float):
+        """ shows progress of the last started export """
+        if task is self.__current_export and self.progress.progress_active:
+            self.progress.get_mainbar().setValue(min(int(value), 99))
+
+    def pdf_export_page(self, task: PdfExportTask, page: int, count: int, layers: int):
+        """ shows the page of the last started export, which is rendered now """
+        if task is self.__current_export and self.progress.progress_active:
+            self.progress.set_text_main(self.tr_("Saving page %s / %s (%s layers)") % (page, count, layers))
+
+    def cancel_pdf_export(self):
+        """ cancels the last started export, when cancel button in progress is clicked """
+        if self.__current_export is not None:
+            self.__current_export.cancel()
+
+    @staticmethod
+    def release_export_layout(layout: PrintLayout):
+        """ removes a built layout, after its clone has been given to the export task """
+        layout.cleanup_layout()
+        layout.remove_legend_group()
+        layout.unload(True)
+
+    def pdf_exported(self, task: PdfExportTask, error: str):
+        """ Cleanup after background export and show result.
+
+            :param task: finished task
+            :param error: error message, empty on success
+        """
+        if task in self.__exports:
+            self.__exports.remove(task)
+
+        if task is self.__current_export:
+            self.__current_export = None
+            if self.progress.progress_active:
+                self.progress.restore()
 
         if error:
+            set_label_status(self.Label_Status, error, STYLE_SHEET_ERROR)
             QMessageBox.information(
                 self.iface.mainWindow(),
                 self.tr_("Error"),
                 self.tr_("PDF print finished with errors.") + "\n" + error
             )
 
+            if "FileError" in error and Path(task.save_path).is_file():
+                QMessageBox.warning(self.iface.mainWindow(),
+                                    self.tr_("Error"),
+                                    self.tr_("File %s could not be saved. "
+                                             "Please close needed applications.") % task.save_path)
+
         else:
-            QMessageBox.information(
-                self.iface.mainWindow(),
+            self.iface.messageBar().pushSuccess(
                 self.tr_("Print Menu"),
-                self.tr_("PDF print finished without errors.")
+                self.tr_("PDF print finished without errors.") + f" {task.save_path}"
             )
 
     def delete_page(self, checked: bool):
@@ -252,9 +307,11 @@ class PlotMenu(UiModuleBase, FORM_CLASS, QMainWindow):
             if reply != QMessageBox.Yes:
                 return
 
-        self.plot_layer.delete_fids([item.data(Qt.UserRole) for item in items])
+        fids = [item.data(Qt.UserRole) for item in items]
+        self.plot_layer.delete_fids(fids)
+        # page recalculation
+        self.plot_layer.renumber_pages([fid for fid in self.get_page_fids() if fid not in fids])
         self.reload_pages()
-        self.page_moved()  # triggers page recalculation
 
         if len(items) == 1:
             row = self.List_Pages.currentRow()
@@ -361,12 +418,12 @@ class PlotMenu(UiModuleBase, FORM_CLASS, QMainWindow):
 
     def page_moved(self, *args, **kwargs):
         """ internal page moved """
-        for row in range(self.List_Pages.count()):
-            page: PlotPage = self.plot_layer.get_page_from_fid(self.List_Pages.item(row).data(Qt.UserRole))
-            page.page = row + 1
-
+        self.plot_layer.renumber_pages(self.get_page_fids())
         self.reload_pages()
-        self.plot_layer.layer_pages.triggerRepaint()
+
+    def get_page_fids(self) -> List[int]:
+        """ returns feature ids of pages in list order """
+        return [self.List_Pages.item(row).data(Qt.UserRole) for row in range(self.List_Pages.count())]
 
     def open_page_item(self, current):
         """ current page item changed """
@@ -392,9 +449,7 @@ class PlotMenu(UiModuleBase, FORM_CLASS, QMainWindow):
     def initialize_defaults(self, plot_layer: PlotLayer, layout: Optional[PlotLayout] = None):
         """ loads defaults into PlotLayer """
         try:
-            options = plot_layer.options
-            if layout is None:
-                layout = self.layouts[plot_layer.file]
+            self.layouts.initialize_defaults(plot_layer, layout)
         except KeyError:
             QMessageBox.warning(
                 self,
@@ -404,64 +459,6 @@ class PlotMenu(UiModuleBase, FORM_CLASS, QMainWindow):
             self.DrD_PrintLayoutsGpkg.setCurrentIndex(0)
             return
 
-        for item_id, value_pair in layout.defaults.items():
-            type_, value = value_pair
-
-            current_value = options.get(item_id, ("", False))[0]
-            if current_value:
-                continue
-
-            value_to_set = ""
-            item = layout.layout.itemById(item_id)
-            if type_ == "function":
-                # call something from defined function with importlib
-                try:
-                    path = Path(self.get_parent_plugin().plugin_dir)
-                    if path.name == "":
-                        path = path.parent
-                    parents = []
-                    while path.name != "plugins":
-                        parents.append(path.name)
-                        path = path.parent
-                    parents = ".".join(reversed(parents))
-                    import_path = f"{parents}.templates.plots.{value}"
-
-                    *import_path, attribute = import_path.split(".")
-                    module = importlib.import_module(".".join(import_path))
-                    value_to_set = getattr(module, attribute)(self.get_parent_plugin(), layout, item)
-                except:
-                    self.log(str(traceback.format_exc()), "plot-function-call")
-                    value_to_set = ""
-                assert isinstance(value_to_set, str), f"returned value from plot_functions.{value} is not a string, " \
-                                                      f"got '{value_to_set}' with type {type(value_to_set)}"
-
-            if type_ == "value":
-                value_to_set = value
-
-            if item is not None and value_to_set is not None:
-                if isinstance(item, QgsLayoutItemLabel):
-                    # item.setText(value_to_set)
-                    options[item_id] = (value_to_set, False)
-        plot_layer.options = options
-
-        # load icons, e.g. company icon
-        icon_dir = Path(layout.filepath).parent
-        for item_id, icon_str in layout.icons.items():
-            item = layout.layout.itemById(item_id)
-
-            if isinstance(item, QgsLayoutItemPicture):
-                if not icon_str:
-                    icon = ""
-                else:
-                    try:
-                        icon = self.get_parent_plugin().get_icon_path(icon_str, str(icon_dir))
-                    except:
-                        # try to find in templates/icons
-                        icon = self.get_parent_plugin().get_icon_path(icon_str)
-
-
-                item.setPicturePath(icon)
-
     def load_page_templates(self, selected_layout: PlotLayout):
         """ something to setup later, after module has been fully loaded """
 
@@ -544,6 +541,22 @@ class PlotMenu(UiModuleBase, FORM_CLASS, QMainWindow):
     def dpi_changed(self, value: int):
         self.global_layout_menu.plot_layer.dpi = value
 
+    def export_profile_changed(self, index: int):
+        name: str = self.DrD_ExportProfile.itemData(index)
+        if name is None or self.plot_layer is None:
+            return
+
+        self.plot_layer.export_profile = name
+
+    def load_export_profiles(self):
+        """ loads export profiles from plot layer into dropdown """
+        self.DrD_ExportProfile.blockSignals(True)
+        self.DrD_ExportProfile.clear()
+        for name in self.plot_layer.export_profiles:
+            self.DrD_ExportProfile.addItem(name, name)
+        self.DrD_ExportProfile.setCurrentIndex(max(0, self.DrD_ExportProfile.findData(self.plot_layer.export_profile)))
+        self.DrD_ExportProfile.blockSignals(False)
+
     def scale_changed(self, value: int):
         self.global_layout_menu.plot_layer.scale = value
         self.SpinBox_Page_Scale.setValue(value)
@@ -595,6 +608,12 @@ class PlotMenu(UiModuleBase, FORM_CLASS, QMainWindow):
         index = self.get_layer_index(layer)
         self.DrD_PrintLayoutsGpkg.setCurrentIndex(index)
 
+    def plot_layer_save_failed(self, error: str):
+        """ shows error, when changes could not be written into the plot file """
+        message = self.tr_("Print Layer could not be saved: %s") % error
+        set_label_status(self.Label_Status, message, STYLE_SHEET_ERROR)
+        self.iface.messageBar().pushWarning(self.tr_("Print Menu"), message)
+
     def layout_selected(self, index: int):
         """ plot layer selected in dropdown, do something """
         data: str = self.DrD_PrintLayoutsGpkg.currentData()
@@ -605,6 +624,9 @@ class PlotMenu(UiModuleBase, FORM_CLASS, QMainWindow):
 
         self.remove_managed_actions()
 
+        if self.plot_layer is not None:
+            self.plot_layer.release()
+
         if self.global_layout_menu is not None:
             self.Frame_Layout_Menu_Global._ui_module_base.replace_with_empty_frame()
             self.global_layout_menu.unload(True)
@@ -634,7 +656,16 @@ class PlotMenu(UiModuleBase, FORM_CLASS, QMainWindow):
                                               'plots',
                                               'plot_layer_stil.qml'),
                                  True)
-            self.plot_layer = PlotLayer(layer)
+            try:
+                self.plot_layer = PlotLayer(layer)
+            except sqlite3.Error as e:
+                # e.g. locked by another program
+                self.Frame_Plotlayer.setEnabled(False)
+                set_label_status(self.Label_Status,
+                                 self.tr_("Print Layer could not be opened: %s") % e,
+                                 STYLE_SHEET_ERROR)
+                return
+            self.plot_layer.saveFailed.connect(self.plot_layer_save_failed)
             self.initialize_defaults(self.plot_layer)
             for layout in self.layouts:
                 if layout.path == self.plot_layer.file:
@@ -667,6 +698,7 @@ class PlotMenu(UiModuleBase, FORM_CLASS, QMainWindow):
             self.CheckBox_Overview.setCheckState(Qt.Checked if self.plot_layer.create_overview_page
                                                  else Qt.Unchecked)
             self.SpinBox_Dpi.setValue(self.plot_layer.dpi)
+            self.load_export_profiles()
             self.SpinBox_Scale.setValue(self.plot_layer.scale)
 
             self.reload_pages()
@@ -678,14 +710,18 @@ class PlotMenu(UiModuleBase, FORM_CLASS, QMainWindow):
                                  self.tr_("Coordinate Reference System from Print Layer and current QGIS Project are different. "
                                           "Maybe the page rectangles will have mystery orientations."),
                                  STYLE_SHEET_WARNING)
+            elif self.plot_layer.store.in_memory:
+                set_label_status(self.Label_Status,
+                                 self.tr_("Print Layer is read-only, layer visibilities and texts will not be saved."),
+                                 STYLE_SHEET_WARNING)
 
     def reload_pages(self):
         # loads pages from plot layer
         self.List_Pages.clear()
-        for page in self.plot_layer:
+        for page in self.plot_layer.snapshot():
             self.add_page_feature(page)
 
-    def add_page_feature(self, page: PlotPage):
+    def add_page_feature(self, page: Union[PlotPage, PageRecord]):
         orientation = self.layouts.get_orientation(page.file)
         if orientation == QgsLayoutItemPage.Portrait:
             orientation = self.tr_("portr.")
@@ -741,7 +777,7 @@ class PlotMenu(UiModuleBase, FORM_CLASS, QMainWindow):
 
         layout: PlotLayout = self.DrD_Page_Templates.currentData()
 
-        crs: QgsCoordinateReferenceSystem = self.plot_layer.layer_pages.dataProvider().crs()
+        crs: QgsCoordinateReferenceSystem = self.plot_layer.get_crs()
         center = transform_geometry(QgsGeometry.fromRect(crs.bounds()),
                                     QgsCoordinateReferenceSystem("EPSG:4326"),
                                     crs).boundingBox().center()
@@ -752,16 +788,16 @@ class PlotMenu(UiModuleBase, FORM_CLASS, QMainWindow):
                                                    scale,
                                                    0.0)
 
-        overview = PlotOverviewRectangles(layers, self.plot_layer.layer_pages.dataProvider().crs(), rectangle)
-        for rectangle in overview.rectangles:
-            page = self.plot_layer.add_page(layout, QgsGeometry.fromRect(rectangle), scale, 0.0)
-        else:
-            if not overview.rectangles:
-                QMessageBox.information(self.iface.mainWindow(),
-                                        self.tr_("Plot Menu (Overview)"),
-                                        self.tr_("No pages calculated."))
-            else:
-                self.reload_pages()
+        overview = PlotOverviewRectangles(layers, crs, rectangle)
+        if not overview.rectangles:
+            QMessageBox.information(self.iface.mainWindow(),
+                                    self.tr_("Plot Menu (Overview)"),
+                                    self.tr_("No pages calculated."))
+            return
+
+        self.plot_layer.add_pages([(layout, QgsGeometry.fromRect(rectangle), scale, 0.0)
+                                   for rectangle in overview.rectangles])
+        self.reload_pages()
 
     def unload(self, self_unload: bool = False):
         """ will be called, when module will be unloaded
@@ -769,6 +805,19 @@ class PlotMenu(UiModuleBase, FORM_CLASS, QMainWindow):
             :param self_unload: only self unload, defaults to False
         """
 
+        # running exports use their own layout clones, they are canceled and stop in background
+        for task in self.__exports:
+            task.exported.disconnect()
+            task.cancel()
+        self.__exports.clear()
+        self.__current_export = None
+
+        if self.plot_layer is not None:
+            self.plot_layer.release()
+        GeoPackage.pool.release_all()
+        LayerSetCache.release()
+        transform_cache.disconnect()
+
         # clear loaded layouts (remove all pages and items)
         for plot_layout in self.layouts.layouts:
             plot_layout.layout.clear()
@@ -19,13 +19,25 @@
 
 import json
 import math
+import struct
+
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import compress
 
 from qgis.core import (QgsVectorLayer, QgsGeometry, QgsFeature, QgsRectangle,
                        QgsFeatureRequest, QgsCoordinateReferenceSystem)
 
-from typing import List
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+try:
+    import numpy
+except ImportError:
+    # features will be added one by one, see `PlotOverviewRectangles.add_feature`
+    numpy = None
 
-from ...submodules.tools.geometrytools import transform_geometry, is_geometry_valid
+from ...submodules.tools.geometrytools import (transform_geometry, transform_geometries, is_geometry_valid,
+                                               get_valid_geometries)
 
 
 class PlotOverviewRectangles:
@@ -53,7 +65,7 @@ class PlotOverviewRectangles:
         self.__width_overlap = self.width * (1 - overlap)
         self.__height_overlap = self.height * (1 - overlap)
 
-        self.__positions: List[Position] = []
+        self.__positions = Positions()
         self.__rectangles: List[QgsRectangle] = []
 
         self.run()
@@ -71,92 +83,155 @@ class PlotOverviewRectangles:
             request = QgsFeatureRequest().setNoAttributes()
             request = request.setFilterFids(layer.selectedFeatureIds())
 
-            for feature in layer.getFeatures(request):
-                self.add_feature(feature, layer.dataProvider().crs())
+            self.add_features(layer.getFeatures(request), layer.dataProvider().crs())
 
         self.calculate_rectangles()
 
     def calculate_rectangles(self):
+        """ Greedy tiling, starting with the left most position:
+            A page is placed at the lowest position, which fits into one page with the left most position,
+            and takes all positions, which start within the page height and end within the page width.
+
+            Positions are swept from left to right (sorted by xmax),
+            positions within the page width are held in a `RangeMinTree` by their ymin.
+            Conditions are compared like the former quadratic implementation, so rectangles are the same.
+            Positions, which can not be placed, remain in `positions`.
+        """
         self.rectangles.clear()
-        while self.positions:
-            ppos = self.positions[:]
-
-            # Kleinsten xmin-Wert finden
-            xmin = None
-            yxmin = None
-            for p, _ in enumerate(self.positions):
-                pos = self.positions[p]
-
-                if xmin is None:
-                    xmin = pos.xmin
-                    yxmin = pos.ymin
-
-                elif pos.xmin < xmin:
-                    xmin = pos.xmin
-                    yxmin = pos.ymin
+        positions = self.positions
+        count = len(positions)
+        if not count:
+            return
+
+        width_overlap = self.width_overlap
+        height_overlap = self.height_overlap
+        xmins = positions.column('xmin')
+        xmaxs = positions.column('xmax')
+        ymins = positions.column('ymin')
+        ymaxs = positions.column('ymax')
+
+        # next left most position, same xmin: first position in list
+        order_xmin = sorted(range(count), key=lambda p: (xmins[p], p))
+        # positions will be added to tree, when they end within page width
+        order_xmax = sorted(range(count), key=xmaxs.__getitem__)
+        # ranks in tree by ymin
+        order_ymin = sorted(range(count), key=ymins.__getitem__)
+        sorted_ymins = array('d', (ymins[p] for p in order_ymin))
+        ranks = [0] * count
+        for rank, p in enumerate(order_ymin):
+            ranks[p] = rank
+
+        tree = RangeMinTree(count)
+        removed = [False] * count
+        next_xmin = 0
+        next_xmax = 0
+
+        while True:
+            while next_xmin < count and removed[order_xmin[next_xmin]]:
+                next_xmin += 1
+            if next_xmin == count:
+                break
 
-            # Kleinsten ymin-Wert eines Objekts finden das noch komplett in die Plotbreite minus Überlappung passt
+            first = order_xmin[next_xmin]
+            xmin = xmins[first]
+            yxmin = ymins[first]
+            xmin_width = xmin + width_overlap
+
+            # positions ending within page width, xmin is the smallest of all positions
+            while next_xmax < count:
+                p = order_xmax[next_xmax]
+                if abs(xmaxs[p] - xmin) > width_overlap and xmaxs[p] > xmin_width:
+                    break
+                tree.set(ranks[p], ymaxs[p])
+                next_xmax += 1
+
+            # lowest ymin of a position, which fits with the first position in one page
+            def in_height(value: float) -> bool:
+                return abs(value - yxmin) <= height_overlap
+
+            lower = bisect_predicate(sorted_ymins, lambda value: value >= yxmin or in_height(value))
+            upper = bisect_predicate(sorted_ymins, lambda value: value > yxmin and not in_height(value))
             ymin = None
-            for p, _ in enumerate(self.positions):
-                pos = self.positions[p]
-
-                if abs(pos.xmin - xmin) <= self.width_overlap and abs(
-                        pos.xmax - xmin) <= self.width_overlap:
-
-                    if abs(pos.ymin - yxmin) <= self.height_overlap and abs(
-                            pos.ymax - yxmin) <= self.height_overlap:
-
-                        if ymin is None:
-                            ymin = pos.ymin
-                        elif pos.ymin < ymin:
-                            ymin = pos.ymin
-
-            # Alle Objekte finden die in dem Bereich liegen der durch xmin, ymin festgelegt wurde und in einer Liste
-            # zusammenfassen und die wirklichen Ausmaße finden
+            while lower < upper:
+                rank = tree.find_first(lower, upper, lambda value: value <= yxmin or in_height(value))
+                if rank < 0:
+                    break
+                if abs(xmaxs[order_ymin[rank]] - xmin) <= width_overlap:
+                    ymin = sorted_ymins[rank]
+                    break
+                lower = rank + 1
+
+            # all positions starting within page height
             xmax = None
             ymax = None
             p_list = []
-            for p, _ in enumerate(self.positions):
-                pos = self.positions[p]
-                if ymin is not None and xmin is not None:
-                    if xmin <= pos.xmin and (xmin + self.width_overlap) >= pos.xmax:
-                        if ymin <= pos.ymin <= (ymin + self.height_overlap):
-                            p_list.append(p)
-                            if xmax is None:
-                                xmax = pos.xmax
-                            elif xmax < pos.xmax:
-                                xmax = pos.xmax
-
-                            if ymax is None:
-                                ymax = pos.ymax
-                            elif ymax < pos.ymax:
-                                ymax = pos.ymax
-
-            # Falls sowohl xmin als auch ymin gefunden wurden, dann eine Map dieses Bereichs erstellen
+            if ymin is not None:
+                ymin_height = ymin + height_overlap
+                start = bisect_left(sorted_ymins, ymin)
+                end = bisect_right(sorted_ymins, ymin_height)
+                for rank in tree.iterate(start, end):
+                    p = order_ymin[rank]
+                    if xmin_width >= xmaxs[p]:
+                        p_list.append(p)
+                        if xmax is None or xmax < xmaxs[p]:
+                            xmax = xmaxs[p]
+                        if ymax is None or ymax < ymaxs[p]:
+                            ymax = ymaxs[p]
+
             if xmin and ymin and xmax and ymax:
-                # xpos = xmin
-                # ypos = ymin
                 xpos = xmin - (self.width - (xmax - xmin)) / 2
                 ypos = ymin - (self.height - (ymax - ymin)) / 2
                 _rect = QgsRectangle(xpos, ypos, xpos + self.width, ypos + self.height)
                 rectangle = self.rectangle.scaled(1, _rect.center())
                 self.rectangles.append(rectangle)
 
-            # geplottete Objekte für den nächsten Durchlauf aus der Liste entfernen
-            p_list.reverse()
+            if not p_list:
+                break
+
             for p in p_list:
-                del self.positions[p]
+                removed[p] = True
+                tree.set(ranks[p], math.inf)
 
-            if ppos == self.positions:
-                break
+        positions.keep([not value for value in removed])
+
+    def add_features(self, features: Iterable[QgsFeature], crs: QgsCoordinateReferenceSystem):
+        """ Adds positions of features like `add_feature`.
+            Vertices of lines are read from wkb into arrays and all lines are segmented at once with numpy.
+            Other geometries are added by `add_geometry`, the order of positions is kept.
+        """
+        if numpy is None:
+            for feature in features:
+                self.add_feature(feature, crs)
+            return
+
+        lines = []
+        for transformed in transform_geometries(get_valid_geometries(features), crs, self.crs):
+            vertices = read_lines_wkb(transformed.asWkb().data())
+            if vertices is None:
+                self.add_lines(lines)
+                lines = []
+                self.add_geometry(transformed)
+            else:
+                lines.extend(vertices)
+
+        self.add_lines(lines)
+
+    def add_lines(self, lines: List['numpy.ndarray']):
+        """ adds segmented lines, see `segment_lines` """
+        if not lines:
+            return
+
+        self.positions.extend_columns(segment_lines(lines, self.height * self.overlap))
 
     def add_feature(self, feature: QgsFeature, crs: QgsCoordinateReferenceSystem) -> List['Position']:
         geometry: QgsGeometry = feature.geometry()
         if not is_geometry_valid(geometry):
             return []
 
-        transformed = transform_geometry(geometry, crs, self.crs)
+        self.add_geometry(transform_geometry(geometry, crs, self.crs))
 
+    def add_geometry(self, transformed: QgsGeometry):
+        """ adds positions of a valid geometry in crs of this overview """
         g = json.loads(transformed.asJson())
         if g['type'] == 'Point':
             self.positions.append(Position(
@@ -263,7 +338,7 @@ class PlotOverviewRectangles:
         return self.__height_overlap
 
     @property
-    def positions(self) -> List['Position']:
+    def positions(self) -> 'Positions':
         return self.__positions
 
     @property
@@ -276,22 +351,238 @@ class PlotOverviewRectangles:
                f"width_overlap: {self.width_overlap}, overlap: {self.overlap}, overlap: {self.overlap})"
 
 
-class Position:
+class Position(NamedTuple):
+    x1: float
+    x2: float
+    y1: float
+    y2: float
+    width: float
+    height: float
+    xmin: float
+    ymin: float
+    xmax: float
+    ymax: float
+
+
+class Positions:
+    """ Columnar storage of positions, one array of floats per field of `Position`.
+        A position needs 80 bytes, `Position` records are created only on access.
+    """
+
+    def __init__(self):
+        self.__columns = {name: array('d') for name in Position._fields}
+
+    def column(self, name: str) -> array:
+        """ values of one field, e.g. `xmin`, in order of positions """
+        return self.__columns[name]
+
+    def append(self, position: Position):
+        for column, value in zip(self.__columns.values(), position):
+            column.append(value)
+
+    def extend(self, positions: Iterable[Position]):
+        for position in positions:
+            self.append(position)
+
+    def extend_columns(self, columns: Sequence[Sequence[float]]):
+        """ appends positions from one sequence per field, e.g. numpy arrays from `segment_lines` """
+        for column, values in zip(self.__columns.values(), columns):
+            if numpy is not None and isinstance(values, numpy.ndarray):
+                column.frombytes(numpy.ascontiguousarray(values, dtype=float).tobytes())
+            else:
+                column.extend(values)
+
+    def keep(self, selectors: Sequence[bool]):
+        """ removes all positions with a false selector """
+        for name, column in self.__columns.items():
+            self.__columns[name] = array('d', compress(column, selectors))
+
+    def clear(self):
+        for name in self.__columns:
+            self.__columns[name] = array('d')
+
+    @property
+    def nbytes(self) -> int:
+        """ memory of values """
+        return sum(column.itemsize * len(column) for column in self.__columns.values())
+
+    def __len__(self) -> int:
+        return len(self.__columns['xmin'])
+
+    def __getitem__(self, index: int) -> Position:
+        return Position(*(column[index] for column in self.__columns.values()))
 
-    def __init__(self, x1: float, x2: float, y1: float, y2: float, width: float,
-                 height: float, xmin: float, ymin: float, xmax: float, ymax: float):
-        self.x1 = x1
-        self.x2 = x2
-        self.y1 = y1
-        self.y2 = y2
-        self.width = width
-        self.height = height
-        self.xmin = xmin
-        self.ymin = ymin
-        self.xmax = xmax
-        self.ymax = ymax
+    def __iter__(self) -> Iterator[Position]:
+        return (Position(*values) for values in zip(*self.__columns.values()))
 
     def __repr__(self):
-        name = self.__class__.__name__
-        return f"{name}(x1={self.x1}, x2={self.x2}, y1={self.y1}, y2={self.y2}, width={self.width}, " \
-               f"height={self.height}, xmin={self.xmin}, ymin={self.ymin}, xmax={self.xmax}, ymax={self.ymax})"
+        return f"{self.__class__.__name__}({len(self)})"
+
+
+class RangeMinTree:
+    """ Segment tree with the minimum value of ranks, ranks without value are infinite.
+
+        :param count: count of ranks
+    """
+
+    def __init__(self, count: int):
+        size = 1
+        while size < count:
+            size *= 2
+        self.size = size
+        self.values = [math.inf] * (2 * size)
+
+    def set(self, rank: int, value: float):
+        """ sets value of rank, `math.inf` removes it """
+        values = self.values
+        node = rank + self.size
+        values[node] = value
+        node //= 2
+        while node:
+            minimum = min(values[2 * node], values[2 * node + 1])
+            if values[node] == minimum:
+                break
+            values[node] = minimum
+            node //= 2
+
+    def find_first(self, lower: int, upper: int, predicate: Callable[[float], bool]) -> int:
+        """ Returns first rank in range with a value matching the predicate, -1 if there is none.
+            Predicate has to match all values smaller than a matching value.
+        """
+        values = self.values
+        stack = [(1, 0, self.size)]
+        while stack:
+            node, node_lower, node_upper = stack.pop()
+            if node_upper <= lower or upper <= node_lower or not predicate(values[node]):
+                continue
+            if node >= self.size:
+                return node - self.size
+            middle = (node_lower + node_upper) // 2
+            # left child first
+            stack.append((2 * node + 1, middle, node_upper))
+            stack.append((2 * node, node_lower, middle))
+
+        return -1
+
+    def iterate(self, lower: int, upper: int) -> Iterator[int]:
+        """ yields ranks with value in range """
+        values = self.values
+        ranks = []
+        stack = [(1, 0, self.size)]
+        while stack:
+            node, node_lower, node_upper = stack.pop()
+            if node_upper <= lower or upper <= node_lower or values[node] == math.inf:
+                continue
+            if node >= self.size:
+                ranks.append(node - self.size)
+                continue
+            middle = (node_lower + node_upper) // 2
+            stack.append((2 * node + 1, middle, node_upper))
+            stack.append((2 * node, node_lower, middle))
+
+        return iter(ranks)
+
+
+def bisect_predicate(values: List[float], predicate: Callable[[float], bool]) -> int:
+    """ returns index of first value matching the predicate, which matches all following values too """
+    lower, upper = 0, len(values)
+    while lower < upper:
+        middle = (lower + upper) // 2
+        if predicate(values[middle]):
+            upper = middle
+        else:
+            lower = middle + 1
+
+    return lower
+
+
+def read_lines_wkb(wkb: bytes) -> Optional[List['numpy.ndarray']]:
+    """ Returns x/y vertices per line from wkb of a (multi) line string, None for other geometry types.
+        Z and M values are skipped.
+
+        :param wkb: ISO wkb, e.g. from `QgsGeometry.asWkb`
+        :return: array with shape (vertices, 2) per line
+    """
+    lines = []
+
+    def read(offset: int, line_only: bool) -> Optional[int]:
+        byte_order = "<" if wkb[offset] == 1 else ">"
+        geometry_type, count = struct.unpack_from(f"{byte_order}II", wkb, offset + 1)
+        if geometry_type & 0x80000000:
+            # 2.5D
+            dimensions = 3
+            geometry_type &= 0xff
+        else:
+            flag, geometry_type = divmod(geometry_type, 1000)
+            dimensions = 2 + (flag > 0) + (flag == 3)
+        offset += 9
+
+        if geometry_type == 2:
+            vertices = numpy.frombuffer(wkb, dtype=f"{byte_order}f8", count=count * dimensions, offset=offset)
+            lines.append(vertices.reshape(count, dimensions)[:, :2].astype(float))
+            return offset + count * dimensions * 8
+        if geometry_type == 5 and not line_only:
+            for _ in range(count):
+                offset = read(offset, True)
+                if offset is None:
+                    return None
+            return offset
+
+        return None
+
+    if read(0, False) is None:
+        return None
+
+    return lines
+
+
+def segment_lines(lines: List['numpy.ndarray'], max_length: float) -> Tuple['numpy.ndarray', ...]:
+    """ Splits all line segments into parts not longer than `max_length`.
+        Parts are calculated like in `PlotOverviewRectangles.add_feature`, step by step from the segment start,
+        so coordinates are the same.
+
+        :param lines: vertices per line, see `read_lines_wkb`
+        :param max_length: maximum length of a part
+        :return: columns of `Position`: x1, x2, y1, y2, width, height, xmin, ymin, xmax, ymax
+    """
+    segments = [line for line in lines if len(line) > 1]
+    if not segments:
+        empty = numpy.empty(0)
+        return (empty, ) * 10
+
+    starts = numpy.concatenate([line[:-1] for line in segments])
+    ends = numpy.concatenate([line[1:] for line in segments])
+    x0, y0 = starts[:, 0], starts[:, 1]
+    x_end, y_end = ends[:, 0], ends[:, 1]
+    dx = x_end - x0
+    dy = y_end - y0
+    if max_length > 0:
+        parts = (numpy.sqrt(dx * dx + dy * dy) / max_length).astype(numpy.int64) + 1
+    else:
+        parts = numpy.ones(len(dx), dtype=numpy.int64)
+    dxp = dx / parts
+    dyp = dy / parts
+
+    # first part of each segment
+    offsets = numpy.cumsum(parts) - parts
+    count = int(parts.sum())
+    x1, x2, y1, y2, width, height = (numpy.empty(count) for _ in range(6))
+
+    # parts of segments with the same count of parts at once, coordinates are summed up step by step
+    for part_count in numpy.unique(parts).tolist():
+        selection = numpy.flatnonzero(parts == part_count)
+        indices = offsets[selection][:, None] + numpy.arange(part_count)
+        for first, second, size, start, step, end in ((x1, x2, width, x0, dxp, x_end),
+                                                      (y1, y2, height, y0, dyp, y_end)):
+            steps = numpy.empty((len(selection), part_count))
+            steps[:, 0] = start[selection]
+            steps[:, 1:] = step[selection][:, None]
+            values = numpy.add.accumulate(steps, axis=1)
+            first[indices] = values
+            second[indices[:, :-1]] = values[:, 1:]
+            second[indices[:, -1]] = end[selection]
+            size[indices[:, :-1]] = numpy.abs(step[selection])[:, None]
+            size[indices[:, -1]] = numpy.abs(end[selection] - values[:, -1])
+
+    return (x1, x2, y1, y2, width, height,
+            numpy.minimum(x1, x2), numpy.minimum(y1, y2), numpy.maximum(x1, x2), numpy.maximum(y1, y2))
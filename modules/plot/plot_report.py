@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    Date                 : October 2026
+    Copyright            : Felix von Studsinske
+    Email                : /
+    Developer            : Felix von Studsinske
+    Description          : -- optional --
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+import json
+
+from datetime import datetime
+from pathlib import Path
+
+from qgis.core import Qgis
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+
+class RenderReport:
+    """
+        Collects wall times in seconds per layout page and writes them as json report.
+
+        Phases per page:
+            create_page: creating page and template items
+            setup_page: configuring maps, legend, labels (includes legend)
+            legend: configuring legend items
+            render: exporting page to pdf
+            layers: rendering time per layer, from rendered map images or measured on request
+            cached: page is taken from cache, no build and render times
+
+        Pages exported together in one step (chunk of pages) have a common render time in `chunks`.
+    """
+
+    PHASES = ('create_page', 'setup_page', 'legend', 'render')
+
+    def __init__(self):
+        self.pages: Dict[str, Dict[str, Any]] = {}
+        # [{'pages': [page keys], 'render': seconds}, ...]
+        self.chunks: List[Dict[str, Any]] = []
+
+    def get_page(self, page: Union[str, int]) -> Dict[str, Any]:
+        return self.pages.setdefault(str(page), {})
+
+    def add(self, page: Union[str, int], phase: str, seconds: float):
+        """ Adds seconds to phase of page.
+
+            :param page: page key ('overview', 'extra_legend', page number)
+            :param phase: create_page, setup_page, legend, render
+            :param seconds: wall time
+        """
+        values = self.get_page(page)
+        values[phase] = values.get(phase, 0.0) + seconds
+
+    def add_layer(self, page: Union[str, int], layer: str, seconds: float):
+        """ Adds render time of a layer on page.
+
+            :param page: page key ('overview', 'extra_legend', page number)
+            :param layer: layer name with id
+            :param seconds: wall time
+        """
+        layers = self.get_page(page).setdefault('layers', {})
+        layers[layer] = layers.get(layer, 0.0) + seconds
+
+    def add_chunk(self, pages: List[Union[str, int]], seconds: float):
+        """ Adds render time of pages, which are exported together.
+
+            :param pages: page keys of chunk
+            :param seconds: wall time
+        """
+        self.chunks.append({'pages': [str(page) for page in pages], 'render': seconds})
+
+    def set_cached(self, page: Union[str, int]):
+        self.get_page(page)['cached'] = True
+
+    def merge(self, other: 'RenderReport', phases: Optional[Iterable[str]] = None):
+        """ Adds all times of other report, e.g. of a chunk or of a worker process.
+
+            :param other: report to add
+            :param phases: add only these phases (and layers), None for all
+        """
+        for page, values in other.pages.items():
+            for phase, value in values.items():
+                if phase == 'layers':
+                    for layer, seconds in value.items():
+                        self.add_layer(page, layer, seconds)
+                elif phase == 'cached':
+                    self.set_cached(page)
+                elif phases is None or phase in phases:
+                    self.add(page, phase, value)
+        self.chunks.extend(other.chunks)
+
+    def get_total(self, phase: str) -> float:
+        total = sum(values.get(phase, 0.0) for values in self.pages.values())
+        if phase == 'render':
+            total += sum(chunk['render'] for chunk in self.chunks)
+        return total
+
+    def get_build_time(self) -> float:
+        """ build time of all pages, legend is part of setup_page, except on extra legend page """
+        return sum(values.get('create_page', 0.0) + values.get('setup_page', values.get('legend', 0.0))
+                   for values in self.pages.values())
+
+    def get_slowest_layers(self, count: int = 5) -> List[tuple]:
+        """ returns (layer, seconds) of all pages, slowest first """
+        layers: Dict[str, float] = {}
+        for values in self.pages.values():
+            for layer, seconds in values.get('layers', {}).items():
+                layers[layer] = layers.get(layer, 0.0) + seconds
+
+        return sorted(layers.items(), key=lambda x: x[1], reverse=True)[:count]
+
+    def to_dict(self, pdf: str = "") -> dict:
+        return {
+            'pdf': pdf,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'qgis': Qgis.version(),
+            'total': {phase: self.get_total(phase) for phase in self.PHASES},
+            'pages': self.pages,
+            'chunks': self.chunks,
+        }
+
+    @classmethod
+    def read(cls, path: str) -> 'RenderReport':
+        """ reads json report, e.g. of a worker process """
+        with open(path, encoding="utf-8") as file:
+            values = json.load(file)
+
+        report = cls()
+        report.pages = values.get('pages', {})
+        report.chunks = values.get('chunks', [])
+        return report
+
+    @staticmethod
+    def get_report_path(pdf: str) -> str:
+        """ returns report path next to pdf file """
+        path = Path(pdf)
+        return str(path.with_name(f"{path.stem}.timings.json"))
+
+    def write(self, pdf: str) -> str:
+        """ Writes json report next to pdf file.
+
+            :param pdf: exported pdf file
+            :return: report path
+        """
+        path = self.get_report_path(pdf)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.to_dict(pdf), file, indent=2)
+
+        return path
+
+    def log(self, log: Callable[[str], Any]):
+        """ Writes a summary with one line per page and the slowest layers.
+
+            :param log: log method, e.g. `ModuleBase.log`
+        """
+        for page, values in self.pages.items():
+            phases = ", ".join(f"{phase} {values[phase]:.3f} s" for phase in self.PHASES if phase in values)
+            if values.get('cached', False):
+                phases = f"cached {phases}".strip()
+            log(f"page {page}: {phases}")
+
+        for chunk in self.chunks:
+            log(f"pages {chunk['pages'][0]} - {chunk['pages'][-1]}: render {chunk['render']:.3f} s")
+
+        for layer, seconds in self.get_slowest_layers():
+            log(f"layer {layer}: {seconds:.3f} s")
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    Date                 : October 2026
+    Copyright            : Felix von Studsinske
+    Email                : /
+    Developer            : Felix von Studsinske
+    Description          : -- optional --
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+import sqlite3
+
+from datetime import datetime
+
+from qgis.core import QgsField, QgsVectorLayer
+
+from typing import Callable, List, Tuple
+
+from .plot_config import PLOT_PAGES, PLOT_OPTIONS
+from .plot_store import PlotStore
+from ...submodules.tools.geopackage import GeoPackage
+
+SQL_CREATE_VERSION_TABLE = """CREATE TABLE IF NOT EXISTS plot_schema (
+    version INTEGER PRIMARY KEY,
+    applied TEXT NOT NULL)"""
+SQL_VERSION_TABLE_EXISTS = "SELECT COUNT(name) FROM sqlite_master WHERE type='table' AND name='plot_schema'"
+SQL_VERSION = "SELECT MAX(version) FROM plot_schema"
+SQL_INSERT_VERSION = "INSERT OR REPLACE INTO plot_schema (version, applied) VALUES (?, ?)"
+SQL_RTREE_EXISTS = ("SELECT COUNT(name) FROM sqlite_master WHERE type='table' AND name = "
+                    "(SELECT 'rtree_' || table_name || '_' || column_name FROM gpkg_geometry_columns "
+                    "WHERE table_name=?)")
+
+
+class SchemaError(Exception):
+    """ migration step could not be applied """
+
+
+class PlotSchema:
+    """ Versioned schema of a plot file.
+        Applied versions are stored in table `plot_schema` of the plot file.
+        Older plot files are migrated forward step by step, each step in its own transaction,
+        except steps of the data provider, see `migrations`.
+        Files without the table have version 0, all steps can be applied to them again.
+
+        :param geo: plot GeoPackage
+    """
+
+    # sqlite index on column "page" of pages layer
+    PAGE_INDEX_NAME = "pages_page_idx"
+    # json columns are written with every change of `PlotStore` from this version on
+    JSON_SYNC_VERSION = 5
+
+    def __init__(self, geo: GeoPackage):
+        self.geo = geo
+
+    @property
+    def migrations(self) -> List[Tuple[int, Callable[[sqlite3.Connection], None], bool]]:
+        """ (version, step, in transaction), ordered by version.
+            Steps using the OGR data provider write with their own connection. They are run
+            without transaction, an open transaction of the plugin connection would lock them out.
+        """
+        return [
+            (1, self.add_optional_columns, False),
+            (2, self.add_page_index, True),
+            (3, self.add_store_tables, True),
+            (4, self.add_spatial_index, False),
+            (5, self.write_json_columns, True),
+        ]
+
+    @property
+    def latest_version(self) -> int:
+        return self.migrations[-1][0]
+
+    def get_version(self) -> int:
+        """ returns current schema version of plot file, 0 for files without version """
+        with self.geo.connection() as con:
+            if not con.execute(SQL_VERSION_TABLE_EXISTS).fetchone()[0]:
+                return 0
+            return con.execute(SQL_VERSION).fetchone()[0] or 0
+
+    def migrate(self) -> int:
+        """ Applies all missing steps.
+            Stops at the first failing step, e.g. read-only file, the plot file can still be used.
+
+            :return: schema version after migration
+        """
+        version = self.get_version()
+        if version >= self.latest_version:
+            return version
+
+        try:
+            with self.geo.connection() as con:
+                with con:
+                    con.execute(SQL_CREATE_VERSION_TABLE)
+        except sqlite3.Error:
+            return version
+
+        for step_version, step, in_transaction in self.migrations:
+            if step_version <= version:
+                continue
+            try:
+                with self.geo.connection() as con:
+                    if in_transaction:
+                        with con:
+                            con.execute("BEGIN")
+                            step(con)
+                            self.insert_version(con, step_version)
+                    else:
+                        # version is written after the step, failing steps are applied again next time
+                        step(con)
+                        with con:
+                            self.insert_version(con, step_version)
+            except (sqlite3.Error, SchemaError):
+                break
+            version = step_version
+
+        return version
+
+    @staticmethod
+    def insert_version(con: sqlite3.Connection, version: int):
+        con.execute(SQL_INSERT_VERSION, (version, datetime.now().isoformat(timespec="seconds")))
+
+    def add_optional_columns(self, con: sqlite3.Connection):
+        """ Adds optional columns of options layer, which are missing in older plot files.
+            Columns are added by data provider, so QGIS knows about them.
+        """
+        layer_options = QgsVectorLayer(self.geo.get_uri("options"), "options", "ogr")
+        provider = layer_options.dataProvider()
+        names = provider.fields().names()
+        missing = [QgsField(name, value['type']) for name, value in PLOT_OPTIONS['Attributes'].items()
+                   if value.get('optional', False) and name not in names]
+        if missing and not provider.addAttributes(missing):
+            raise SchemaError(f"columns can not be added to '{self.geo.path}'")
+
+    def add_page_index(self, con: sqlite3.Connection):
+        """ index for page number lookups and ordering, fid is already the primary key """
+        con.execute(f'CREATE INDEX IF NOT EXISTS "{self.PAGE_INDEX_NAME}" ON "{PLOT_PAGES["NAME"]}" ("page")')
+
+    def add_store_tables(self, con: sqlite3.Connection):
+        """ tables of `PlotStore` with values from json columns """
+        if not PlotStore.has_tables(con):
+            PlotStore.create_tables(con, con)
+
+    def add_spatial_index(self, con: sqlite3.Connection):
+        """ GeoPackage R-tree of pages layer, created by data provider with triggers of the rtree extension """
+        # fetchall finishes the statement, so no read lock is left for the data provider
+        if con.execute(SQL_RTREE_EXISTS, (PLOT_PAGES['NAME'], )).fetchall()[0][0]:
+            return
+
+        layer_pages = QgsVectorLayer(self.geo.get_uri(PLOT_PAGES['NAME']), "pages", "ogr")
+        if not layer_pages.dataProvider().createSpatialIndex():
+            raise SchemaError(f"spatial index can not be created in '{self.geo.path}'")
+
+    def write_json_columns(self, con: sqlite3.Connection):
+        """ json columns with values of `PlotStore`, they are kept in sync from now on for older plugin versions """
+        if PlotStore.has_tables(con):
+            PlotStore.write_json_columns(con)
@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    Date                 : October 2026
+    Copyright            : Felix von Studsinske
+    Email                : /
+    Developer            : Felix von Studsinske
+    Description          : -- optional --
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+import itertools
+import json
+import os
+import sqlite3
+
+from contextlib import contextmanager, nullcontext
+
+from typing import Callable, ContextManager, Dict, Iterator, List, Optional, Tuple
+
+from ...submodules.tools.geopackage import GeoPackage
+
+SQL_CREATE_TABLES = [
+    """CREATE TABLE IF NOT EXISTS plot_visibility (
+        page_fid INTEGER NOT NULL,
+        layer_id TEXT NOT NULL,
+        flag TEXT NOT NULL,
+        value INTEGER NOT NULL,
+        UNIQUE (page_fid, layer_id, flag))""",
+    """CREATE INDEX IF NOT EXISTS plot_visibility_flag_idx ON plot_visibility (page_fid, flag, value)""",
+    """CREATE TABLE IF NOT EXISTS plot_options (
+        page_fid INTEGER NOT NULL,
+        item_id TEXT NOT NULL,
+        value TEXT,
+        use_page INTEGER NOT NULL,
+        UNIQUE (page_fid, item_id))""",
+]
+SQL_TABLES_EXIST = ("SELECT COUNT(name) FROM sqlite_master "
+                    "WHERE type='table' AND name IN ('plot_visibility', 'plot_options')")
+SQL_UPSERT_VISIBILITY = ("INSERT INTO plot_visibility (page_fid, layer_id, flag, value) VALUES (?, ?, ?, ?) "
+                         "ON CONFLICT (page_fid, layer_id, flag) DO UPDATE SET value = excluded.value")
+SQL_UPSERT_OPTION = ("INSERT INTO plot_options (page_fid, item_id, value, use_page) VALUES (?, ?, ?, ?) "
+                     "ON CONFLICT (page_fid, item_id) DO UPDATE SET value = excluded.value, "
+                     "use_page = excluded.use_page")
+
+
+class PlotStore:
+    """ Normalized storage of layer visibilities and text options in the plot GeoPackage.
+        One row per page, layer and flag (`plot_visibility`) and one row per page and item (`plot_options`).
+        Page feature id 0 holds the values of the plot layer (global values).
+
+        Values from the json columns `visibility` and `options` of older plugin versions are copied by `PlotSchema`,
+        read-only plot files are copied into memory by `migrate` instead.
+        Every write updates the json column of the page in the same transaction, so older plugin versions
+        read the current values. Values changed by older plugin versions and rows of pages deleted
+        outside of the plugin are taken over on open, see `migrate`.
+
+        :param geo: plot GeoPackage
+        :param write_context: returns context manager around every write, e.g. `PagesLayerSession.writing`
+    """
+
+    GLOBAL = 0
+    FLAGS = ('mini_map', 'overview', 'legend', 'page')
+
+    # unique revisions of visibilities of all stores, see `get_visibility_revision`
+    __revisions = itertools.count(1)
+
+    def __init__(self, geo: GeoPackage, write_context: Optional[Callable[[], ContextManager]] = None):
+        self.geo = geo
+        self.write_context = write_context if write_context is not None else nullcontext
+        self.__memory: Optional[sqlite3.Connection] = None
+        # page fid: revision of stored visibility
+        self.__visibility_revisions: Dict[int, int] = {}
+        # error message of last failed write
+        self.error = ""
+
+    @classmethod
+    def next_revision(cls) -> int:
+        return next(cls.__revisions)
+
+    def get_visibility_revision(self, page_fid: int) -> int:
+        """ Returns a number, which is unique for the stored visibility of the page in all plot files.
+            It changes with every write of the visibility, e.g. key for `LayerSetCache`.
+        """
+        if page_fid not in self.__visibility_revisions:
+            self.__visibility_revisions[page_fid] = self.next_revision()
+        return self.__visibility_revisions[page_fid]
+
+    def invalidate(self):
+        """ plot file has been changed from outside, all revisions change """
+        self.__visibility_revisions.clear()
+
+    @property
+    def in_memory(self) -> bool:
+        """ values are not saved, plot file is read-only """
+        return self.__memory is not None
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        if self.__memory is not None:
+            yield self.__memory
+        else:
+            with self.geo.connection() as con:
+                yield con
+
+    def is_read_only(self) -> bool:
+        """ plot file is opened read-only or can not be written, e.g. file permissions """
+        return self.geo.read_only or not os.access(self.geo.path, os.W_OK)
+
+    def migrate(self, import_json: bool = False) -> bool:
+        """ Read-only files without tables get the tables in memory with values from json columns,
+            see `create_tables`. Writable files get the tables by `PlotSchema.add_store_tables`.
+
+            :param import_json: copy json values again, which have been changed by older plugin versions,
+                                only if json columns are kept in sync, see `PlotSchema.write_json_columns`
+            :return: True, if values have been copied into memory
+            :raises sqlite3.Error: tables are missing in a writable file, schema migration failed, e.g. locked
+        """
+        with self.connection() as con:
+            if self.has_tables(con):
+                if not self.is_read_only():
+                    if import_json:
+                        self.import_json_changes()
+                    self.delete_orphans()
+                return False
+
+        if not self.is_read_only():
+            raise sqlite3.OperationalError(f"tables of plot store are missing in '{self.geo.path}'")
+
+        self.__memory = sqlite3.connect(":memory:", check_same_thread=False)
+        with self.geo.connection() as source:
+            with self.__memory:
+                self.create_tables(source, self.__memory)
+        return True
+
+    def import_json_changes(self) -> bool:
+        """ Copies json values of pages, which differ from the tables.
+            The json columns are written with every change of the tables,
+            so different values have been written by an older plugin version.
+
+            :return: False, if plot file could not be written, see `write`
+        """
+        with self.connection() as con:
+            stored = self.read_all(con)
+            changed = [(page_fid, options, visibility) for page_fid, options, visibility in self.read_json_columns(con)
+                       if self.parse_json(options) != self.to_json_value(stored.get(page_fid, ({}, {}))[0])
+                       or self.parse_json(visibility) != self.to_json_value(stored.get(page_fid, ({}, {}))[1])]
+        if not changed:
+            return True
+
+        def insert(con: sqlite3.Connection):
+            self.insert_json_values(con, changed)
+            # json columns in the format of the tables, e.g. option values as text
+            for page_fid, _, _ in changed:
+                self.write_json(con, page_fid, 'options')
+                self.write_json(con, page_fid, 'visibility')
+
+        rows = [(page_fid, ) for page_fid, _, _ in changed]
+        result = self.write([("DELETE FROM plot_visibility WHERE page_fid = ?", rows),
+                             ("DELETE FROM plot_options WHERE page_fid = ?", rows)], insert)
+        self.__visibility_revisions.clear()
+        return result
+
+    def delete_orphans(self) -> bool:
+        """ Removes values of pages, which have been deleted outside of the plugin,
+            e.g. with the attribute table or an older plugin version.
+
+            :return: False, if plot file could not be written, see `write`
+        """
+        with self.connection() as con:
+            primary_key = self.get_pages_key(con)
+            rows = [(page_fid, ) for page_fid, in con.execute(
+                "SELECT page_fid FROM plot_visibility UNION SELECT page_fid FROM plot_options")
+                if page_fid != self.GLOBAL]
+            fids = {fid for fid, in con.execute(f'SELECT "{primary_key}" FROM "pages"')}
+
+        orphans = [row for row in rows if row[0] not in fids]
+        if not orphans:
+            return True
+
+        return self.write([("DELETE FROM plot_visibility WHERE page_fid = ?", orphans),
+                           ("DELETE FROM plot_options WHERE page_fid = ?", orphans)])
+
+    @staticmethod
+    def has_tables(con: sqlite3.Connection) -> bool:
+        return con.execute(SQL_TABLES_EXIST).fetchone()[0] == 2
+
+    @staticmethod
+    def get_pages_key(con: sqlite3.Connection) -> str:
+        """ primary key column of pages table """
+        return next(column[1] for column in con.execute('PRAGMA table_info("pages")') if column[5])
+
+    def write(self, statements: List[Tuple[str, list]],
+              after: Optional[Callable[[sqlite3.Connection], None]] = None) -> bool:
+        """ Executes statements with many parameter rows in one transaction.
+
+            :param statements: (sql, parameter rows)
+            :param after: called with the connection after the statements, in the same transaction
+            :return: False, if plot file could not be written, e.g. locked, message in `error`
+        """
+        try:
+            with self.write_context(), self.connection() as con:
+                with con:
+                    for sql, rows in statements:
+                        con.executemany(sql, rows)
+                    if after is not None:
+                        after(con)
+        except sqlite3.Error as e:
+            self.error = str(e)
+            return False
+
+        self.error = ""
+        return True
+
+    def write_json(self, con: sqlite3.Connection, page_fid: int, column: str):
+        """ Writes values of the tables into json column of page, older plugin versions read them there.
+            Skipped in memory, the plot file is read-only.
+
+            :param column: visibility or options
+        """
+        if self.__memory is not None:
+            return
+
+        self.write_json_column(con, page_fid, column,
+                               self.read_visibility(con, page_fid) if column == 'visibility'
+                               else self.read_options(con, page_fid))
+
+    @classmethod
+    def write_json_column(cls, con: sqlite3.Connection, page_fid: int, column: str, value: dict):
+        """ writes value into json column of page, global values into options table """
+        if page_fid == cls.GLOBAL:
+            con.execute(f'UPDATE "options" SET "{column}" = ?', (json.dumps(value), ))
+        else:
+            con.execute(f'UPDATE "pages" SET "{column}" = ? WHERE "{cls.get_pages_key(con)}" = ?',
+                        (json.dumps(value), page_fid))
+
+    @classmethod
+    def write_json_columns(cls, con: sqlite3.Connection):
+        """ writes values of the tables into json columns of plot layer and all pages """
+        stored = cls.read_all(con)
+        options, visibility = stored.get(cls.GLOBAL, ({}, {}))
+        con.execute('UPDATE "options" SET "options" = ?, "visibility" = ?',
+                    (json.dumps(options), json.dumps(visibility)))
+
+        primary_key = cls.get_pages_key(con)
+        rows = []
+        for page_fid, in con.execute(f'SELECT "{primary_key}" FROM "pages"').fetchall():
+            options, visibility = stored.get(page_fid, ({}, {}))
+            rows.append((json.dumps(options), json.dumps(visibility), page_fid))
+        con.executemany(f'UPDATE "pages" SET "options" = ?, "visibility" = ? WHERE "{primary_key}" = ?', rows)
+
+    @classmethod
+    def read_json_columns(cls, con: sqlite3.Connection) -> List[Tuple[int, str, str]]:
+        """ returns (page fid, options, visibility) json texts of plot layer and all pages """
+        rows = [(cls.GLOBAL, options, visibility)
+                for options, visibility in con.execute('SELECT "options", "visibility" FROM "options" LIMIT 1')]
+        rows.extend(con.execute(f'SELECT "{cls.get_pages_key(con)}", "options", "visibility" FROM "pages"'))
+
+        return rows
+
+    @staticmethod
+    def parse_json(text: Optional[str]) -> Optional[dict]:
+        """ returns json value, None for invalid json """
+        try:
+            return json.loads(text) if text else {}
+        except ValueError:
+            return None
+
+    @staticmethod
+    def to_json_value(value: dict) -> dict:
+        """ value like read from json, tuples become lists """
+        return json.loads(json.dumps(value))
+
+    @staticmethod
+    def to_option_value(value) -> Optional[str]:
+        """ option value for column value, which is nullable """
+        return None if value is None else str(value)
+
+    @classmethod
+    def create_tables(cls, source: sqlite3.Connection, destination: sqlite3.Connection):
+        """ Creates tables in destination and copies json values from pages and options table in source.
+            Used by `PlotSchema.add_store_tables` and for read-only files in memory by `migrate`.
+        """
+        for sql in SQL_CREATE_TABLES:
+            destination.execute(sql)
+        cls.insert_json_values(destination, cls.read_json_columns(source))
+
+    @classmethod
+    def insert_json_values(cls, con: sqlite3.Connection, rows: List[Tuple[int, str, str]]):
+        """ inserts values of json columns, rows of pages with invalid json are skipped
+
+            :param rows: (page fid, options, visibility), see `read_json_columns`
+        """
+        for page_fid, options, visibility in rows:
+            options, visibility = cls.parse_json(options), cls.parse_json(visibility)
+            if options is None or visibility is None:
+                continue
+            con.executemany(SQL_UPSERT_OPTION,
+                            [(page_fid, item_id, cls.to_option_value(pair[0]), int(bool(pair[1])))
+                             for item_id, pair in options.items()
+                             if isinstance(pair, (list, tuple)) and len(pair) == 2])
+            con.executemany(SQL_UPSERT_VISIBILITY,
+                            [(page_fid, layer_id, flag, int(bool(value)))
+                             for layer_id, values in visibility.items()
+                             for flag, value in values.items()])
+
+    @staticmethod
+    def read_visibility(con: sqlite3.Connection, page_fid: int) -> Dict[str, Dict[str, bool]]:
+        visibility: Dict[str, Dict[str, bool]] = {}
+        for layer_id, flag, value in con.execute("SELECT layer_id, flag, value FROM plot_visibility "
+                                                 "WHERE page_fid = ? ORDER BY rowid", (page_fid, )):
+            visibility.setdefault(layer_id, {})[flag] = bool(value)
+
+        return visibility
+
+    @staticmethod
+    def read_options(con: sqlite3.Connection, page_fid: int) -> Dict[str, Tuple[Optional[str], bool]]:
+        return {item_id: (value, bool(use_page)) for item_id, value, use_page in con.execute(
+            "SELECT item_id, value, use_page FROM plot_options WHERE page_fid = ? ORDER BY rowid", (page_fid, ))}
+
+    @staticmethod
+    def read_all(con: sqlite3.Connection) -> Dict[int, Tuple[dict, dict]]:
+        """ returns (options, visibility) of all pages with values, one query per table """
+        values: Dict[int, Tuple[dict, dict]] = {}
+        for page_fid, item_id, value, use_page in con.execute(
+                "SELECT page_fid, item_id, value, use_page FROM plot_options ORDER BY rowid"):
+            values.setdefault(page_fid, ({}, {}))[0][item_id] = (value, bool(use_page))
+        for page_fid, layer_id, flag, value in con.execute(
+                "SELECT page_fid, layer_id, flag, value FROM plot_visibility ORDER BY rowid"):
+            values.setdefault(page_fid, ({}, {}))[1].setdefault(layer_id, {})[flag] = bool(value)
+
+        return values
+
+    def get_visibility(self, page_fid: int) -> Dict[str, Dict[str, bool]]:
+        """ returns visibility dictionary of page, format see `PlotLayer.visibility` """
+        with self.connection() as con:
+            return self.read_visibility(con, page_fid)
+
+    def get_layer_ids(self, page_fid: int, flag: str, value: bool) -> List[str]:
+        """ Returns ids of layers with stored flag of page, e.g. hidden layers in legend.
+            Layers without stored flags are not in list, they use `VisibilityCollection.default`.
+
+            :param flag: page, mini_map, legend, overview
+            :param value: state of flag
+        """
+        with self.connection() as con:
+            # index plot_visibility_flag_idx
+            return [layer_id for layer_id, in con.execute(
+                "SELECT layer_id FROM plot_visibility WHERE page_fid = ? AND flag = ? AND value = ? ORDER BY rowid",
+                (page_fid, flag, int(value)))]
+
+    def set_visibility(self, page_fid: int, visibility: Dict[str, Dict[str, bool]]) -> bool:
+        """ Writes only changed flags and removes missing layers, json column of page is updated too.
+
+            :return: False, if plot file could not be written, see `write`
+        """
+        current = self.get_visibility(page_fid)
+        changes = [(page_fid, layer_id, flag, int(bool(value)))
+                   for layer_id, values in visibility.items()
+                   for flag, value in values.items()
+                   if current.get(layer_id, {}).get(flag, None) != bool(value)]
+        removed = [(page_fid, layer_id) for layer_id in current if layer_id not in visibility]
+        if not changes and not removed:
+            return True
+
+        result = self.write([("DELETE FROM plot_visibility WHERE page_fid = ? AND layer_id = ?", removed),
+                             (SQL_UPSERT_VISIBILITY, changes)],
+                            lambda con: self.write_json(con, page_fid, 'visibility'))
+        self.__visibility_revisions.pop(page_fid, None)
+        return result
+
+    def get_options(self, page_fid: int) -> Dict[str, Tuple[Optional[str], bool]]:
+        """ returns options dictionary of page, format see `PLOT_PAGES` """
+        with self.connection() as con:
+            return self.read_options(con, page_fid)
+
+    def set_options(self, page_fid: int, options: Dict[str, Tuple[Optional[str], bool]]) -> bool:
+        """ Writes only changed options and removes missing items, json column of page is updated too.
+            Values None are stored as NULL.
+
+            :return: False, if plot file could not be written, see `write`
+        """
+        current = self.get_options(page_fid)
+        rows = [(page_fid, item_id, self.to_option_value(pair[0]), int(bool(pair[1])))
+                for item_id, pair in options.items()]
+        changes = [row for row in rows if current.get(row[1], None) != (row[2], bool(row[3]))]
+        removed = [(page_fid, item_id) for item_id in current if item_id not in options]
+        if not changes and not removed:
+            return True
+
+        return self.write([("DELETE FROM plot_options WHERE page_fid = ? AND item_id = ?", removed),
+                           (SQL_UPSERT_OPTION, changes)],
+                          lambda con: self.write_json(con, page_fid, 'options'))
+
+    def delete_pages(self, page_fids: List[int]) -> bool:
+        """ Removes values of deleted pages, their json columns are deleted with the pages.
+
+            :return: False, if plot file could not be written, see `write`
+        """
+        rows = [(fid, ) for fid in page_fids]
+        result = self.write([("DELETE FROM plot_visibility WHERE page_fid = ?", rows),
+                             ("DELETE FROM plot_options WHERE page_fid = ?", rows)])
+        for fid in page_fids:
+            self.__visibility_revisions.pop(fid, None)
+        return result
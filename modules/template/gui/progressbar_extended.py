@@ -1,3 +1,5 @@
+import time
+
 from qgis.PyQt.QtWidgets import (QDialog, QLabel, QProgressBar, QWidget, QStyleFactory)
 from qgis.PyQt.QtCore import QCoreApplication
 from typing import List
@@ -22,6 +24,9 @@ class DoubleProgressGroup(UiModuleBase, QDialog, FORM_CLASS):
         :param name: Module name
     """
 
+    # process gui events at most 25 times per second, more updates only cost time
+    PROCESS_EVENTS_INTERVAL = 1 / 25
+
     def __init__(self, *args, **kwargs: dict):
         QDialog.__init__(self, kwargs.get('parent', None))
         UiModuleBase.__init__(self, *args, **kwargs)
@@ -43,6 +48,9 @@ class DoubleProgressGroup(UiModuleBase, QDialog, FORM_CLASS):
         # has been canceled?
         self._canceled = False
 
+        # time of last processed gui events
+        self._last_process_events = 0.0
+
         self.restore()
 
     def set_text_main(self, text: str, style: str = STYLE_SHEET_NEUTRAL) -> None:
@@ -80,10 +88,18 @@ class DoubleProgressGroup(UiModuleBase, QDialog, FORM_CLASS):
         label.setStyleSheet(style)
         label.show()
 
+    def _process_events(self) -> None:
+        """ Processes gui events, but not more often than `PROCESS_EVENTS_INTERVAL` """
+        now = time.monotonic()
+        if now - self._last_process_events < self.PROCESS_EVENTS_INTERVAL:
+            return
+
+        QCoreApplication.processEvents()
+        self._last_process_events = time.monotonic()
+
     def _value_changed_main(self, pos: int) -> None:
         """ Handles hiding and restoring """
         if not self.progress_active: return
-        QCoreApplication.processEvents()
 
         if pos >= self.get_mainbar().maximum():
             # Maximum der Progressbar erreicht.
@@ -96,10 +112,12 @@ class DoubleProgressGroup(UiModuleBase, QDialog, FORM_CLASS):
                 widget.hide()
             self.Group_Progress.show()
 
+        self._process_events()
+
     def _value_changed_sub(self, pos: int) -> None:
-        """ Does nothing """
+        """ Processes gui events """
         if not self.progress_active: return
-        QCoreApplication.processEvents()
+        self._process_events()
 
     def get_mainbar(self) -> QProgressBar:
         """ Returns main progressbar """
@@ -17,46 +17,167 @@
 ***************************************************************************
 """
 
-from qgis.core import (QgsCoordinateTransform, QgsGeometry,
-                       QgsCoordinateReferenceSystem, QgsProject, QgsRectangle)
+import math
+import struct
+import threading
+
+from qgis.core import (QgsCoordinateTransform, QgsGeometry, QgsFeature,
+                       QgsCoordinateReferenceSystem, QgsProject, QgsRectangle,
+                       QgsCoordinateTransformContext)
+
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+try:
+    import numpy
+except ImportError:
+    # coordinates will be checked with struct, see `has_finite_coordinates`
+    numpy = None
+
+# wkb geometry types with a list of points: (Multi)Point is handled separately
+WKB_POINT_LISTS = {2, 8}  # LineString, CircularString
+WKB_RING_LISTS = {3, 17}  # Polygon, Triangle
+WKB_COLLECTIONS = {4, 5, 6, 7, 9, 10, 11, 12, 15, 16}
+
+
+class TransformCache:
+    """ Coordinate transforms per source crs, destination crs and transform context.
+        Transforms are not shared between threads, every thread has its own entries.
+        Transforms with the project context are dropped, when the project context changes.
+        Call `disconnect()` on unload, the cache is connected to the signals of the project.
+    """
+
+    MAX_ENTRIES = 64
+
+    def __init__(self):
+        self.__local = threading.local()
+        self.__project: Optional[QgsProject] = None
+        self.revision = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __get_entries(self) -> Dict[Tuple[str, str, tuple], QgsCoordinateTransform]:
+        project = QgsProject.instance()
+        if self.__project is not project:
+            self.disconnect()
+            self.__project = project
+            project.transformContextChanged.connect(self.clear)
+            project.cleared.connect(self.clear)
+
+        local = self.__local
+        if getattr(local, "revision", None) != self.revision:
+            local.revision = self.revision
+            local.entries = {}
+
+        return local.entries
+
+    def get(self, src_coordinate_system: QgsCoordinateReferenceSystem,
+            dst_coordinate_system: QgsCoordinateReferenceSystem,
+            context: Optional[QgsCoordinateTransformContext] = None) -> QgsCoordinateTransform:
+        """ returns cached transform, context defaults to the project context """
+        entries = self.__get_entries()
+        if context is None:
+            context_key = ()
+        else:
+            context_key = tuple(sorted(context.coordinateOperations().items()))
+        key = (src_coordinate_system.toWkt(), dst_coordinate_system.toWkt(), context_key)
+
+        transform = entries.get(key, None)
+        if transform is not None:
+            self.hits += 1
+            return transform
+
+        self.misses += 1
+        if len(entries) >= self.MAX_ENTRIES:
+            entries.clear()
+        if context is None:
+            transform = QgsCoordinateTransform(src_coordinate_system, dst_coordinate_system, QgsProject.instance())
+        else:
+            transform = QgsCoordinateTransform(src_coordinate_system, dst_coordinate_system, context)
+        entries[key] = transform
+
+        return transform
+
+    def clear(self, *args):
+        """ drops transforms of all threads, arguments from project signals are ignored """
+        self.revision += 1
+
+    def disconnect(self):
+        """ disconnects from project signals and drops all transforms, reconnects on next use """
+        project, self.__project = self.__project, None
+        if project is not None:
+            try:
+                project.transformContextChanged.disconnect(self.clear)
+                project.cleared.disconnect(self.clear)
+            except (TypeError, RuntimeError):
+                # already disconnected or project deleted
+                pass
+        self.clear()
+
+
+transform_cache = TransformCache()
 
 
 def get_transform(src_coordinate_system: QgsCoordinateReferenceSystem,
-                  dst_coordinate_system: QgsCoordinateReferenceSystem) -> QgsCoordinateTransform:
-    """ get transform object
+                  dst_coordinate_system: QgsCoordinateReferenceSystem,
+                  context: Optional[QgsCoordinateTransformContext] = None) -> QgsCoordinateTransform:
+    """ get transform object, see `TransformCache`
 
         :param src_coordinate_system: source coordinate system
         :param dst_coordinate_system: destination coordinate system
+        :param context: transform context, defaults to the context of current project
         :return: transform object
     """
-    transform_params = QgsCoordinateTransform(
-        src_coordinate_system,
-        dst_coordinate_system,
-        QgsProject.instance())
-
-    return transform_params
+    return transform_cache.get(src_coordinate_system, dst_coordinate_system, context)
 
 
 def transform_geometry(geometry: QgsGeometry, src_coordinate_system: QgsCoordinateReferenceSystem,
-                       dst_coordinate_system: QgsCoordinateReferenceSystem) -> QgsGeometry:
+                       dst_coordinate_system: QgsCoordinateReferenceSystem,
+                       context: Optional[QgsCoordinateTransformContext] = None) -> QgsGeometry:
     """ Transform Geometry-Points to another coordinate
         reference system
 
         :param geometry: geometry to transform
         :param src_coordinate_system: source coordinate system
         :param dst_coordinate_system: destination coordinate system
+        :param context: transform context, defaults to the context of current project
         :return: converted point
     """
 
     # get geometry from point
     copy_geometry = QgsGeometry(geometry)
 
-    transform_params = get_transform(src_coordinate_system, dst_coordinate_system)
+    transform_params = get_transform(src_coordinate_system, dst_coordinate_system, context)
     copy_geometry.transform(transform_params)
 
     return copy_geometry
 
 
+def transform_geometries(geometries: Iterable[Union[QgsGeometry, QgsFeature]],
+                         src_coordinate_system: QgsCoordinateReferenceSystem,
+                         dst_coordinate_system: QgsCoordinateReferenceSystem,
+                         context: Optional[QgsCoordinateTransformContext] = None) -> Iterator[QgsGeometry]:
+    """ Transforms geometries of features or geometries with one transform object.
+        Geometries will be copied, like in `transform_geometry`.
+
+        :param geometries: features or geometries
+        :param src_coordinate_system: source coordinate system
+        :param dst_coordinate_system: destination coordinate system
+        :param context: transform context, defaults to the context of current project
+        :return: transformed geometries in given order
+    """
+    transform_params = get_transform(src_coordinate_system, dst_coordinate_system, context)
+    short_circuited = transform_params.isShortCircuited()
+
+    for geometry in geometries:
+        if isinstance(geometry, QgsFeature):
+            geometry = geometry.geometry()
+        copy_geometry = QgsGeometry(geometry)
+        if not short_circuited:
+            copy_geometry.transform(transform_params)
+
+        yield copy_geometry
+
+
 def polygon_to_rectangle(polygon: QgsGeometry) -> QgsRectangle:
     """ converts simple geometry(polygon) to rectangle.
         Geometry should have only four points orientated as a rectangle.
@@ -76,15 +197,102 @@ def polygon_to_rectangle(polygon: QgsGeometry) -> QgsRectangle:
     return QgsRectangle(x_min, y_min, x_max, y_max)
 
 
-def is_geometry_valid(geometry: QgsGeometry) -> bool:
+def get_wkb_coordinates(wkb: bytes) -> Optional[List[Tuple[str, int, int]]]:
+    """ Returns the blocks of coordinates of a wkb geometry without reading them.
+
+        :param wkb: ISO wkb, e.g. from `QgsGeometry.asWkb`
+        :return: (byte order, offset, count of doubles) per block, None for unknown geometry types
+    """
+    blocks = []
+
+    def read(offset: int) -> Optional[int]:
+        byte_order = "<" if wkb[offset] == 1 else ">"
+        geometry_type, = struct.unpack_from(f"{byte_order}I", wkb, offset + 1)
+        if geometry_type & 0x80000000:
+            # 2.5D
+            dimensions = 3
+            geometry_type &= 0xff
+        else:
+            flag, geometry_type = divmod(geometry_type, 1000)
+            dimensions = 2 + (flag > 0) + (flag == 3)
+        offset += 5
+
+        if geometry_type == 1:
+            blocks.append((byte_order, offset, dimensions))
+            return offset + dimensions * 8
+
+        count, = struct.unpack_from(f"{byte_order}I", wkb, offset)
+        offset += 4
+        if geometry_type in WKB_POINT_LISTS:
+            blocks.append((byte_order, offset, count * dimensions))
+            return offset + count * dimensions * 8
+        if geometry_type in WKB_RING_LISTS:
+            for _ in range(count):
+                points, = struct.unpack_from(f"{byte_order}I", wkb, offset)
+                offset += 4
+                blocks.append((byte_order, offset, points * dimensions))
+                offset += points * dimensions * 8
+            return offset
+        if geometry_type in WKB_COLLECTIONS:
+            for _ in range(count):
+                offset = read(offset)
+                if offset is None:
+                    return None
+            return offset
+
+        return None
+
+    if read(0) is None:
+        return None
+
+    return blocks
+
+
+def has_finite_coordinates(geometry: QgsGeometry) -> bool:
+    """ Checks all coordinates (including z and m) for nan and inf, reads them from wkb.
+
+        :param geometry: geometry
+        :return: True = no nan or inf
+    """
+    wkb = geometry.asWkb().data()
+    blocks = get_wkb_coordinates(wkb)
+    if blocks is None:
+        text = geometry.asWkt()
+        return "inf" not in text and "nan" not in text
+
+    for byte_order, offset, count in blocks:
+        if numpy is not None:
+            values = numpy.frombuffer(wkb, dtype=f"{byte_order}f8", count=count, offset=offset)
+            if not numpy.isfinite(values).all():
+                return False
+        elif not all(map(math.isfinite, struct.unpack_from(f"{byte_order}{count}d", wkb, offset))):
+            return False
+
+    return True
+
+
+def is_geometry_valid(geometry: QgsGeometry, geos: bool = True) -> bool:
     """ Checks geometry validness
 
         :param geometry: geometry
+        :param geos: check validity with GEOS too (slow for big geometries), otherwise only coordinates are checked
         :return: True = is valid
     """
-    valid = not geometry.isNull() and not geometry.isEmpty() and geometry.isGeosValid()
-    # Prüfe nun, ob "nan" oder "inf" vorkommt
-    wkt_valid = geometry.asWkt()
-    wkt_valid = "inf" not in wkt_valid and "nan" not in wkt_valid
+    if geometry.isNull() or geometry.isEmpty():
+        return False
+
+    return has_finite_coordinates(geometry) and (not geos or geometry.isGeosValid())
 
-    return valid and wkt_valid
+
+def get_valid_geometries(features: Iterable[Union[QgsFeature, QgsGeometry]],
+                         geos: bool = True) -> Iterator[QgsGeometry]:
+    """ Yields geometries of features, which are valid, see `is_geometry_valid`
+
+        :param features: features or geometries
+        :param geos: check validity with GEOS too
+        :return: valid geometries in given order
+    """
+    for feature in features:
+        geometry = feature.geometry() if isinstance(feature, QgsFeature) else feature
+        if is_geometry_valid(geometry, geos):
+            yield geometry
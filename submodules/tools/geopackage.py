@@ -17,35 +17,226 @@
 ***************************************************************************
 """
 
+import os
 import sqlite3
-from typing import Any, Dict, Optional, Union
-
-SQL_ALL_LAYERS = """SELECT table_name, column_name, geometry_type_name, srs_id FROM gpkg_geometry_columns;"""
-SQL_LAYER_COLUMNS = """PRAGMA table_info(%s);"""
-SQL_SRS = ("""SELECT srs_name, srs_id, organization, organization_coordsys_id, definition, description """
-           """FROM gpkg_spatial_ref_sys WHERE srs_id=?;""")
+import struct
+import threading
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+SQL_ALL_LAYERS = ("""SELECT g.table_name, g.column_name, g.geometry_type_name, g.srs_id, """
+                  """s.srs_name, s.organization, s.organization_coordsys_id, s.definition, s.description """
+                  """FROM gpkg_geometry_columns g LEFT JOIN gpkg_spatial_ref_sys s ON g.srs_id = s.srs_id;""")
+SQL_LAYER_COLUMNS = """PRAGMA table_info("%s");"""
 SQL_LAYER_EXISTS = "SELECT COUNT(table_name) FROM gpkg_contents WHERE table_name=?"
 
+# cached prepared statements per connection
+STATEMENT_CACHE_SIZE = 256
+
+# bytes of envelope per envelope contents indicator in geometry header
+ENVELOPE_SIZES = {0: 0, 1: 32, 2: 48, 3: 48, 4: 64}
+
+
+def parse_geometry_header(blob: bytes) -> Tuple[int, Optional[Tuple[float, float, float, float]]]:
+    """ Reads header of a GeoPackage geometry blob.
+
+        :param blob: geometry column value
+        :return: header size (start of wkb) and envelope (xmin, ymin, xmax, ymax), None if not in header
+        :raises ValueError: no GeoPackage geometry
+    """
+    if blob is None or len(blob) < 8 or blob[:2] != b"GP":
+        raise ValueError("no GeoPackage geometry blob")
+
+    flags = blob[3]
+    byte_order = "<" if flags & 0x01 else ">"
+    indicator = (flags >> 1) & 0x07
+    empty = flags & 0x10
+    try:
+        size = ENVELOPE_SIZES[indicator]
+    except KeyError:
+        raise ValueError(f"invalid envelope contents indicator {indicator}")
+
+    envelope = None
+    if size and not empty:
+        xmin, xmax, ymin, ymax = struct.unpack_from(f"{byte_order}4d", blob, 8)
+        envelope = (xmin, ymin, xmax, ymax)
+
+    return 8 + size, envelope
+
+
+def get_read_only_uri(path: str) -> str:
+    """ sqlite uri to open given file read-only """
+    return f"{Path(path).absolute().as_uri()}?mode=ro"
+
+
+class ConnectionPool:
+    """ Keeps one open sqlite3 connection per thread and file.
+        Each thread uses only its own connections, the least recently used connection
+        will be closed, when a thread has more than `MAX_CONNECTIONS` files open.
+
+        Connections of all threads can be closed per file (`release_file`) or all (`release_all`).
+        Other threads notice it by generation counters and open a new connection on next use.
+    """
+
+    MAX_CONNECTIONS = 8
+
+    def __init__(self):
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+        # all open connections of all threads, to close them on unload: id: (key, connection)
+        self.__all: Dict[int, Tuple[Tuple[str, bool], sqlite3.Connection]] = {}
+        # increases with `release_all`, thread caches of older generations are dropped
+        self.__generation = 0
+        # normalized path: generation, increases with `release_file`
+        self.__file_generations: Dict[str, int] = {}
+
+    def __get_connections(self) -> 'OrderedDict[Tuple[str, bool], Tuple[sqlite3.Connection, int]]':
+        """ connections of current thread: key: (connection, file generation) """
+        local = self.__local
+        if getattr(local, 'generation', None) != self.__generation:
+            # connections have been closed by `release_all`
+            local.generation = self.__generation
+            local.connections = OrderedDict()
+        return local.connections
+
+    @staticmethod
+    def normalize(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    def acquire(self, path: str, busy_timeout: int, wal: bool, read_only: bool = False) -> sqlite3.Connection:
+        """ Returns open connection of current thread to given file.
+
+            :param path: GeoPackage file
+            :param busy_timeout: milliseconds to wait for locks of other connections
+            :param wal: switch journal mode to write-ahead log
+            :param read_only: open file read-only, writing raises `sqlite3.OperationalError`
+        """
+        connections = self.__get_connections()
+        key = (self.normalize(path), read_only)
+        generation = self.__file_generations.get(key[0], 0)
+        entry = connections.get(key, None)
+        if entry is not None:
+            if entry[1] == generation:
+                connections.move_to_end(key)
+                return entry[0]
+            # closed by `release_file` of another thread
+            del connections[key]
+
+        con = sqlite3.connect(get_read_only_uri(path) if read_only else path,
+                              timeout=busy_timeout / 1000,
+                              cached_statements=STATEMENT_CACHE_SIZE,
+                              check_same_thread=False,
+                              uri=read_only)
+        con.execute(f"PRAGMA busy_timeout = {int(busy_timeout)}")
+        if wal and not read_only:
+            con.execute("PRAGMA journal_mode = WAL")
+        connections[key] = (con, generation)
+        with self.__lock:
+            self.__all[id(con)] = (key, con)
+
+        while len(connections) > self.MAX_CONNECTIONS:
+            self.__close(connections.popitem(last=False)[1][0])
+
+        return con
+
+    def __close(self, con: sqlite3.Connection):
+        with self.__lock:
+            self.__all.pop(id(con), None)
+        con.close()
+
+    def release(self, path: Optional[str] = None):
+        """ closes connections of current thread, to given file or all """
+        connections = self.__get_connections()
+        keys = list(connections) if path is None else [(self.normalize(path), False), (self.normalize(path), True)]
+        for key in keys:
+            entry = connections.pop(key, None)
+            if entry is not None:
+                self.__close(entry[0])
+
+    def release_file(self, path: str):
+        """ Closes connections of all threads to given file, e.g. when a plot layer is not used anymore.
+            No other thread may use this file while closing.
+        """
+        path = self.normalize(path)
+        self.release(path)
+        with self.__lock:
+            self.__file_generations[path] = self.__file_generations.get(path, 0) + 1
+            ids = [key for key, (file_key, _) in self.__all.items() if file_key[0] == path]
+            connections = [self.__all.pop(key)[1] for key in ids]
+        for con in connections:
+            con.close()
+
+    def release_all(self):
+        """ Closes connections of all threads, e.g. on unload.
+            No other thread may use a GeoPackage while closing.
+        """
+        with self.__lock:
+            self.__generation += 1
+            connections, self.__all = [con for _, con in self.__all.values()], {}
+        for con in connections:
+            con.close()
+
+    @property
+    def count(self) -> int:
+        """ count of open connections in all threads """
+        with self.__lock:
+            return len(self.__all)
+
 
 class GeoPackage:
     """ This class provides read methods to the sqlite3
         database.
         GeoPackage: www.geopackage.org
 
+        Connections are taken from a pool, see `ConnectionPool`.
+
         :param path: path to geo package file
+        :param busy_timeout: milliseconds to wait for locks of other connections, e.g. QGIS
+        :param wal: use write-ahead log journal mode (changes the file for all connections)
+        :param read_only: open file read-only, e.g. several processes read the same file
     """
 
-    def __init__(self, path: str) -> None:
+    pool = ConnectionPool()
+
+    def __init__(self, path: str, busy_timeout: int = 5000, wal: bool = False, read_only: bool = False) -> None:
         self.path: str = path
+        self.busy_timeout = busy_timeout
+        self.wal = wal
+        self.read_only = read_only
 
     def connect(self) -> sqlite3.Connection:
-        """ connects to geo package file and returns connection object
+        """ connects to geo package file and returns a new connection object, which is not pooled
+            Caller has to close it.
 
             :return: connection,
             :rtype: sqlite3.Connection
         """
 
-        return sqlite3.connect(self.path)
+        if self.read_only:
+            con = sqlite3.connect(get_read_only_uri(self.path), timeout=self.busy_timeout / 1000, uri=True)
+        else:
+            con = sqlite3.connect(self.path, timeout=self.busy_timeout / 1000)
+        con.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout)}")
+        return con
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """ Pooled connection of current thread.
+            An open transaction will be rolled back at the end, use `with con:` to commit changes.
+        """
+        con = self.pool.acquire(self.path, self.busy_timeout, self.wal, self.read_only)
+        try:
+            yield con
+        finally:
+            if con.in_transaction:
+                con.rollback()
+
+    def release(self) -> None:
+        """ closes pooled connections of all threads to this file, e.g. before deleting the file """
+        self.pool.release_file(self.path)
 
     def has_layer(self, layer_name: str) -> bool:
         """ Returns True, if `layer_name` is in GeoPackage.
@@ -54,29 +245,18 @@ class GeoPackage:
             :param layer_name: case sensitive layer name
         """
 
-        con = self.connect()
-        cur = con.cursor()
-        cur.execute(SQL_LAYER_EXISTS, (layer_name, ))
-        result = cur.fetchone()
-        con.close()
-
-        return bool(result[0])
+        return bool(self.fetchone(SQL_LAYER_EXISTS, (layer_name, ))[0])
 
     def get_layers(self) -> Dict[str, Dict[str, Union[Any, Dict[str, str]]]]:
-        """ get all available layers in geo package
+        """ get all available layers in geo package with one query
 
             :return: dict with available layers
         """
         layers = {}
 
-        con = self.connect()
-        cur = con.cursor()
-        cur.execute(SQL_ALL_LAYERS)
-
-        for layer in cur.fetchall():
-            name, geometry, geometry_type, srs_id = layer
-            cur.execute(SQL_SRS, (srs_id,))
-            srs_name, srs_id, organization, organization_coord_sys_id, definition, description = cur.fetchone()
+        for layer in self.fetchall(SQL_ALL_LAYERS):
+            (name, geometry, geometry_type, srs_id, srs_name,
+             organization, organization_coord_sys_id, definition, description) = layer
             layers[name] = {
                 'name': name,  # table-/layer name
                 'geometrycolumn': geometry,  # column for geometry
@@ -92,8 +272,6 @@ class GeoPackage:
                 'uri': self.get_uri(name),  # qgis uri to access this layer
             }
 
-        con.close()
-
         return layers
 
     def get_uri(self, layer_name: str) -> str:
@@ -115,10 +293,7 @@ class GeoPackage:
 
         columns = {}
 
-        con = self.connect()
-        cur = con.cursor()
-
-        for column in cur.execute(SQL_LAYER_COLUMNS % table_name):
+        for column in self.fetchall(SQL_LAYER_COLUMNS % table_name):
             index, name, value_type, notnull, default, primary = column
             columns[name] = {
                 'index': index,
@@ -129,48 +304,46 @@ class GeoPackage:
                 'primary': primary,
             }
 
-        con.close()
-
         return columns
 
-    def fetchone(self, query: str, args: list = []) -> Optional[tuple]:
+    def fetchone(self, query: str, args: Union[list, tuple] = ()) -> Optional[tuple]:
         """ fetches one sql value from query
 
             :param query: query string
             :param args: query string, indexed iterable, like list/tuple
             :return: None or tuple with values
         """
-        con = self.connect()
-        cur = con.cursor()
-        cur.execute(query, args)
-        result = cur.fetchone()
-
-        return result
-
-    def fetchmany(self, query: str, args: list = []):
+        with self.connection() as con:
+            cur = con.execute(query, args)
+            try:
+                return cur.fetchone()
+            finally:
+                cur.close()
+
+    def fetchmany(self, query: str, args: Union[list, tuple] = ()) -> List[tuple]:
         """ fetches many sql values from query
 
             :param query: query string
             :param args: query string, indexed iterable, like list/tuple
             :return: any
         """
-        con = self.connect()
-        cur = con.cursor()
-        cur.execute(query, args)
-        result = cur.fetchmany()
-
-        return result
-
-    def fetchall(self, query: str, args: list = []):
+        with self.connection() as con:
+            cur = con.execute(query, args)
+            try:
+                return cur.fetchmany()
+            finally:
+                cur.close()
+
+    def fetchall(self, query: str, args: Union[list, tuple] = ()) -> List[tuple]:
         """ fetches all sql values from query
 
             :param query: query string
             :param args: query string, indexed iterable, like list/tuple
             :return: any
         """
-        con = self.connect()
-        cur = con.cursor()
-        cur.execute(query, args)
-        result = cur.fetchall()
-
-        return result
+        with self.connection() as con:
+            cur = con.execute(query, args)
+            try:
+                return cur.fetchall()
+            finally:
+                cur.close()
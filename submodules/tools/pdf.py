@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+"""
+***************************************************************************
+    Date                 : October 2026
+    Copyright            : Felix von Studsinske
+    Email                : /
+    Developer            : Felix von Studsinske
+    Description          : -- optional --
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+from typing import List, Tuple
+
+
+def get_pdf_writer():
+    """ returns a new pdf writer object from python package `pypdf`
+
+        :raises ModuleNotFoundError: `pypdf` is not installed
+    """
+    try:
+        from pypdf import PdfWriter
+    except ImportError:
+        raise ModuleNotFoundError("python package 'pypdf' is needed to merge pdf files, "
+                                  "install it into your QGIS python environment")
+
+    return PdfWriter()
+
+
+def get_pdf_errors() -> Tuple[type, ...]:
+    """ returns exception classes of `pypdf` for unreadable or broken pdf files """
+    try:
+        from pypdf.errors import PyPdfError
+    except ImportError:
+        return ()
+
+    return (PyPdfError, )
+
+
+def merge_pdf_files(paths: List[str], destination: str) -> None:
+    """ Appends all pages from given pdf files in given order into one pdf file.
+
+        :param paths: pdf files to merge
+        :param destination: path to new pdf file, existing file will be overwritten
+        :raises ModuleNotFoundError: `pypdf` is not installed
+        :raises ValueError: a pdf file can not be read
+    """
+    writer = get_pdf_writer()
+    for path in paths:
+        try:
+            writer.append(path)
+        except get_pdf_errors() as e:
+            raise ValueError(f"pdf file '{path}' can not be read: {e}") from e
+
+    with open(destination, "wb") as file:
+        writer.write(file)
+    writer.close()
+
+
+def split_pdf_file(path: str, destinations: List[str]) -> None:
+    """ Writes each page from given pdf file into an own pdf file.
+
+        :param path: pdf file to split
+        :param destinations: new file path per page, count must be equal to the page count
+        :raises ModuleNotFoundError: `pypdf` is not installed
+        :raises ValueError: count of destinations and pages are different or pdf file can not be read
+    """
+    get_pdf_writer().close()  # check for `pypdf`
+    from pypdf import PdfReader
+
+    try:
+        reader = PdfReader(path)
+        page_count = len(reader.pages)
+    except get_pdf_errors() as e:
+        raise ValueError(f"pdf file '{path}' can not be read: {e}") from e
+    if page_count != len(destinations):
+        raise ValueError(f"pdf file '{path}' has {page_count} pages, "
+                         f"but {len(destinations)} destinations are given")
+
+    for page, destination in zip(reader.pages, destinations):
+        writer = get_pdf_writer()
+        writer.add_page(page)
+        with open(destination, "wb") as file:
+            writer.write(file)
+        writer.close()
@@ -20,6 +20,8 @@ def run():
         "submodules/core/.git", "submodules/core/.gitignore", "submodules/core/.editorconfig",
         # manual
         "readme.md", "manual",
+        # benchmarks
+        "benchmarks",
     ]
 
     obj = CreatePluginZip(zip_file_name,